@@ -0,0 +1,387 @@
+"""
+Agent runtime shared by the API worker and the fork server.
+
+Run as a script, this module is the fork server (zygote): it imports the
+configured heavy modules once and forks a child per execution. It is kept light
+and must not import the API module itself.
+
+    python agent_runtime.py <socket path> <comma-separated preload modules>
+"""
+
+import asyncio
+import inspect
+import io
+import marshal
+import mmap
+import os
+import pickle
+import signal
+import socket
+import struct
+import sys
+import tempfile
+import types
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+# Frame header: message kind and body length.
+HEADER = struct.Struct("!cQ")
+
+
+class AgentRequest:
+    """The `request` passed to main(request, store)."""
+
+    def __init__(self, payload: dict, scheduled: bool = False):
+        self.scheduled = scheduled
+        self.payload = payload
+
+    async def json(self) -> dict:
+        return self.payload
+
+
+class AsyncAgentStore:
+    """The `store` passed to async agents; a per-execution key/value store."""
+
+    def __init__(self):
+        self._data: Dict[str, Any] = {}
+
+    async def get(self, key: str, default: Any = None) -> Any:
+        return self._data.get(key, default)
+
+    async def set(self, key: str, value: Any) -> None:
+        self._data[key] = value
+
+    async def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    async def keys(self) -> List[str]:
+        return list(self._data)
+
+
+def load_main(code_obj: types.CodeType) -> Any:
+    """Run a compiled agent module body and return its main() function."""
+    local_env = {}
+    try:
+        exec(code_obj, local_env)
+    except Exception as e:
+        raise Exception(f"Error compiling agent code: {e}")
+
+    if "main" not in local_env:
+        raise Exception("Agent code does not define a main() function")
+    return local_env["main"]
+
+
+def main_args(main_fn: Any, payload: dict, store: Any, scheduled: bool) -> tuple:
+    sig = inspect.signature(main_fn)
+    if len(sig.parameters) == 0:
+        return ()
+    if len(sig.parameters) == 2:
+        return (AgentRequest(payload, scheduled), store)
+    raise Exception(
+        "main() function has an unsupported signature (expected 0 or 2 parameters)"
+    )
+
+
+def call_main(main_fn: Any, payload: dict, scheduled: bool, timeout: float) -> Any:
+    """Call main() synchronously; a coroutine main runs on a private event loop."""
+    if inspect.iscoroutinefunction(main_fn):
+        return asyncio.run(await_main(main_fn, payload, scheduled, timeout))
+    try:
+        result = main_fn(*main_args(main_fn, payload, {}, scheduled))
+    except Exception as e:
+        raise Exception(f"Error executing agent main(): {e}")
+    return result
+
+
+async def await_main(
+    main_fn: Any, payload: dict, scheduled: bool, timeout: float
+) -> Any:
+    try:
+        result = main_fn(*main_args(main_fn, payload, AsyncAgentStore(), scheduled))
+        if inspect.isawaitable(result):
+            result = await asyncio.wait_for(result, timeout)
+    except asyncio.TimeoutError:
+        raise Exception(f"Agent main() timed out after {timeout:g}s")
+    except Exception as e:
+        raise Exception(f"Error executing agent main(): {e}")
+    return result
+
+
+# Messages whose pickled size reaches this many bytes travel through a shared
+# segment instead of the socket; 0 disables the shared-memory transport.
+SHM_THRESHOLD_BYTES = int(os.getenv("SHM_THRESHOLD_BYTES", str(1 << 20)))
+SHM_DIR = os.getenv("SHM_DIR") or (
+    "/dev/shm"
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK)
+    else tempfile.gettempdir()
+)
+SEGMENT_PREFIX = "swarms-segment-"
+SEGMENT_ALIGNMENT = 64
+INLINE = b"I"
+SHARED = b"S"
+
+transport_stats = {"inline": 0, "shared": 0, "shared_bytes": 0, "mapped": 0}
+
+# The only globals a message from an execution child may reference. Everything
+# else (lists, dicts, str, bytes, numbers, ...) is built from opcodes alone.
+SAFE_GLOBALS = {
+    ("builtins", name) for name in ("bytearray", "complex", "frozenset", "set")
+}
+
+
+class RestrictedUnpickler(pickle.Unpickler):
+    """
+    Unpickler for messages from an execution child, which has run untrusted agent
+    code: it rebuilds plain containers and scalars only, never a class or callable.
+    """
+
+    def find_class(self, module: str, name: str) -> Any:
+        if (module, name) in SAFE_GLOBALS:
+            return super().find_class(module, name)
+        raise pickle.UnpicklingError(f"{module}.{name} is not a plain value")
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // SEGMENT_ALIGNMENT) * SEGMENT_ALIGNMENT
+
+
+def write_segment(data: bytes, buffers: List[memoryview]) -> Tuple[str, list]:
+    """
+    Write a pickle and its out-of-band buffers to a new segment file.
+
+    Returns the segment path and the `(offset, length)` of each part, pickle
+    first. The file name carries the writer's pid so `sweep_segments` can tell
+    orphans from live segments.
+    """
+    path = os.path.join(SHM_DIR, f"{SEGMENT_PREFIX}{os.getpid()}-{uuid.uuid4().hex}")
+    layout = []
+    offset = 0
+    with open(path, "xb") as f:
+        for part in [memoryview(data), *buffers]:
+            offset = _aligned(offset)
+            f.seek(offset)
+            f.write(part)
+            layout.append((offset, part.nbytes))
+            offset += part.nbytes
+    return path, layout
+
+
+def segment_path(path: str) -> str:
+    """
+    Validate a segment path received from the peer and return it resolved.
+
+    Raises:
+        ValueError: Unless the path names a `SEGMENT_PREFIX` file directly in
+            `SHM_DIR`; the peer must not make us map or unlink any other file.
+    """
+    resolved = os.path.realpath(path)
+    directory, name = os.path.split(resolved)
+    if directory != os.path.realpath(SHM_DIR) or not name.startswith(SEGMENT_PREFIX):
+        raise ValueError(f"Refusing to map {path!r}: not a segment in {SHM_DIR}")
+    return resolved
+
+
+def map_segment(path: str, layout: list) -> List[memoryview]:
+    """
+    Map a segment and take ownership of it.
+
+    The file is unlinked as soon as it is mapped; the memory then lives exactly
+    as long as Python references the returned views (or arrays built on them).
+    The mapping is copy-on-write, so a consumer that writes into a buffer never
+    affects the sender's copy. The path is checked with `segment_path` and opened
+    without following symlinks.
+    """
+    path = segment_path(path)
+    try:
+        fd = os.open(path, os.O_RDONLY | getattr(os, "O_NOFOLLOW", 0))
+        with open(fd, "rb") as f:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    finally:
+        discard_segment(path)
+    view = memoryview(mapping)
+    return [view[offset : offset + length] for offset, length in layout]
+
+
+def discard_segment(path: Optional[str]) -> None:
+    """Unlink a segment; harmless if the receiver already took ownership."""
+    if path:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+def discard_segments_of(pid: int) -> int:
+    """Remove every segment written by process `pid`, e.g. a killed child."""
+    removed = 0
+    try:
+        names = os.listdir(SHM_DIR)
+    except OSError:
+        return 0
+    for name in names:
+        if name.startswith(f"{SEGMENT_PREFIX}{pid}-"):
+            discard_segment(os.path.join(SHM_DIR, name))
+            removed += 1
+    return removed
+
+
+def sweep_segments() -> int:
+    """Remove segments left behind by processes that have exited."""
+    removed = 0
+    try:
+        names = os.listdir(SHM_DIR)
+    except OSError:
+        return 0
+    for name in names:
+        if not name.startswith(SEGMENT_PREFIX):
+            continue
+        try:
+            pid = int(name[len(SEGMENT_PREFIX) :].split("-", 1)[0])
+            os.kill(pid, 0)
+        except ValueError:
+            continue
+        except ProcessLookupError:
+            discard_segment(os.path.join(SHM_DIR, name))
+            removed += 1
+        except PermissionError:
+            continue
+    return removed
+
+
+def send_message(sock: socket.socket, obj: Any) -> Optional[str]:
+    """
+    Send `obj` to the peer, through a shared segment if it is large.
+
+    Large messages are pickled with protocol 5 so out-of-band buffers (such as
+    bytearrays) are written to the segment directly and reconstructed over the
+    mapping on the other side rather than copied through the socket. Returns the segment
+    path, which the sender should `discard_segment` once the exchange is over in
+    case the peer never took ownership.
+    """
+    buffers = []
+    data = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+    raw = [buffer.raw() for buffer in buffers]
+    size = len(data) + sum(part.nbytes for part in raw)
+    if SHM_THRESHOLD_BYTES <= 0 or size < SHM_THRESHOLD_BYTES:
+        if buffers:
+            data = pickle.dumps(obj, protocol=5)
+        transport_stats["inline"] += 1
+        sock.sendall(HEADER.pack(INLINE, len(data)) + data)
+        return None
+
+    path, layout = write_segment(data, raw)
+    handle = pickle.dumps((path, layout), protocol=5)
+    transport_stats["shared"] += 1
+    transport_stats["shared_bytes"] += size
+    try:
+        sock.sendall(HEADER.pack(SHARED, len(handle)) + handle)
+    except BaseException:
+        discard_segment(path)
+        raise
+    return path
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytes:
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise EOFError("connection closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def _loads(data: Any, restricted: bool, buffers: Any = ()) -> Any:
+    if restricted:
+        return RestrictedUnpickler(io.BytesIO(data), buffers=buffers).load()
+    return pickle.loads(data, buffers=buffers)
+
+
+def recv_message(sock: socket.socket, restricted: bool = False) -> Any:
+    """
+    Receive a message sent with `send_message`.
+
+    With `restricted`, as used by the API worker for everything a child sends,
+    the message may only contain plain values (see `RestrictedUnpickler`) and
+    anything else raises `pickle.UnpicklingError`.
+    """
+    kind, size = HEADER.unpack(_recv_exactly(sock, HEADER.size))
+    body = _recv_exactly(sock, size)
+    if kind == INLINE:
+        return _loads(body, restricted)
+    path, layout = _loads(body, restricted)
+    data, *buffers = map_segment(path, layout)
+    transport_stats["mapped"] += 1
+    return _loads(data, restricted, buffers)
+
+
+def serve_one(conn: socket.socket) -> None:
+    """
+    Run one execution in a forked child.
+
+    Sends the child's pid, reads `(bytecode, payload, scheduled, timeout)` and
+    replies `(True, result)` or `(False, error message)`. A child that dies before
+    replying leaves the caller reading EOF.
+    """
+    send_message(conn, os.getpid())
+    bytecode, payload, scheduled, timeout = recv_message(conn)
+    try:
+        main_fn = load_main(marshal.loads(bytecode))
+        message = (True, call_main(main_fn, payload, scheduled, timeout))
+    except BaseException as e:
+        message = (False, str(e))
+    try:
+        send_message(conn, message)
+    except Exception as e:
+        send_message(conn, (False, f"Agent result could not be returned: {e}"))
+
+
+def serve(path: str, preload: List[str]) -> None:
+    """
+    Fork-server main loop.
+
+    Imports `preload`, then forks a child for every connection on the Unix socket
+    at `path`. Exits when the API worker that started it goes away.
+    """
+    for name in preload:
+        try:
+            __import__(name)
+        except ImportError:
+            pass
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen(128)
+    listener.settimeout(1.0)
+    parent = os.getppid()
+    # Children are reaped automatically; they reset this before running agents.
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+
+    print("ready", flush=True)
+    # Nobody reads our stdout after startup; send agent output to the worker's stderr.
+    os.dup2(2, 1)
+
+    while os.getppid() == parent:
+        try:
+            conn, _ = listener.accept()
+        except socket.timeout:
+            continue
+        pid = os.fork()
+        if pid == 0:
+            listener.close()
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            try:
+                conn.setblocking(True)
+                serve_one(conn)
+            except BaseException:
+                pass
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(0)
+        conn.close()
+
+
+if __name__ == "__main__":
+    serve(sys.argv[1], [name for name in sys.argv[2].split(",") if name])
@@ -7,7 +7,9 @@ An agent is defined by its name, description, Python script (with a main functio
 requirements, and environment variables.
 
 Agent executions are run directly in the host process using asynchronous background
-threads to simulate auto scaling. In production, consider using a robust task queue or
+threads to simulate auto scaling; agents defining `async def main` are awaited on the
+event loop instead. With EXECUTION_BACKEND=forkserver each execution runs in an isolated
+child forked from a pre-warmed fork server (see agent_runtime.py). In production, consider using a robust task queue or
 worker pool that can dynamically scale (e.g., Celery, Dramatiq, or a serverless backend).
 
 Endpoints include:
@@ -18,6 +20,9 @@ Endpoints include:
   - /agents/{agent_id}       [DELETE] Delete an agent
   - /agents/{agent_id}/execute [POST] Execute an agent (manual run)
   - /agents/{agent_id}/history [GET]  Fetch execution history/logs
+  - /agents/{agent_id}/schedules [POST/GET] Schedule recurring executions
+  - /workflows/run           [POST]   Run a DAG of agents, streaming per-node results
+  - /health/ready            [GET]    Deep readiness (load, event-loop lag, executor queue)
 
 Requirements:
   - Python 3.8+
@@ -33,13 +38,36 @@ Todo:
 
 """
 
+import ast
 import asyncio
+import collections
+import concurrent.futures
+import contextlib
+import functools
+import gzip
+import hashlib
+import heapq
+import importlib.util
+import itertools
+import json
+import marshal
 import os
+import pickle
+import random
+import signal
+import socket
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
 import time
+import types
 import uuid
-from datetime import datetime
+import zlib
+from datetime import datetime, timedelta
 from decimal import Decimal
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Literal, Optional, Set, Tuple
 
 import psutil  # For memory usage
 import supabase
@@ -54,6 +82,7 @@ from fastapi import (
     status,
 )
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from loguru import logger
 
 # --- OpenTelemetry Setup ---
@@ -65,6 +94,20 @@ from opentelemetry.sdk.trace import TracerProvider
 from opentelemetry.sdk.trace.export import BatchSpanProcessor
 from pydantic import BaseModel, Field
 
+import agent_runtime
+from agent_runtime import (
+    SHM_THRESHOLD_BYTES,
+    await_main,
+    call_main,
+    discard_segment,
+    discard_segments_of,
+    load_main,
+    recv_message,
+    send_message,
+    sweep_segments,
+    transport_stats,
+)
+
 load_dotenv()
 
 # Setup tracing
@@ -119,6 +162,14 @@ class AgentCreate(AgentBase):
         False,
         description="If true, the system will allow the agent to scale its executions concurrently.",
     )
+    coalesce: Optional[bool] = Field(
+        False,
+        description=(
+            "If true, concurrent executions by the same tenant with identical "
+            "payloads share one run and its result. Only enable for agents "
+            "without per-call side effects."
+        ),
+    )
 
 
 class AgentUpdate(BaseModel):
@@ -128,12 +179,14 @@ class AgentUpdate(BaseModel):
     requirements: Optional[str] = None
     envs: Optional[str] = None
     autoscaling: Optional[bool] = None
+    coalesce: Optional[bool] = None
 
 
 class AgentOut(AgentBase):
     id: str
     created_at: datetime
     autoscaling: bool = False
+    coalesce: bool = False
 
 
 class ExecutionPayload(BaseModel):
@@ -150,10 +203,79 @@ class AgentExecutionHistory(BaseModel):
     executions: List[ExecutionLog]
 
 
+class TenantPolicy(BaseModel):
+    tenant_id: str
+    weight: float = Field(1.0, gt=0, description="Relative share of execution time.")
+    max_concurrency: int = Field(
+        4, ge=1, description="Executions this tenant may run at once."
+    )
+
+
+class WorkflowNode(BaseModel):
+    id: str = Field(
+        ..., example="summarize", description="Node id, unique in the workflow."
+    )
+    agent_id: str
+    payload: Optional[Dict[str, Any]] = Field(default_factory=dict)
+
+
+class WorkflowEdge(BaseModel):
+    source: str = Field(..., description="Node whose output is passed on.")
+    target: str = Field(..., description="Node that receives the output.")
+    input_key: Optional[str] = Field(
+        None,
+        description="Payload key the output is stored under; defaults to the source id.",
+    )
+
+
+class WorkflowRequest(BaseModel):
+    nodes: List[WorkflowNode]
+    edges: List[WorkflowEdge] = Field(default_factory=list)
+    payload: Optional[Dict[str, Any]] = Field(
+        default_factory=dict, description="Base payload shared by every node."
+    )
+    fail_fast: bool = Field(
+        True, description="Stop starting new nodes after the first failure."
+    )
+
+
+class ScheduleCreate(BaseModel):
+    cron: Optional[str] = Field(
+        None,
+        example="*/5 * * * *",
+        description="Five-field cron expression, evaluated in UTC.",
+    )
+    interval_seconds: Optional[float] = Field(
+        None, example=300, description="Run every N seconds (instead of cron)."
+    )
+    payload: Optional[Dict[str, Any]] = Field(default_factory=dict)
+    jitter_seconds: float = Field(
+        0, ge=0, description="Random delay up to this many seconds added to each run."
+    )
+    missed_run_policy: Literal["skip", "run_once", "catch_up"] = Field(
+        "skip",
+        description=(
+            "What to do with runs missed while no scheduler was running: drop them, "
+            "run once, or run each missed occurrence (bounded)."
+        ),
+    )
+    enabled: bool = True
+
+
+class ScheduleOut(ScheduleCreate):
+    id: str
+    agent_id: str
+    created_at: datetime
+    next_run_at: Optional[datetime] = None
+    last_run_at: Optional[datetime] = None
+    run_count: int = 0
+
+
 # --- In-memory "databases" for agents and their execution histories ---
 
 agents_db: Dict[str, AgentOut] = {}
 executions_db: Dict[str, List[ExecutionLog]] = {}
+schedules_db: Dict[str, ScheduleOut] = {}
 
 # --- Helper Functions for Agent Execution ---
 
@@ -177,15 +299,9 @@ def check_api_key(api_key: str) -> bool:
     return bool(response.data)
 
 
-def get_user_id_from_api_key(api_key: str) -> str:
+def get_api_key_record(api_key: str) -> dict:
     """
-    Maps an API key to its associated user ID.
-
-    Args:
-        api_key (str): The API key to look up
-
-    Returns:
-        str: The user ID associated with the API key
+    Fetch the 'swarms_cloud_api_keys' row for an API key.
 
     Raises:
         ValueError: If the API key is invalid or not found
@@ -193,13 +309,29 @@ def get_user_id_from_api_key(api_key: str) -> str:
     supabase_client = get_supabase_client()
     response = (
         supabase_client.table("swarms_cloud_api_keys")
-        .select("user_id")
+        .select("*")
         .eq("key", api_key)
         .execute()
     )
     if not response.data:
         raise ValueError("Invalid API key")
-    return response.data[0]["user_id"]
+    return response.data[0]
+
+
+def get_user_id_from_api_key(api_key: str) -> str:
+    """
+    Maps an API key to its associated user ID.
+
+    Args:
+        api_key (str): The API key to look up
+
+    Returns:
+        str: The user ID associated with the API key
+
+    Raises:
+        ValueError: If the API key is invalid or not found
+    """
+    return get_api_key_record(api_key)["user_id"]
 
 
 # global dictionary to store timestamps for each client IP
@@ -447,71 +579,970 @@ def record_execution(agent_id: str, log: str) -> None:
     logger.info(f"Recorded execution for agent {agent_id}: {log}")
 
 
-def run_agent_code(agent: Any, payload: dict) -> Any:
+# --- Compiled Agent Code ---
+
+AGENT_BYTECODE_DIR = os.getenv(
+    "AGENT_BYTECODE_DIR",
+    os.path.join(tempfile.gettempdir(), "swarms-cloud-bytecode"),
+)
+AGENT_BYTECODE_MEMORY_ITEMS = int(os.getenv("AGENT_BYTECODE_MEMORY_ITEMS", "1024"))
+AGENT_BYTECODE_PRELOAD = int(os.getenv("AGENT_BYTECODE_PRELOAD", "64"))
+AGENT_BYTECODE_TOUCH_INTERVAL = float(os.getenv("AGENT_BYTECODE_TOUCH_INTERVAL", "60"))
+BYTECODE_TAG = sys.implementation.cache_tag or (
+    f"{sys.implementation.name}-{sys.version_info[0]}{sys.version_info[1]}"
+)
+
+
+class AgentCodeError(ValueError):
+    """Agent code that does not compile or never binds a main() function."""
+
+
+def compile_agent_code(code: str) -> types.CodeType:
     """
-    Dynamically execute the agent's code.
+    Parse and compile agent source, rejecting code that could never run.
 
-    The agent code should define a main() function with one of these signatures:
-      - def main(): ...
-      - def main(request, store): ...
-    A dummy request (with payload) and store are provided when necessary.
+    `main` may be bound by a def, an assignment or an import; the signature is still
+    checked at execution time.
+    """
+    try:
+        tree = ast.parse(code, filename="<agent>")
+    except SyntaxError as e:
+        raise AgentCodeError(f"syntax error on line {e.lineno}: {e.msg}")
+
+    binds_main = False
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            binds_main = binds_main or node.name == "main"
+        elif isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store):
+            binds_main = binds_main or node.id == "main"
+        elif isinstance(node, ast.alias):
+            binds_main = binds_main or (node.asname or node.name) == "main"
+    if not binds_main:
+        raise AgentCodeError("agent code does not define a main() function")
+
+    try:
+        return compile(tree, "<agent>", "exec")
+    except (SyntaxError, ValueError) as e:
+        raise AgentCodeError(str(e))
+
+
+class BytecodeCache:
+    """
+    Compiled agent code shared between workers as marshal files on disk.
+
+    Entries are content-addressed by `code_version`, so updating an agent simply
+    compiles to a new key. Files live in a directory per interpreter
+    (`sys.implementation.cache_tag`) and start with `importlib.util.MAGIC_NUMBER`;
+    a worker on a different Python never loads foreign bytecode and compiles its own
+    copy instead. File mtimes double as a recency signal for `preload`.
+
+    Loaded bytecode is executed, so the directory must be private: it is created
+    with mode 0700, and if it is owned by another user or is a symlink nothing is
+    read from or written to it. Each file also carries the full SHA-256 of its
+    source, which must match the code being run.
     """
 
+    def __init__(self, directory: str, max_items: int):
+        self.root = directory
+        self.directory = os.path.join(directory, BYTECODE_TAG)
+        self.max_items = max_items
+        self._code: "collections.OrderedDict[str, Tuple[bytes, types.CodeType]]" = (
+            collections.OrderedDict()
+        )
+        self._touched: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._private: Optional[bool] = None
+        self.hits = 0
+        self.loads = 0
+        self.compiles = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.marshal")
+
+    def _private_directory(self) -> bool:
+        """Create the directory if needed and check that only we can write to it."""
+        if self._private is not None:
+            return self._private
+        private = True
+        for path in (self.root, self.directory):
+            try:
+                os.makedirs(path, mode=0o700, exist_ok=True)
+                st = os.lstat(path)
+                if not stat.S_ISDIR(st.st_mode):
+                    raise OSError(f"{path} is not a directory")
+                if hasattr(os, "getuid") and st.st_uid != os.getuid():
+                    raise OSError(f"{path} is owned by uid {st.st_uid}")
+                if st.st_mode & 0o077:
+                    os.chmod(path, 0o700)
+            except OSError as e:
+                logger.warning(f"Not persisting agent bytecode: {e}")
+                private = False
+                break
+        self._private = private
+        return private
+
+    def _remember(self, key: str, digest: bytes, code_obj: types.CodeType) -> None:
+        with self._lock:
+            self._code[key] = (digest, code_obj)
+            self._code.move_to_end(key)
+            while len(self._code) > self.max_items:
+                evicted, _ = self._code.popitem(last=False)
+                self._touched.pop(evicted, None)
+
+    def _touch(self, key: str) -> None:
+        now = time.time()
+        with self._lock:
+            if now - self._touched.get(key, 0.0) < AGENT_BYTECODE_TOUCH_INTERVAL:
+                return
+            self._touched[key] = now
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            pass
+
+    def _read(self, key: str) -> Optional[Tuple[bytes, types.CodeType]]:
+        if not self._private_directory():
+            return None
+        try:
+            fd = os.open(self._path(key), os.O_RDONLY | getattr(os, "O_NOFOLLOW", 0))
+            with open(fd, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        magic = importlib.util.MAGIC_NUMBER
+        header = len(magic) + hashlib.sha256().digest_size
+        if not data.startswith(magic) or len(data) < header:
+            return None
+        try:
+            code_obj = marshal.loads(data[header:])
+        except (EOFError, ValueError, TypeError):
+            logger.warning(f"Discarding unreadable agent bytecode {key}")
+            return None
+        if not isinstance(code_obj, types.CodeType):
+            return None
+        return data[len(magic) : header], code_obj
+
+    def _write(self, key: str, digest: bytes, code_obj: types.CodeType) -> None:
+        if not self._private_directory():
+            return
+        try:
+            with tempfile.NamedTemporaryFile(
+                dir=self.directory, suffix=".tmp", delete=False
+            ) as f:
+                f.write(importlib.util.MAGIC_NUMBER + digest + marshal.dumps(code_obj))
+            os.replace(f.name, self._path(key))
+        except OSError as e:
+            logger.warning(f"Could not persist agent bytecode {key}: {e}")
+
+    def store(self, code: str) -> str:
+        """Compile and persist agent code; raises AgentCodeError if it is invalid."""
+        key = code_version(code)
+        digest = hashlib.sha256(code.encode()).digest()
+        code_obj = compile_agent_code(code)
+        self.compiles += 1
+        self._write(key, digest, code_obj)
+        self._remember(key, digest, code_obj)
+        return key
+
+    def get(self, code: str) -> types.CodeType:
+        """Return the code object for `code`, loading or compiling it on a miss."""
+        key = code_version(code)
+        digest = hashlib.sha256(code.encode()).digest()
+        code_obj = None
+        with self._lock:
+            entry = self._code.get(key)
+            if entry is not None and entry[0] == digest:
+                code_obj = entry[1]
+                self._code.move_to_end(key)
+                self.hits += 1
+        if code_obj is None:
+            entry = self._read(key)
+            if entry is not None and entry[0] == digest:
+                code_obj = entry[1]
+                self.loads += 1
+            else:
+                code_obj = compile_agent_code(code)
+                self.compiles += 1
+                self._write(key, digest, code_obj)
+            self._remember(key, digest, code_obj)
+        self._touch(key)
+        return code_obj
+
+    def preload(self, limit: int) -> int:
+        """
+        Load the `limit` most recently used entries into memory. Their source
+        digests are checked when `get` is first called with the source.
+        """
+        if not self._private_directory():
+            return 0
+        try:
+            entries = [
+                entry
+                for entry in os.scandir(self.directory)
+                if entry.name.endswith(".marshal")
+            ]
+        except OSError:
+            return 0
+        entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+        loaded = 0
+        for entry in entries[: min(limit, self.max_items)]:
+            key = entry.name[: -len(".marshal")]
+            read = self._read(key)
+            if read is not None:
+                self._remember(key, *read)
+                loaded += 1
+        return loaded
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tag": BYTECODE_TAG,
+            "cached": len(self._code),
+            "hits": self.hits,
+            "loads": self.loads,
+            "compiles": self.compiles,
+        }
+
+
+bytecode_cache = BytecodeCache(AGENT_BYTECODE_DIR, AGENT_BYTECODE_MEMORY_ITEMS)
+
+
+AGENT_ASYNC_TIMEOUT_SECONDS = float(os.getenv("AGENT_ASYNC_TIMEOUT_SECONDS", "300"))
+
+
+@functools.lru_cache(maxsize=4096)
+def agent_is_async(code: Optional[str]) -> bool:
+    """Whether the agent's code defines `async def main` at module level."""
+    try:
+        tree = ast.parse(code or "")
+    except SyntaxError:
+        return False
+    return any(
+        isinstance(node, ast.AsyncFunctionDef) and node.name == "main"
+        for node in tree.body
+    )
+
+
+def load_agent_main(agent: Any) -> Any:
+    """Run the agent's module body and return its main() function."""
     # Determine how to access the code: dictionary or Pydantic attribute.
     try:
         code_str = agent["code"] if isinstance(agent, dict) else agent.code
     except Exception as e:
         raise Exception(f"Error accessing agent code: {e}")
 
-    local_env = {}
     try:
-        exec(code_str, local_env)
+        code_obj = bytecode_cache.get(code_str)
     except Exception as e:
         raise Exception(f"Error compiling agent code: {e}")
+    return load_main(code_obj)
+
+
+def run_agent_code(agent: Any, payload: dict, scheduled: bool = False) -> Any:
+    """
+    Dynamically execute the agent's code.
+
+    The agent code should define a main() function with one of these signatures:
+      - def main(): ...
+      - def main(request, store): ...
+    A request (with payload) and store are provided when necessary;
+    `request.scheduled` is True for runs started by the scheduler. Coroutine
+    agents are normally awaited by `run_agent_code_async`; one reaching this
+    function runs on a private event loop.
+    """
+    return call_main(
+        load_agent_main(agent), payload, scheduled, AGENT_ASYNC_TIMEOUT_SECONDS
+    )
+
+
+async def run_agent_code_async(
+    agent: Any, payload: dict, scheduled: bool = False
+) -> Any:
+    """
+    Await an `async def main` on the event loop.
+
+    The module body still runs in a worker thread, so slow imports in agent code
+    do not block the loop; only the coroutine itself runs here, bounded by
+    AGENT_ASYNC_TIMEOUT_SECONDS.
+    """
+    loop = asyncio.get_running_loop()
+    main_fn = await loop.run_in_executor(None, load_agent_main, agent)
+    return await await_main(main_fn, payload, scheduled, AGENT_ASYNC_TIMEOUT_SECONDS)
+
 
-    if "main" not in local_env:
-        raise Exception("Agent code does not define a main() function")
-    main_fn = local_env["main"]
+# --- Fair Execution Scheduling ---
 
-    import inspect
+EXECUTION_WORKERS = int(
+    os.getenv("EXECUTION_WORKERS", str(min(32, (os.cpu_count() or 1) + 4)))
+)
+DEFAULT_TENANT_WEIGHT = float(os.getenv("DEFAULT_TENANT_WEIGHT", "1"))
+DEFAULT_TENANT_CONCURRENCY = int(os.getenv("DEFAULT_TENANT_CONCURRENCY", "4"))
+TENANT_POLICY_TTL = float(os.getenv("TENANT_POLICY_TTL", "60"))
+# Execution seconds a tenant of weight 1 may use per round-robin turn.
+DRR_QUANTUM_SECONDS = float(os.getenv("DRR_QUANTUM_SECONDS", "0.1"))
+# When both lanes have work, every Nth dispatch goes to the batch lane.
+BATCH_LANE_EVERY = int(os.getenv("BATCH_LANE_EVERY", "4"))
+INTERACTIVE = "interactive"
+BATCH = "batch"
+
+SYSTEM_TENANT = TenantPolicy(tenant_id="system")
+tenant_policies: Dict[str, Tuple[TenantPolicy, float]] = {}
+
+
+def load_tenant_policy(api_key: str) -> TenantPolicy:
+    """
+    Derive a tenant's scheduling policy from its API key record. Optional
+    `priority_weight` and `max_concurrency` columns override the defaults.
+    """
+    record = get_api_key_record(api_key)
+    return TenantPolicy(
+        tenant_id=str(record["user_id"]),
+        weight=record.get("priority_weight") or DEFAULT_TENANT_WEIGHT,
+        max_concurrency=record.get("max_concurrency") or DEFAULT_TENANT_CONCURRENCY,
+    )
 
-    sig = inspect.signature(main_fn)
+
+async def get_tenant_policy(api_key: str) -> TenantPolicy:
+    """
+    Cached `load_tenant_policy`. Lookup failures fall back to a default policy
+    keyed by the API key, so scheduling never blocks an execution.
+    """
+    cached = tenant_policies.get(api_key)
+    if cached and cached[1] > time.monotonic():
+        return cached[0]
     try:
-        if len(sig.parameters) == 0:
-            result = main_fn()
-        elif len(sig.parameters) == 2:
-            # Create a proper dummy request instance.
-            class DummyRequest:
-                def __init__(self, payload):
-                    self.scheduled = False
-                    self.payload = payload
-
-            request_obj = DummyRequest(payload)
-            store = {}
-            result = main_fn(request_obj, store)
-        else:
-            raise Exception(
-                "main() function has an unsupported signature (expected 0 or 2 parameters)"
-            )
+        policy = await asyncio.to_thread(load_tenant_policy, api_key)
     except Exception as e:
-        raise Exception(f"Error executing agent main(): {e}")
-    return result
+        logger.warning(f"Could not load tenant policy, using defaults: {e}")
+        policy = TenantPolicy(
+            tenant_id=f"key:{api_key[-8:]}",
+            weight=DEFAULT_TENANT_WEIGHT,
+            max_concurrency=DEFAULT_TENANT_CONCURRENCY,
+        )
+    tenant_policies[api_key] = (policy, time.monotonic() + TENANT_POLICY_TTL)
+    return policy
+
+
+class ExecutionNotStarted(Exception):
+    """A queued execution was dropped before it started, e.g. during shutdown."""
+
+
+class ExecutionHandedOff(ExecutionNotStarted):
+    """An execution that did not start was journaled for the next worker."""
+
+
+class FairExecutor:
+    """
+    Multi-tenant front end for the agent execution thread pool.
+
+    Work is queued per tenant and per lane (interactive, batch). Free worker
+    slots are handed out with deficit round robin: each tenant earns
+    `weight * DRR_QUANTUM_SECONDS` of credit per turn and spends the expected
+    run time of its next job (an EWMA per agent), so a tenant's share of
+    execution time follows its weight regardless of how much it submits.
+    Interactive work goes first, but every `BATCH_LANE_EVERY`-th dispatch serves
+    the batch lane so batch jobs cannot starve. Tenants at `max_concurrency`
+    are passed over until one of their executions finishes.
+
+    All bookkeeping happens on the event loop thread; only the agent code runs
+    on the pool.
+    """
+
+    def __init__(self, max_workers: int = EXECUTION_WORKERS) -> None:
+        self.max_workers = max_workers
+        self._pool = None
+        self._running = 0
+        self._dispatches = 0
+        self._queues: Dict[Tuple[str, str], collections.deque] = {}
+        self._active: Dict[str, collections.deque] = {
+            INTERACTIVE: collections.deque(),
+            BATCH: collections.deque(),
+        }
+        self._deficit: Dict[Tuple[str, str], float] = {}
+        self._inflight: Dict[str, int] = {}
+        self._policies: Dict[str, TenantPolicy] = {}
+        self._cost: Dict[str, float] = {}
+
+    def _pool_executor(self) -> concurrent.futures.ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="agent-exec"
+            )
+        return self._pool
+
+    def expected_cost(self, cost_key: str) -> float:
+        return self._cost.get(cost_key, DRR_QUANTUM_SECONDS)
+
+    def _record_cost(self, cost_key: str, seconds: float) -> None:
+        previous = self._cost.get(cost_key)
+        self._cost[cost_key] = (
+            seconds if previous is None else 0.8 * previous + 0.2 * seconds
+        )
+
+    async def run(
+        self, tenant: TenantPolicy, lane: str, cost_key: str, fn, *args
+    ) -> Any:
+        """
+        Queue `fn(*args)` for `tenant` in `lane` and wait for its result.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._policies[tenant.tenant_id] = tenant
+        key = (tenant.tenant_id, lane)
+        queue = self._queues.setdefault(key, collections.deque())
+        if not queue:
+            self._active[lane].append(tenant.tenant_id)
+            self._deficit[key] = 0.0
+        queue.append((future, cost_key, fn, args, time.monotonic()))
+        self._dispatch()
+        return await future
+
+    def _capped(self, tenant_id: str) -> bool:
+        policy = self._policies[tenant_id]
+        return self._inflight.get(tenant_id, 0) >= policy.max_concurrency
+
+    def _next_job(self, lane: str):
+        active = self._active[lane]
+        capped_in_a_row = 0
+        while active and capped_in_a_row < len(active):
+            tenant_id = active[0]
+            key = (tenant_id, lane)
+            queue = self._queues[key]
+            # Drop jobs whose caller has gone away.
+            while queue and queue[0][0].done():
+                queue.popleft()
+            if not queue:
+                active.popleft()
+                continue
+            if self._capped(tenant_id):
+                active.rotate(-1)
+                capped_in_a_row += 1
+                continue
+            capped_in_a_row = 0
+            cost = min(self.expected_cost(queue[0][1]), 100 * DRR_QUANTUM_SECONDS)
+            if self._deficit[key] < cost:
+                # Out of credit: earn this round's quantum and pass the turn on.
+                weight = self._policies[tenant_id].weight
+                self._deficit[key] += weight * DRR_QUANTUM_SECONDS
+                active.rotate(-1)
+                continue
+            self._deficit[key] -= cost
+            job = queue.popleft()
+            if not queue:
+                active.popleft()
+            return tenant_id, job
+        return None
+
+    def _dispatch(self) -> None:
+        while self._running < self.max_workers:
+            lanes = (INTERACTIVE, BATCH)
+            if self._dispatches % BATCH_LANE_EVERY == BATCH_LANE_EVERY - 1:
+                lanes = (BATCH, INTERACTIVE)
+            picked = None
+            for lane in lanes:
+                picked = self._next_job(lane)
+                if picked:
+                    break
+            if picked is None:
+                return
+            tenant_id, (future, cost_key, fn, args, _) = picked
+            self._dispatches += 1
+            self._running += 1
+            self._inflight[tenant_id] = self._inflight.get(tenant_id, 0) + 1
+            started = time.monotonic()
+            work = asyncio.get_running_loop().run_in_executor(
+                self._pool_executor(), functools.partial(fn, *args)
+            )
+            work.add_done_callback(
+                functools.partial(self._finished, tenant_id, cost_key, started, future)
+            )
+
+    def _finished(self, tenant_id, cost_key, started, future, work) -> None:
+        self._running -= 1
+        self._inflight[tenant_id] -= 1
+        self._record_cost(cost_key, time.monotonic() - started)
+        if not future.done():
+            if work.exception() is not None:
+                future.set_exception(work.exception())
+            else:
+                future.set_result(work.result())
+        self._dispatch()
+
+    def cancel_queued(self) -> int:
+        """Fail every job that has not started with ExecutionNotStarted."""
+        cancelled = 0
+        for queue in self._queues.values():
+            while queue:
+                future = queue.popleft()[0]
+                if not future.done():
+                    future.set_exception(
+                        ExecutionNotStarted("Execution was not started before shutdown")
+                    )
+                    cancelled += 1
+        for active in self._active.values():
+            active.clear()
+        return cancelled
+
+    def queue_depth(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def oldest_wait(self) -> float:
+        """Seconds the longest-waiting queued job has been waiting."""
+        heads = [
+            queue[0][4]
+            for queue in self._queues.values()
+            if queue and not queue[0][0].done()
+        ]
+        return time.monotonic() - min(heads) if heads else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._running,
+            "queue_depth": self.queue_depth(),
+            "oldest_wait_ms": round(self.oldest_wait() * 1000, 1),
+            "queued": {
+                f"{tenant_id}/{lane}": len(queue)
+                for (tenant_id, lane), queue in self._queues.items()
+                if queue
+            },
+        }
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+
+fair_executor = FairExecutor()
+
+
+ASYNC_AGENT_CONCURRENCY = int(os.getenv("ASYNC_AGENT_CONCURRENCY", "256"))
+
+
+class AsyncAgentLimiter:
+    """
+    Concurrency limits for coroutine agents, separate from the thread pool.
+
+    Awaiting agents cost a task rather than a thread, so they get their own (much
+    larger) global limit. Each tenant is still held to its `max_concurrency`.
+    Semaphores are created on first use so they bind to the serving event loop.
+    Like `FairExecutor.cancel_queued`, `cancel_waiting` fails agents still waiting
+    for a slot with ExecutionNotStarted when the worker drains.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._global: Optional[asyncio.Semaphore] = None
+        self._tenants: Dict[Tuple[str, int], asyncio.Semaphore] = {}
+        self._drained: Optional[asyncio.Event] = None
+        self.running = 0
+        self.waiting = 0
+
+    def _tenant_semaphore(self, tenant: TenantPolicy) -> asyncio.Semaphore:
+        key = (tenant.tenant_id, tenant.max_concurrency)
+        semaphore = self._tenants.get(key)
+        if semaphore is None:
+            semaphore = self._tenants[key] = asyncio.Semaphore(
+                max(1, tenant.max_concurrency)
+            )
+        return semaphore
+
+    def _not_started(self) -> ExecutionNotStarted:
+        return ExecutionNotStarted("Execution was not started before shutdown")
+
+    async def _acquire(self, semaphore: asyncio.Semaphore) -> None:
+        """Acquire `semaphore` unless the limiter is drained first."""
+        if self._drained.is_set():
+            raise self._not_started()
+        if not semaphore.locked():
+            await semaphore.acquire()
+            return
+        acquire = asyncio.ensure_future(semaphore.acquire())
+        drained = asyncio.ensure_future(self._drained.wait())
+        try:
+            await asyncio.wait({acquire, drained}, return_when=asyncio.FIRST_COMPLETED)
+        except BaseException:
+            self._abandon(semaphore, acquire, drained)
+            raise
+        if not acquire.done() or self._drained.is_set():
+            self._abandon(semaphore, acquire, drained)
+            raise self._not_started()
+        drained.cancel()
+
+    @staticmethod
+    def _abandon(
+        semaphore: asyncio.Semaphore, acquire: asyncio.Future, drained: asyncio.Future
+    ) -> None:
+        drained.cancel()
+        if not acquire.done():
+            # A cancelled acquire hands on a slot it was just given.
+            acquire.cancel()
+        elif not acquire.cancelled():
+            semaphore.release()
+
+    async def run(self, tenant: TenantPolicy, fn, *args) -> Any:
+        if self._global is None:
+            self._global = asyncio.Semaphore(self.limit)
+            self._drained = asyncio.Event()
+        tenant_semaphore = self._tenant_semaphore(tenant)
+        self.waiting += 1
+        try:
+            await self._acquire(tenant_semaphore)
+            try:
+                await self._acquire(self._global)
+            except BaseException:
+                tenant_semaphore.release()
+                raise
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        try:
+            return await fn(*args)
+        finally:
+            self.running -= 1
+            self._global.release()
+            tenant_semaphore.release()
+
+    def cancel_waiting(self) -> int:
+        """
+        Fail every agent waiting for a slot, and any that arrive later, with
+        ExecutionNotStarted. Returns how many were waiting.
+        """
+        if self._drained is None:
+            return 0
+        self._drained.set()
+        return self.waiting
+
+    def stats(self) -> Dict[str, Any]:
+        return {"limit": self.limit, "running": self.running, "waiting": self.waiting}
+
+
+async_agents = AsyncAgentLimiter(ASYNC_AGENT_CONCURRENCY)
+
+
+# --- Fork Server Runtime ---
+
+THREAD_BACKEND = "thread"
+FORKSERVER_BACKEND = "forkserver"
+EXECUTION_BACKEND = os.getenv("EXECUTION_BACKEND", THREAD_BACKEND).lower()
+# Imported once by the fork server so each forked child starts with them loaded.
+ZYGOTE_PRELOAD_MODULES = [
+    name.strip()
+    for name in os.getenv(
+        "ZYGOTE_PRELOAD_MODULES", "json,asyncio,httpx,pydantic,numpy,pandas"
+    ).split(",")
+    if name.strip()
+]
+ZYGOTE_EXECUTION_TIMEOUT_SECONDS = float(
+    os.getenv("ZYGOTE_EXECUTION_TIMEOUT_SECONDS", "300")
+)
+
+
+class ForkServerRuntime:
+    """
+    Runs each execution in a child forked from a pre-warmed fork server.
+
+    The fork server is `agent_runtime.py` started as a fresh interpreter (not a
+    fork of this multi-threaded worker). It imports ZYGOTE_PRELOAD_MODULES once
+    and forks a child for every connection on its Unix socket. The child receives
+    the agent's marshalled bytecode from `bytecode_cache`, so it neither imports
+    the API nor recompiles the agent, and replies over the same socket; payloads
+    and results above SHM_THRESHOLD_BYTES travel as shared-memory segments
+    instead (see `agent_runtime.send_message`). A child that crashes, hangs past
+    the timeout or returns an unpicklable value fails only its own execution; a
+    dead fork server is restarted on next use. Replies from the child are read
+    with `restricted` unpickling, so a result can only be plain data (containers,
+    strings, bytes, numbers), never an object that runs code in this worker.
+
+    `run` blocks until the child finishes and is called from `fair_executor`
+    threads, so tenant fairness and concurrency caps still apply.
+    """
+
+    def __init__(self, preload: List[str], timeout: float):
+        self.preload = preload
+        self.timeout = timeout
+        self._process: Optional[subprocess.Popen] = None
+        self._socket_path: Optional[str] = None
+        self._lock = threading.Lock()
+        self.started = 0
+        self.crashed = 0
+        self.timed_out = 0
+        self.restarts = 0
+
+    @staticmethod
+    def available() -> bool:
+        return hasattr(os, "fork") and hasattr(socket, "AF_UNIX")
+
+    def start(self) -> str:
+        """Launch the fork server if it is not running; returns its socket path."""
+        with self._lock:
+            if self._process is not None and self._process.poll() is None:
+                return self._socket_path
+            if self._process is not None:
+                self.restarts += 1
+                logger.warning(
+                    f"Fork server exited with code {self._process.returncode}; restarting"
+                )
+            swept = sweep_segments()
+            if swept:
+                logger.info(f"Removed {swept} orphaned shared-memory segments")
+            path = os.path.join(
+                tempfile.mkdtemp(prefix="swarms-zygote-"), "zygote.sock"
+            )
+            process = subprocess.Popen(
+                [sys.executable, agent_runtime.__file__, path, ",".join(self.preload)],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+            )
+            if process.stdout.readline().strip() != b"ready":
+                process.kill()
+                process.wait()
+                raise Exception("Fork server failed to start")
+            process.stdout.close()
+            self._process, self._socket_path = process, path
+            return path
+
+    def stop(self) -> None:
+        with self._lock:
+            if self._process is not None and self._process.poll() is None:
+                self._process.terminate()
+                try:
+                    self._process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    self._process.kill()
+            self._process = None
+
+    def run(self, agent: Any, payload: dict, scheduled: bool = False) -> Any:
+        code_str = agent["code"] if isinstance(agent, dict) else agent.code
+        try:
+            bytecode = marshal.dumps(bytecode_cache.get(code_str))
+        except Exception as e:
+            raise Exception(f"Error compiling agent code: {e}")
+
+        path = self.start()
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(path)
+            self.started += 1
+            # Sent by the child before it loads any agent code.
+            pid = recv_message(sock, restricted=True)
+            if not isinstance(pid, int) or pid <= 0:
+                raise Exception("Fork server sent an invalid process id")
+            segment = None
+            reply = None
+            try:
+                segment = send_message(
+                    sock, (bytecode, payload, scheduled, AGENT_ASYNC_TIMEOUT_SECONDS)
+                )
+                reply = recv_message(sock, restricted=True)
+            except socket.timeout:
+                self.timed_out += 1
+                self._kill(pid)
+                raise Exception(f"Agent execution timed out after {self.timeout:g}s")
+            except (EOFError, ConnectionError):
+                self.crashed += 1
+                raise Exception(f"Agent process {pid} exited before returning a result")
+            except (pickle.UnpicklingError, ValueError, OSError) as e:
+                raise Exception(f"Agent result could not be returned: {e}")
+            finally:
+                discard_segment(segment)
+                if reply is None:
+                    # A child killed or dead mid-reply may leave its segment.
+                    discard_segments_of(pid)
+        if not isinstance(reply, tuple) or len(reply) != 2:
+            raise Exception("Agent process returned a malformed reply")
+        ok, value = reply
+        if not ok:
+            raise Exception(value)
+        return value
+
+    @staticmethod
+    def _kill(pid: int) -> None:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._process is not None and self._process.poll() is None,
+            "started": self.started,
+            "crashed": self.crashed,
+            "timed_out": self.timed_out,
+            "restarts": self.restarts,
+            "transport": dict(transport_stats, threshold=SHM_THRESHOLD_BYTES),
+        }
+
+
+fork_server = ForkServerRuntime(
+    ZYGOTE_PRELOAD_MODULES, ZYGOTE_EXECUTION_TIMEOUT_SECONDS
+)
+
+
+def resolve_backend(backend: Optional[str]) -> str:
+    backend = (backend or EXECUTION_BACKEND).lower()
+    if backend not in (THREAD_BACKEND, FORKSERVER_BACKEND):
+        raise ValueError(f"Unknown execution backend: {backend}")
+    if backend == FORKSERVER_BACKEND and not ForkServerRuntime.available():
+        logger.warning("Fork server is not supported here; using thread backend")
+        return THREAD_BACKEND
+    return backend
+
+
+# --- Request Coalescing ---
+
 
+def code_version(code: Optional[str]) -> str:
+    return hashlib.sha256((code or "").encode()).hexdigest()[:16]
 
-async def execute_agent(agent: AgentOut, payload: dict) -> Any:
+
+def payload_hash(payload: dict) -> str:
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class SingleFlight:
+    """
+    Shares one in-flight execution between concurrent callers with the same key.
+
+    The first caller starts the work as its own task; later callers await the same
+    task. Each caller waits through `asyncio.shield`, so a caller that disconnects
+    does not cancel the execution the others are waiting on.
+    """
+
+    def __init__(self) -> None:
+        self._inflight: Dict[Tuple[str, ...], asyncio.Task] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: Tuple[str, ...], work) -> Any:
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.executions += 1
+            task = asyncio.ensure_future(work())
+            self._inflight[key] = task
+            task.add_done_callback(functools.partial(self._forget, key))
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Tuple[str, ...], task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # Mark retrieved even if every caller went away.
+
+    def stats(self) -> Dict[str, Any]:
+        requests = self.executions + self.coalesced
+        return {
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "inflight": len(self._inflight),
+            "coalesced_ratio": round(self.coalesced / requests, 4) if requests else 0.0,
+        }
+
+
+single_flight = SingleFlight()
+
+
+async def execute_agent(
+    agent: AgentOut,
+    payload: dict,
+    scheduled: bool = False,
+    tenant: Optional[TenantPolicy] = None,
+    lane: str = INTERACTIVE,
+    backend: Optional[str] = None,
+    hand_off: bool = False,
+) -> Any:
     """
     Execute the agent code asynchronously with OpenTelemetry instrumentation.
     This captures execution time and memory usage.
+
+    The run is queued on `fair_executor` under `tenant` in the given lane
+    (interactive or batch), so one tenant's burst cannot starve the others.
+    Agents created with `coalesce` share a single execution between concurrent
+    calls from the same tenant with the same code version and payload.
+
+    `backend` selects where the code runs: "thread" (in this process) or
+    "forkserver" (an isolated child per execution); it defaults to
+    EXECUTION_BACKEND.
+
+    With `hand_off`, an execution that cannot start because the worker is
+    draining is journaled for the next worker (see `Lifecycle.hand_off`) and
+    ExecutionHandedOff is raised. A coalesced execution is handed off once, and
+    every caller sharing it gets ExecutionHandedOff.
     """
+    backend = resolve_backend(backend)
+
+    async def run() -> Any:
+        try:
+            return await run_agent_execution(
+                agent, payload, scheduled, tenant, lane, backend
+            )
+        except ExecutionHandedOff:
+            raise
+        except ExecutionNotStarted as e:
+            if hand_off and lifecycle.hand_off(execution_job(agent, payload, tenant)):
+                raise ExecutionHandedOff(str(e)) from e
+            raise
+
+    if agent.coalesce and not scheduled:
+        key = (
+            (tenant or SYSTEM_TENANT).tenant_id,
+            agent.id,
+            code_version(agent.code),
+            payload_hash(payload),
+        )
+        return await single_flight.do(key, run)
+    return await run()
+
+
+async def run_agent_execution(
+    agent: AgentOut,
+    payload: dict,
+    scheduled: bool,
+    tenant: Optional[TenantPolicy],
+    lane: str,
+    backend: str = THREAD_BACKEND,
+) -> Any:
     logger.info(f"Starting execution of agent {agent.id} with payload: {payload}")
-    with tracer.start_as_current_span("execute_agent") as span:
+    with lifecycle.track(), tracer.start_as_current_span("execute_agent") as span:
         start_time = time.time()
         # Capture initial memory usage (in bytes)
         process = psutil.Process()
         mem_before = process.memory_info().rss
+        result = None
         try:
-            # Run the agent code in a thread so as not to block the event loop.
-            result = await asyncio.to_thread(run_agent_code, agent, payload)
+            if backend == FORKSERVER_BACKEND:
+                # Isolated child process; the executor thread only waits on it.
+                result = await fair_executor.run(
+                    tenant or SYSTEM_TENANT,
+                    lane,
+                    agent.id,
+                    fork_server.run,
+                    agent,
+                    payload,
+                    scheduled,
+                )
+            elif agent_is_async(agent.code):
+                # Coroutine agents are awaited on the event loop.
+                result = await async_agents.run(
+                    tenant or SYSTEM_TENANT,
+                    run_agent_code_async,
+                    agent,
+                    payload,
+                    scheduled,
+                )
+            else:
+                # Run the agent code in a thread so as not to block the event loop.
+                result = await fair_executor.run(
+                    tenant or SYSTEM_TENANT,
+                    lane,
+                    agent.id,
+                    run_agent_code,
+                    agent,
+                    payload,
+                    scheduled,
+                )
             span.set_attribute("agent.execution.result", result)
         except Exception as e:
             span.record_exception(e)
@@ -531,6 +1562,988 @@ async def execute_agent(agent: AgentOut, payload: dict) -> Any:
         return result
 
 
+# --- Graceful Shutdown ---
+
+# Keep below gunicorn's --graceful-timeout (30s by default) so the drain finishes
+# before the worker is killed.
+DRAIN_TIMEOUT_SECONDS = float(os.getenv("DRAIN_TIMEOUT_SECONDS", "25"))
+# Where a draining worker leaves unstarted jobs for the next one. It must be
+# storage that outlives the instance (a mounted volume or bucket shared by all
+# instances); container-local disk is gone once Cloud Run scales the instance in.
+# Unset, unstarted jobs are logged as lost and interactive callers get a 503.
+DRAIN_JOURNAL_DIR = os.getenv("DRAIN_JOURNAL_DIR") or None
+TRACE_FLUSH_TIMEOUT_MS = int(os.getenv("TRACE_FLUSH_TIMEOUT_MS", "5000"))
+
+
+class Lifecycle:
+    """
+    Tracks in-flight executions and hands unfinished background jobs over on
+    shutdown.
+
+    Once `draining` is set, new requests are refused (see
+    LoadSheddingMiddleware) and `/health/ready` reports unavailable. Background
+    jobs that never started, such as scheduled runs still waiting for a slot, are
+    collected with `requeue` and written to a journal in DRAIN_JOURNAL_DIR; the
+    next worker to start claims the journal and runs them. Unstarted interactive
+    and batch executions are handed over the same way with `hand_off`, but only
+    when a journal is configured. Without one, their callers are told to retry
+    instead, and requeued jobs are logged as lost.
+    """
+
+    def __init__(self, journal_dir: Optional[str]) -> None:
+        self.journal_dir = journal_dir
+        self.draining = False
+        self.in_flight = 0
+        self._idle: Optional[asyncio.Event] = None
+        self._requeued: List[Dict[str, Any]] = []
+        self._tasks: Set[asyncio.Task] = set()
+
+    @contextlib.contextmanager
+    def track(self):
+        """Count an execution as in flight for the duration of the block."""
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            if self.in_flight == 0 and self._idle is not None:
+                self._idle.set()
+
+    async def wait_idle(self, timeout: float) -> bool:
+        """Wait until no execution is in flight; False if `timeout` ran out."""
+        if self.in_flight == 0:
+            return True
+        self._idle = asyncio.Event()
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._idle = None
+
+    def requeue(self, job: Dict[str, Any]) -> None:
+        self._requeued.append(job)
+
+    def hand_off(self, job: Dict[str, Any]) -> bool:
+        """Requeue a caller's execution; False if there is no journal to keep it."""
+        if not self.journal_dir:
+            return False
+        self.requeue(job)
+        return True
+
+    def spawn(self, job: Dict[str, Any]) -> None:
+        task = asyncio.get_running_loop().create_task(run_job(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def write_journal(self) -> Optional[str]:
+        """
+        Write requeued jobs to a new journal and return its path.
+
+        If DRAIN_JOURNAL_DIR is unset or the journal cannot be written, the jobs
+        are logged as lost instead; nothing else will run them.
+        """
+        jobs, self._requeued = self._requeued, []
+        if not jobs:
+            return None
+        if not self.journal_dir:
+            self._log_lost(jobs, "DRAIN_JOURNAL_DIR is not set")
+            return None
+        try:
+            os.makedirs(self.journal_dir, exist_ok=True)
+            path = os.path.join(
+                self.journal_dir, f"{os.getpid()}-{uuid.uuid4().hex}.json"
+            )
+            with tempfile.NamedTemporaryFile(
+                "w", dir=self.journal_dir, suffix=".tmp", delete=False
+            ) as f:
+                json.dump(jobs, f, default=str)
+            os.replace(f.name, path)
+        except OSError as e:
+            self._log_lost(jobs, f"the drain journal could not be written: {e}")
+            return None
+        return path
+
+    @staticmethod
+    def _log_lost(jobs: List[Dict[str, Any]], reason: str) -> None:
+        agents = ", ".join(sorted({job["agent"]["id"] for job in jobs}))
+        logger.error(
+            f"Lost {len(jobs)} unstarted jobs on shutdown because {reason} "
+            f"(agents: {agents})"
+        )
+
+    def claim_journal(self) -> List[Dict[str, Any]]:
+        """Take every journal left by drained workers; each is claimed once."""
+        if not self.journal_dir:
+            return []
+        try:
+            names = sorted(os.listdir(self.journal_dir))
+        except OSError:
+            return []
+        jobs = []
+        for name in names:
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.journal_dir, name)
+            claimed = f"{path}.claimed-{os.getpid()}"
+            try:
+                os.rename(path, claimed)
+            except OSError:
+                continue  # Another worker claimed it first.
+            try:
+                with open(claimed) as f:
+                    jobs.extend(json.load(f))
+            except (OSError, ValueError) as e:
+                logger.error(f"Discarding unreadable drain journal {name}: {e}")
+            finally:
+                os.unlink(claimed)
+        return jobs
+
+
+lifecycle = Lifecycle(DRAIN_JOURNAL_DIR)
+
+
+def scheduled_job(
+    schedule: ScheduleOut, agent: AgentOut, tenant: Optional[TenantPolicy]
+) -> Dict[str, Any]:
+    return {
+        "kind": "scheduled_run",
+        "schedule_id": schedule.id,
+        "agent": agent.dict(),
+        "payload": schedule.payload or {},
+        "tenant": tenant.dict() if tenant is not None else None,
+    }
+
+
+def execution_job(
+    agent: AgentOut, payload: Optional[Dict[str, Any]], tenant: Optional[TenantPolicy]
+) -> Dict[str, Any]:
+    """A job for an interactive or batch execution whose caller stopped waiting."""
+    return {
+        "kind": "execution",
+        "agent": agent.dict(),
+        "payload": payload or {},
+        "tenant": tenant.dict() if tenant is not None else None,
+    }
+
+
+async def run_job(job: Dict[str, Any]) -> None:
+    """
+    Run a background job in the batch lane, since nobody is waiting on it; if
+    shutdown prevents it from starting, requeue it.
+    """
+    agent = AgentOut.parse_obj(job["agent"])
+    tenant = TenantPolicy.parse_obj(job["tenant"]) if job.get("tenant") else None
+    scheduled = job["kind"] == "scheduled_run"
+    try:
+        await execute_agent(
+            agent, job["payload"], scheduled=scheduled, tenant=tenant, lane=BATCH
+        )
+    except ExecutionHandedOff:
+        pass  # Joined a coalesced execution that was journaled already.
+    except ExecutionNotStarted:
+        lifecycle.requeue(job)
+    except Exception as e:
+        logger.error(f"Requeued run of agent {agent.id} ({job['kind']}) failed: {e}")
+
+
+# --- Scheduled Executions ---
+
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+    "on",
+)
+SCHEDULER_MAX_CONCURRENCY = int(os.getenv("SCHEDULER_MAX_CONCURRENCY", "32"))
+# A run this late is treated as missed and handled by the schedule's policy.
+SCHEDULE_MISFIRE_GRACE_SECONDS = float(
+    os.getenv("SCHEDULE_MISFIRE_GRACE_SECONDS", "30")
+)
+SCHEDULE_MAX_CATCHUP = int(os.getenv("SCHEDULE_MAX_CATCHUP", "10"))
+MIN_SCHEDULE_INTERVAL_SECONDS = float(os.getenv("MIN_SCHEDULE_INTERVAL_SECONDS", "1"))
+
+# (minimum, maximum) of minute, hour, day of month, month, day of week.
+CRON_FIELD_RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 6))
+
+
+def parse_cron_field(field: str, low: int, high: int) -> Set[int]:
+    values = set()
+    for part in field.split(","):
+        expr, _, step = part.partition("/")
+        step = int(step) if step else 1
+        if expr == "*":
+            start, end = low, high
+        elif "-" in expr:
+            start, end = (int(x) for x in expr.split("-", 1))
+        else:
+            start = int(expr)
+            end = high if step > 1 else start
+        if step < 1:
+            raise ValueError(f"Cron field '{field}' has an invalid step")
+        if high == 6 and end == 7 and start <= 7:  # Day of week: 7 is also Sunday.
+            if (end - start) % step == 0:
+                values.add(0)
+            if start == 7:
+                continue
+            end = 6
+        if start < low or end > high or start > end:
+            raise ValueError(f"Cron field '{field}' is out of range {low}-{high}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSpec:
+    """
+    A parsed five-field cron expression (minute hour day-of-month month
+    day-of-week). As in cron, when both day fields are restricted a day matching
+    either one fires.
+    """
+
+    def __init__(self, expression: str) -> None:
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError("Cron expressions need exactly five fields")
+        try:
+            parsed = [
+                parse_cron_field(field, low, high)
+                for field, (low, high) in zip(fields, CRON_FIELD_RANGES)
+            ]
+        except ValueError as e:
+            raise ValueError(f"Invalid cron expression '{expression}': {e}")
+        self.minutes, self.hours, self.days, self.months, self.weekdays = parsed
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+
+    def _day_matches(self, dt: datetime) -> bool:
+        day_ok = dt.day in self.days
+        weekday_ok = (dt.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, timestamp: float) -> float:
+        """
+        Return the first matching minute strictly after `timestamp` (UTC epoch).
+        Skips whole months, days and hours that cannot match.
+        """
+        dt = datetime.utcfromtimestamp(timestamp).replace(second=0, microsecond=0)
+        dt += timedelta(minutes=1)
+        limit = dt + timedelta(days=366 * 5)
+        while dt < limit:
+            if dt.month not in self.months:
+                dt = (dt.replace(day=1) + timedelta(days=32)).replace(
+                    day=1, hour=0, minute=0
+                )
+            elif not self._day_matches(dt):
+                dt = (dt + timedelta(days=1)).replace(hour=0, minute=0)
+            elif dt.hour not in self.hours:
+                dt = (dt + timedelta(hours=1)).replace(minute=0)
+            elif dt.minute not in self.minutes:
+                dt += timedelta(minutes=1)
+            else:
+                return (dt - datetime(1970, 1, 1)).total_seconds()
+        raise ValueError("Cron expression never fires")
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_cron(expression: str) -> CronSpec:
+    return CronSpec(expression)
+
+
+def next_occurrence(schedule: ScheduleOut, after: float) -> float:
+    """
+    The schedule's first nominal run time strictly after `after` (UTC epoch).
+    Interval schedules stay aligned to their creation time.
+    """
+    if schedule.interval_seconds:
+        anchor = (schedule.created_at - datetime(1970, 1, 1)).total_seconds()
+        periods = max(0, int((after - anchor) // schedule.interval_seconds) + 1)
+        return anchor + periods * schedule.interval_seconds
+    return parse_cron(schedule.cron).next_after(after)
+
+
+class AgentScheduler:
+    """
+    Runs agent schedules from a single min-heap keyed by fire time, so adding,
+    removing and firing a schedule is O(log n) however many schedules exist.
+
+    Heap entries are (fire_at, seq, schedule_id, nominal_at); `fire_at` includes
+    the schedule's jitter. Removed or rescheduled entries are skipped lazily by
+    checking `_queued`. Schedules live in the memory of the worker that created
+    them, so every worker runs a scheduler and fires exactly the schedules it
+    holds; no schedule is known to two workers.
+    """
+
+    def __init__(self) -> None:
+        self._heap: List[Tuple[float, int, str, float]] = []
+        self._queued: Dict[str, float] = {}
+        self._seq = itertools.count()
+        self._tasks: Set[asyncio.Task] = set()
+        self._waiting: Set[asyncio.Task] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._runner: Optional[asyncio.Task] = None
+        self._tenants: Dict[str, TenantPolicy] = {}
+
+    def _push(self, schedule: ScheduleOut, nominal_at: float) -> None:
+        fire_at = nominal_at + random.uniform(0, schedule.jitter_seconds)
+        self._queued[schedule.id] = fire_at
+        heapq.heappush(self._heap, (fire_at, next(self._seq), schedule.id, nominal_at))
+        schedule.next_run_at = datetime.utcfromtimestamp(nominal_at)
+
+    def add(self, schedule: ScheduleOut, tenant: Optional[TenantPolicy] = None) -> None:
+        if tenant is not None:
+            self._tenants[schedule.id] = tenant
+        self._push(schedule, next_occurrence(schedule, time.time()))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def remove(self, schedule_id: str) -> None:
+        self._queued.pop(schedule_id, None)
+        self._tenants.pop(schedule_id, None)
+
+    def _missed_runs(self, schedule: ScheduleOut, nominal_at: float, now: float) -> int:
+        if schedule.missed_run_policy == "skip":
+            return 0
+        if schedule.missed_run_policy == "run_once":
+            return 1
+        runs = 0
+        while nominal_at <= now and runs < SCHEDULE_MAX_CATCHUP:
+            runs += 1
+            nominal_at = next_occurrence(schedule, nominal_at)
+        return runs
+
+    def fire_due(self, now: Optional[float] = None) -> int:
+        """
+        Start every run that is due. Returns the number of runs started.
+        """
+        now = time.time() if now is None else now
+        started = 0
+        while self._heap and self._heap[0][0] <= now:
+            fire_at, _, schedule_id, nominal_at = heapq.heappop(self._heap)
+            if self._queued.get(schedule_id) != fire_at:
+                continue
+            del self._queued[schedule_id]
+            schedule = schedules_db.get(schedule_id)
+            if schedule is None or not schedule.enabled:
+                continue
+            runs = 1
+            if now - fire_at > SCHEDULE_MISFIRE_GRACE_SECONDS:
+                runs = self._missed_runs(schedule, nominal_at, now)
+                logger.warning(
+                    f"Schedule {schedule_id} missed its run at "
+                    f"{datetime.utcfromtimestamp(nominal_at)}; "
+                    f"policy {schedule.missed_run_policy} starts {runs} run(s)"
+                )
+            for _ in range(runs):
+                task = asyncio.get_running_loop().create_task(self._run(schedule))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            started += runs
+            self._push(schedule, next_occurrence(schedule, max(nominal_at, now)))
+        return started
+
+    async def _run(self, schedule: ScheduleOut) -> None:
+        agent = agents_db.get(schedule.agent_id)
+        if agent is None:
+            logger.error(f"Schedule {schedule.id}: agent {schedule.agent_id} not found")
+            return
+        job = scheduled_job(schedule, agent, self._tenants.get(schedule.id))
+        task = asyncio.current_task()
+        self._waiting.add(task)
+        try:
+            await self._semaphore.acquire()
+        except asyncio.CancelledError:
+            if lifecycle.draining:
+                lifecycle.requeue(job)
+            raise
+        finally:
+            self._waiting.discard(task)
+        try:
+            schedule.last_run_at = datetime.utcnow()
+            schedule.run_count += 1
+            await run_job(job)
+        finally:
+            self._semaphore.release()
+
+    def cancel_waiting(self) -> List[asyncio.Task]:
+        """Cancel runs still waiting for a slot; while draining they are requeued."""
+        waiting = list(self._waiting)
+        for task in waiting:
+            task.cancel()
+        return waiting
+
+    async def _loop(self) -> None:
+        while True:
+            self._wakeup.clear()
+            self.fire_due()
+            timeout = 60.0
+            if self._heap:
+                timeout = min(timeout, max(0.0, self._heap[0][0] - time.time()))
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._semaphore = asyncio.Semaphore(SCHEDULER_MAX_CONCURRENCY)
+        self._runner = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            self._runner.cancel()
+            self._runner = None
+
+
+scheduler = AgentScheduler()
+
+
+# --- Workflows ---
+
+MAX_WORKFLOW_NODES = int(os.getenv("MAX_WORKFLOW_NODES", "100"))
+
+
+def validate_workflow(workflow: WorkflowRequest) -> Dict[str, AgentOut]:
+    """
+    Check that a workflow is a well-formed DAG of known agents.
+
+    Returns:
+        Dict[str, AgentOut]: The agent for each node id.
+
+    Raises:
+        HTTPException: 422 for malformed graphs and cycles, 404 for unknown agents.
+    """
+    if not workflow.nodes:
+        raise HTTPException(
+            status_code=422, detail="A workflow needs at least one node"
+        )
+    if len(workflow.nodes) > MAX_WORKFLOW_NODES:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Workflows are limited to {MAX_WORKFLOW_NODES} nodes",
+        )
+    node_ids = [node.id for node in workflow.nodes]
+    if len(set(node_ids)) != len(node_ids):
+        raise HTTPException(status_code=422, detail="Workflow node ids must be unique")
+    for edge in workflow.edges:
+        if edge.source not in node_ids or edge.target not in node_ids:
+            raise HTTPException(
+                status_code=422,
+                detail=f"Edge {edge.source} -> {edge.target} references an unknown node",
+            )
+
+    # Kahn's algorithm: any node never reaching in-degree zero sits on a cycle.
+    indegree = {node_id: 0 for node_id in node_ids}
+    for edge in workflow.edges:
+        indegree[edge.target] += 1
+    ready = [node_id for node_id, degree in indegree.items() if degree == 0]
+    visited = 0
+    while ready:
+        node_id = ready.pop()
+        visited += 1
+        for edge in workflow.edges:
+            if edge.source == node_id:
+                indegree[edge.target] -= 1
+                if indegree[edge.target] == 0:
+                    ready.append(edge.target)
+    if visited != len(node_ids):
+        raise HTTPException(status_code=422, detail="Workflow graph contains a cycle")
+
+    agents = {}
+    for node in workflow.nodes:
+        agent = agents_db.get(node.agent_id)
+        if not agent:
+            raise HTTPException(
+                status_code=404, detail=f"Agent {node.agent_id} not found"
+            )
+        agents[node.id] = agent
+    return agents
+
+
+async def run_workflow(
+    workflow: WorkflowRequest,
+    agents: Dict[str, AgentOut],
+    tenant: Optional[TenantPolicy] = None,
+):
+    """
+    Execute a validated workflow, yielding one event per node as it settles and a
+    final summary event.
+
+    A node starts as soon as all of its inputs are available, so independent
+    branches run concurrently through `execute_agent`. Outputs are handed to
+    downstream nodes in memory under each edge's `input_key`. Nodes downstream
+    of a failure are skipped; with `fail_fast`, nothing new starts after one.
+    """
+    nodes = {node.id: node for node in workflow.nodes}
+    incoming: Dict[str, List[WorkflowEdge]] = {node_id: [] for node_id in nodes}
+    outgoing: Dict[str, List[WorkflowEdge]] = {node_id: [] for node_id in nodes}
+    for edge in workflow.edges:
+        incoming[edge.target].append(edge)
+        outgoing[edge.source].append(edge)
+    waiting = {node_id: len(edges) for node_id, edges in incoming.items()}
+    results: Dict[str, Any] = {}
+    statuses: Dict[str, str] = {}
+    running: Dict[asyncio.Task, str] = {}
+    started_at: Dict[str, float] = {}
+
+    def start(node_id: str) -> None:
+        node = nodes[node_id]
+        payload = {**(workflow.payload or {}), **(node.payload or {})}
+        for edge in incoming[node_id]:
+            payload[edge.input_key or edge.source] = results[edge.source]
+        started_at[node_id] = time.time()
+        task = asyncio.create_task(
+            execute_agent(agents[node_id], payload, tenant=tenant)
+        )
+        running[task] = node_id
+
+    def settle(node_id: str) -> List[Dict[str, Any]]:
+        # Release downstream nodes; returns events for nodes skipped as a result.
+        events = []
+        pending = [node_id]
+        while pending:
+            settled = pending.pop()
+            for edge in outgoing[settled]:
+                waiting[edge.target] -= 1
+                if waiting[edge.target]:
+                    continue
+                upstream_ok = all(
+                    statuses[e.source] == "succeeded" for e in incoming[edge.target]
+                )
+                failed = "failed" in statuses.values()
+                if upstream_ok and not (workflow.fail_fast and failed):
+                    start(edge.target)
+                else:
+                    statuses[edge.target] = "skipped"
+                    events.append({"node": edge.target, "status": "skipped"})
+                    pending.append(edge.target)
+        return events
+
+    workflow_start = time.time()
+    for node_id, count in waiting.items():
+        if count == 0:
+            start(node_id)
+    try:
+        while running:
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                node_id = running.pop(task)
+                event = {
+                    "node": node_id,
+                    "agent_id": nodes[node_id].agent_id,
+                    "elapsed": round(time.time() - started_at[node_id], 4),
+                }
+                try:
+                    results[node_id] = task.result()
+                    statuses[node_id] = "succeeded"
+                    event.update(status="succeeded", result=results[node_id])
+                except Exception as e:
+                    statuses[node_id] = "failed"
+                    event.update(status="failed", error=str(e))
+                yield event
+                for skipped in settle(node_id):
+                    yield skipped
+    finally:
+        # The client went away or the loop is shutting down.
+        for task in running:
+            task.cancel()
+
+    counts = {
+        status: sum(1 for value in statuses.values() if value == status)
+        for status in ("succeeded", "failed", "skipped")
+    }
+    yield {
+        "workflow": "completed" if counts["succeeded"] == len(nodes) else "failed",
+        **counts,
+        "elapsed": round(time.time() - workflow_start, 4),
+    }
+
+
+# --- HTTP Compression ---
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Responses smaller than this are sent uncompressed.
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "5"))
+COMPRESSION_ZSTD_LEVEL = int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3"))
+# Upper bound on a decompressed request body, to guard against compression bombs.
+MAX_DECOMPRESSED_BODY_SIZE = int(
+    os.getenv("MAX_DECOMPRESSED_BODY_SIZE", str(64 * 1024 * 1024))
+)
+# Bodies above this size are (de)compressed off the event loop.
+COMPRESSION_OFFLOAD_SIZE = 1024 * 1024
+# Streamed responses are passed through as they are produced, never buffered.
+STREAMING_CONTENT_TYPES = (b"application/x-ndjson", b"text/event-stream")
+
+
+def choose_response_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    Pick the best supported content coding from an Accept-Encoding header.
+    """
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(coding.strip())
+    if zstandard is not None and "zstd" in accepted:
+        return "zstd"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+def compress_body(body: bytes, encoding: str) -> bytes:
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=COMPRESSION_ZSTD_LEVEL).compress(body)
+    return gzip.compress(body, compresslevel=COMPRESSION_GZIP_LEVEL)
+
+
+def decompress_body(body: bytes, encoding: str) -> bytes:
+    """
+    Decode a request body sent with Content-Encoding gzip or zstd.
+
+    Raises:
+        HTTPException: 415 for unsupported codings, 413 if the decoded body is too
+            large, 400 if the body cannot be decoded.
+    """
+    try:
+        if encoding == "gzip":
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            data = decompressor.decompress(body, MAX_DECOMPRESSED_BODY_SIZE + 1)
+        elif encoding == "zstd" and zstandard is not None:
+            reader = zstandard.ZstdDecompressor().stream_reader(body)
+            data = reader.read(MAX_DECOMPRESSED_BODY_SIZE + 1)
+        else:
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail=f"Unsupported Content-Encoding: {encoding}",
+            )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=400, detail=f"Could not decode {encoding} request body: {e}"
+        )
+    if len(data) > MAX_DECOMPRESSED_BODY_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="Decompressed request body is too large.",
+        )
+    return data
+
+
+async def run_codec(fn, body: bytes, encoding: str) -> bytes:
+    if len(body) >= COMPRESSION_OFFLOAD_SIZE:
+        return await asyncio.to_thread(fn, body, encoding)
+    return fn(body, encoding)
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware that decodes gzip/zstd request bodies and compresses responses.
+
+    Request bodies sent with a Content-Encoding header are decoded before they reach
+    the endpoint, so large execute/batch_execute payloads can be uploaded compressed.
+    Responses of at least `COMPRESSION_MIN_SIZE` bytes are compressed with zstd (when
+    the `zstandard` package is installed and the client accepts it) or gzip.
+    Streaming responses (`STREAMING_CONTENT_TYPES`) are passed through untouched.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = {k.lower(): v for k, v in scope["headers"]}
+        request_encoding = headers.get(b"content-encoding", b"").decode().lower()
+        if request_encoding and request_encoding != "identity":
+            try:
+                scope, receive = await self._decode_request(
+                    scope, receive, request_encoding
+                )
+            except HTTPException as e:
+                await self._send_error(send, e)
+                return
+
+        response_encoding = choose_response_encoding(
+            headers.get(b"accept-encoding", b"").decode()
+        )
+        if response_encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        body_parts: List[bytes] = []
+        passthrough = False
+
+        async def send_wrapper(message) -> None:
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                response_headers = {k.lower(): v for k, v in message.get("headers", [])}
+                content_type = response_headers.get(b"content-type", b"")
+                if content_type.split(b";")[0].strip() in STREAMING_CONTENT_TYPES:
+                    passthrough = True
+                    await send(message)
+                    return
+                start_message = message
+                return
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] != "http.response.body" or start_message is None:
+                await send(message)
+                return
+            body_parts.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            await self._send_response(
+                send, start_message, b"".join(body_parts), response_encoding
+            )
+
+        await self.app(scope, receive, send_wrapper)
+
+    async def _decode_request(self, scope, receive, encoding: str):
+        chunks = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                raise HTTPException(status_code=400, detail="Client disconnected")
+            chunks.append(message.get("body", b""))
+            more_body = message.get("more_body", False)
+        body = await run_codec(decompress_body, b"".join(chunks), encoding)
+
+        new_headers = [
+            (k, v)
+            for k, v in scope["headers"]
+            if k.lower() not in (b"content-encoding", b"content-length")
+        ]
+        new_headers.append((b"content-length", str(len(body)).encode()))
+        scope = dict(scope, headers=new_headers)
+        sent = False
+
+        async def decoded_receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        return scope, decoded_receive
+
+    async def _send_response(self, send, start_message, body: bytes, encoding: str):
+        headers = list(start_message.get("headers", []))
+        header_names = {k.lower() for k, _ in headers}
+        if (
+            len(body) >= COMPRESSION_MIN_SIZE
+            and b"content-encoding" not in header_names
+        ):
+            body = await run_codec(compress_body, body, encoding)
+            headers = [(k, v) for k, v in headers if k.lower() != b"content-length"] + [
+                (b"content-encoding", encoding.encode()),
+                (b"content-length", str(len(body)).encode()),
+                (b"vary", b"Accept-Encoding"),
+            ]
+        await send(dict(start_message, headers=headers))
+        await send({"type": "http.response.body", "body": body, "more_body": False})
+
+    async def _send_error(self, send, exc: HTTPException) -> None:
+        body = json.dumps({"detail": exc.detail}).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": exc.status_code,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+
+# --- Load Shedding ---
+
+LOAD_SHEDDING_ENABLED = os.getenv("LOAD_SHEDDING_ENABLED", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+    "on",
+)
+LOOP_LAG_INTERVAL_SECONDS = float(os.getenv("LOOP_LAG_INTERVAL_SECONDS", "0.1"))
+LOOP_LAG_TARGET_MS = float(os.getenv("LOOP_LAG_TARGET_MS", "100"))
+QUEUE_WAIT_TARGET_MS = float(os.getenv("QUEUE_WAIT_TARGET_MS", "1000"))
+ADAPTIVE_LIMIT_INITIAL = int(os.getenv("ADAPTIVE_LIMIT_INITIAL", "64"))
+ADAPTIVE_LIMIT_MIN = int(os.getenv("ADAPTIVE_LIMIT_MIN", "4"))
+ADAPTIVE_LIMIT_MAX = int(os.getenv("ADAPTIVE_LIMIT_MAX", "1024"))
+ADAPTIVE_LIMIT_BACKOFF = float(os.getenv("ADAPTIVE_LIMIT_BACKOFF", "0.9"))
+# The limit is adjusted at most this often, so one congested stretch is not
+# punished once per sample.
+ADAPTIVE_LIMIT_ADJUST_SECONDS = float(os.getenv("ADAPTIVE_LIMIT_ADJUST_SECONDS", "1"))
+# Probes and observability stay reachable while the worker is shedding.
+LOAD_SHEDDING_EXEMPT_PATHS = ("/health", "/metrics", "/docs", "/openapi.json")
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit for in-flight HTTP requests, fed by congestion signals.
+
+    A background task samples event-loop lag (how late a short sleep wakes up)
+    every LOOP_LAG_INTERVAL_SECONDS, plus how long the oldest job has waited in
+    `fair_executor`. When either exceeds its target the limit is cut by
+    ADAPTIVE_LIMIT_BACKOFF; while both are healthy and the limit is actually
+    binding it grows by one. Requests beyond the limit are rejected with 503 and
+    a Retry-After derived from the current backlog, so excess load is refused
+    quickly instead of every request timing out.
+
+    Request latency itself is not a signal: agent executions legitimately run for
+    minutes, and only time spent waiting indicates overload.
+    """
+
+    def __init__(self) -> None:
+        self.limit = float(ADAPTIVE_LIMIT_INITIAL)
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.shed = 0
+        self.loop_lag = 0.0
+        self.max_loop_lag = 0.0
+        self.congested = False
+        self._last_adjust = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def try_acquire(self) -> bool:
+        if self.in_flight >= int(self.limit):
+            self.shed += 1
+            return False
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        return True
+
+    def release(self) -> None:
+        self.in_flight -= 1
+
+    def retry_after(self) -> int:
+        backlog = max(self.loop_lag, fair_executor.oldest_wait())
+        return max(1, min(60, int(backlog) + 1))
+
+    def observe(self, lag: float) -> None:
+        """Record one loop-lag sample and adjust the limit."""
+        self.loop_lag = lag if self.loop_lag == 0 else 0.7 * self.loop_lag + 0.3 * lag
+        self.max_loop_lag = max(self.max_loop_lag, lag)
+        self.congested = (
+            self.loop_lag * 1000 > LOOP_LAG_TARGET_MS
+            or fair_executor.oldest_wait() * 1000 > QUEUE_WAIT_TARGET_MS
+        )
+        now = time.monotonic()
+        if now - self._last_adjust < ADAPTIVE_LIMIT_ADJUST_SECONDS:
+            return
+        if self.congested:
+            self.limit = max(ADAPTIVE_LIMIT_MIN, self.limit * ADAPTIVE_LIMIT_BACKOFF)
+        elif self.peak_in_flight >= int(self.limit):
+            self.limit = min(ADAPTIVE_LIMIT_MAX, self.limit + 1)
+        else:
+            return
+        self._last_adjust = now
+        self.peak_in_flight = self.in_flight
+
+    async def _sample(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(LOOP_LAG_INTERVAL_SECONDS)
+            lag = loop.time() - started - LOOP_LAG_INTERVAL_SECONDS
+            try:
+                self.observe(max(0.0, lag))
+            except Exception as e:
+                logger.error(f"Load monitor failed: {e}")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._sample())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def state(self) -> Dict[str, Any]:
+        return {
+            "monitoring": self._task is not None and not self._task.done(),
+            "congested": self.congested,
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "shed": self.shed,
+            "loop_lag_ms": round(self.loop_lag * 1000, 1),
+            "max_loop_lag_ms": round(self.max_loop_lag * 1000, 1),
+        }
+
+
+load_limiter = AdaptiveLimiter()
+
+
+class LoadSheddingMiddleware:
+    """
+    ASGI middleware that rejects requests above `load_limiter`'s limit, and all
+    new requests once the worker is draining for shutdown.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or scope["path"].startswith(
+            LOAD_SHEDDING_EXEMPT_PATHS
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        if lifecycle.draining:
+            await self._reject(send, "Server is shutting down; retry later.", 1)
+            return
+        if not LOAD_SHEDDING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        if not load_limiter.try_acquire():
+            await self._reject(
+                send, "Server is overloaded; retry later.", load_limiter.retry_after()
+            )
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            load_limiter.release()
+
+    async def _reject(self, send, detail: str, retry_after: int) -> None:
+        body = json.dumps({"detail": detail}).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(retry_after).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+
 # --- FastAPI Application Setup ---
 
 app = FastAPI(
@@ -551,6 +2564,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Decode compressed request bodies and compress large responses.
+app.add_middleware(CompressionMiddleware)
+
+# Added last so it runs first and rejects excess load before any other work.
+app.add_middleware(LoadSheddingMiddleware)
+
 # --- API Endpoints ---
 
 
@@ -609,8 +2628,15 @@ async def create_agent(agent_in: AgentCreate, x_api_key: str = Header(...)) -> A
     """
     Create a new agent.
 
-    The provided code is stored and will be executed directly when requested.
+    The provided code is compiled up front, so syntax errors are rejected with 422
+    and the first execution does not pay for compilation.
     """
+    if agent_in.code is not None:
+        try:
+            bytecode_cache.store(agent_in.code)
+        except AgentCodeError as e:
+            raise HTTPException(status_code=422, detail=f"Invalid agent code: {e}")
+
     try:
         deduct_credits(x_api_key, 0.1, "swarms_cloud_new_agent")
 
@@ -623,6 +2649,7 @@ async def create_agent(agent_in: AgentCreate, x_api_key: str = Header(...)) -> A
             requirements=agent_in.requirements,
             envs=agent_in.envs,
             autoscaling=agent_in.autoscaling or False,
+            coalesce=agent_in.coalesce or False,
             created_at=datetime.utcnow(),
         )
         agents_db[agent_id] = agent
@@ -666,6 +2693,11 @@ async def update_agent(agent_id: str, agent_update: AgentUpdate) -> AgentOut:
         raise HTTPException(status_code=404, detail="Agent not found")
 
     update_data = agent_update.dict(exclude_unset=True)
+    if update_data.get("code") is not None:
+        try:
+            bytecode_cache.store(update_data["code"])
+        except AgentCodeError as e:
+            raise HTTPException(status_code=422, detail=f"Invalid agent code: {e}")
     for field, value in update_data.items():
         setattr(agent, field, value)
     agents_db[agent_id] = agent
@@ -689,6 +2721,12 @@ async def update_agent(agent_id: str, agent_update: AgentUpdate) -> AgentOut:
 #     logger.info(f"Deleted agent {agent_id}")
 
 
+REQUEUED_DETAIL = (
+    "This worker shut down before the execution started; another worker will "
+    "run it, so do not retry."
+)
+
+
 @app.post(
     "/agents/{agent_id}/execute",
     dependencies=[Depends(verify_api_key), Depends(rate_limit_dependency)],
@@ -697,6 +2735,7 @@ async def execute_agent_endpoint(
     agent_id: str,
     exec_payload: ExecutionPayload,
     background_tasks: BackgroundTasks,
+    x_api_key: str = Header(...),
 ) -> Dict[str, Any]:
     """
     Execute an agent manually.
@@ -711,12 +2750,24 @@ async def execute_agent_endpoint(
             logger.error(f"Agent {agent_id} not found")
             raise HTTPException(status_code=404, detail="Agent not found")
 
-        result = await execute_agent(agent, exec_payload.payload)
+        tenant = await get_tenant_policy(x_api_key)
+        result = await execute_agent(
+            agent, exec_payload.payload, tenant=tenant, hand_off=True
+        )
         logger.info(f"Successfully executed agent {agent_id}")
         return {"return_value": result}
 
     except HTTPException:
         raise
+    except ExecutionHandedOff:
+        return JSONResponse(
+            status_code=202,
+            content={"status": "requeued", "detail": REQUEUED_DETAIL},
+        )
+    except ExecutionNotStarted as e:
+        raise HTTPException(
+            status_code=503, detail=str(e), headers={"Retry-After": "1"}
+        )
     except Exception as e:
         logger.error(f"Error executing agent {agent_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -752,22 +2803,223 @@ async def get_agent_history(agent_id: str) -> AgentExecutionHistory:
     dependencies=[Depends(verify_api_key), Depends(rate_limit_dependency)],
 )
 async def batch_execute_agents(
-    agents: List[AgentOut], payload: ExecutionPayload
+    agents: List[AgentOut], payload: ExecutionPayload, x_api_key: str = Header(...)
 ) -> List[Any]:
-    """Batch execute agents."""
+    """Batch execute agents in the batch lane, behind interactive executions."""
     logger.info(f"Starting batch execution for {len(agents)} agents")
     try:
-        results = await asyncio.gather(
-            *[execute_agent(agent, payload.payload) for agent in agents]
+        tenant = await get_tenant_policy(x_api_key)
+        outcomes = await asyncio.gather(
+            *[
+                execute_agent(
+                    agent, payload.payload, tenant=tenant, lane=BATCH, hand_off=True
+                )
+                for agent in agents
+            ],
+            return_exceptions=True,
         )
+        results = []
+        for outcome in outcomes:
+            if isinstance(outcome, ExecutionHandedOff):
+                outcome = {"status": "requeued", "detail": REQUEUED_DETAIL}
+            elif isinstance(outcome, BaseException):
+                raise outcome
+            results.append(outcome)
         logger.info("Successfully completed batch execution")
         return results
 
+    except ExecutionNotStarted as e:
+        raise HTTPException(
+            status_code=503, detail=str(e), headers={"Retry-After": "1"}
+        )
     except Exception as e:
         logger.error(f"Error during batch execution: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post(
+    "/workflows/run",
+    dependencies=[Depends(verify_api_key), Depends(rate_limit_dependency)],
+)
+async def run_workflow_endpoint(
+    workflow: WorkflowRequest, x_api_key: str = Header(...)
+) -> StreamingResponse:
+    """
+    Run a DAG of agents server-side and stream one JSON line per node as it
+    finishes, followed by a summary line.
+
+    Edges pass a node's return value to its targets (under `input_key`). A
+    sequential pipeline is a chain of edges; nodes without edges run concurrently.
+    """
+    agents = validate_workflow(workflow)
+    tenant = await get_tenant_policy(x_api_key)
+    logger.info(
+        f"Running workflow with {len(workflow.nodes)} nodes and {len(workflow.edges)} edges"
+    )
+
+    async def events():
+        async for event in run_workflow(workflow, agents, tenant):
+            yield json.dumps(event, default=str) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+@app.post(
+    "/agents/{agent_id}/schedules",
+    response_model=ScheduleOut,
+    status_code=201,
+    dependencies=[Depends(verify_api_key), Depends(rate_limit_dependency)],
+)
+async def create_schedule(
+    agent_id: str, schedule_in: ScheduleCreate, x_api_key: str = Header(...)
+) -> ScheduleOut:
+    """
+    Schedule recurring executions of an agent, by cron expression or fixed
+    interval. Scheduled runs receive `request.scheduled == True`.
+    """
+    if agent_id not in agents_db:
+        raise HTTPException(status_code=404, detail="Agent not found")
+    if (schedule_in.cron is None) == (schedule_in.interval_seconds is None):
+        raise HTTPException(
+            status_code=422, detail="Provide exactly one of cron or interval_seconds"
+        )
+    if (
+        schedule_in.interval_seconds is not None
+        and schedule_in.interval_seconds < MIN_SCHEDULE_INTERVAL_SECONDS
+    ):
+        raise HTTPException(
+            status_code=422,
+            detail=f"interval_seconds must be at least {MIN_SCHEDULE_INTERVAL_SECONDS}",
+        )
+
+    schedule = ScheduleOut(
+        id=str(uuid.uuid4()),
+        agent_id=agent_id,
+        created_at=datetime.utcnow(),
+        **schedule_in.dict(),
+    )
+    # Also rejects valid crons that never fire, such as "0 0 30 2 *".
+    try:
+        next_occurrence(schedule, time.time())
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    schedules_db[schedule.id] = schedule
+    scheduler.add(schedule, await get_tenant_policy(x_api_key))
+    record_execution(agent_id, f"Schedule {schedule.id} created")
+    logger.info(f"Created schedule {schedule.id} for agent {agent_id}")
+    return schedule
+
+
+@app.get(
+    "/agents/{agent_id}/schedules",
+    response_model=List[ScheduleOut],
+    dependencies=[Depends(verify_api_key), Depends(rate_limit_dependency)],
+)
+async def list_schedules(agent_id: str) -> List[ScheduleOut]:
+    """List an agent's schedules."""
+    if agent_id not in agents_db:
+        raise HTTPException(status_code=404, detail="Agent not found")
+    return [s for s in schedules_db.values() if s.agent_id == agent_id]
+
+
+@app.delete(
+    "/agents/{agent_id}/schedules/{schedule_id}",
+    status_code=204,
+    dependencies=[Depends(verify_api_key)],
+)
+async def delete_schedule(agent_id: str, schedule_id: str) -> None:
+    """Delete a schedule; runs already in progress finish."""
+    schedule = schedules_db.get(schedule_id)
+    if not schedule or schedule.agent_id != agent_id:
+        raise HTTPException(status_code=404, detail="Schedule not found")
+    del schedules_db[schedule_id]
+    scheduler.remove(schedule_id)
+    logger.info(f"Deleted schedule {schedule_id} for agent {agent_id}")
+
+
+@app.on_event("startup")
+async def start_load_monitor() -> None:
+    load_limiter.start()
+
+
+@app.on_event("startup")
+async def start_scheduler() -> None:
+    if SCHEDULER_ENABLED:
+        scheduler.start()
+
+
+@app.on_event("startup")
+async def preload_agent_bytecode() -> None:
+    if AGENT_BYTECODE_PRELOAD > 0:
+        loaded = await asyncio.get_running_loop().run_in_executor(
+            None, bytecode_cache.preload, AGENT_BYTECODE_PRELOAD
+        )
+        logger.info(f"Preloaded {loaded} compiled agents ({BYTECODE_TAG})")
+
+
+@app.on_event("startup")
+async def start_fork_server() -> None:
+    if resolve_backend(None) == FORKSERVER_BACKEND:
+        await asyncio.get_running_loop().run_in_executor(None, fork_server.start)
+        logger.info(f"Fork server started with preload {fork_server.preload}")
+
+
+@app.on_event("startup")
+async def requeue_drained_jobs() -> None:
+    if not lifecycle.journal_dir:
+        logger.warning(
+            "DRAIN_JOURNAL_DIR is not set; executions left unstarted at shutdown "
+            "will be lost"
+        )
+        return
+    jobs = await asyncio.get_running_loop().run_in_executor(
+        None, lifecycle.claim_journal
+    )
+    for job in jobs:
+        lifecycle.spawn(job)
+    if jobs:
+        logger.info(f"Requeued {len(jobs)} jobs left by drained workers")
+
+
+@app.on_event("shutdown")
+async def graceful_shutdown() -> None:
+    """
+    Drain this worker: refuse new work, let in-flight executions finish up to
+    DRAIN_TIMEOUT_SECONDS, hand unstarted executions to the next worker and
+    flush buffered traces before the runtimes are torn down.
+    """
+    lifecycle.draining = True
+    logger.info(f"Draining {lifecycle.in_flight} in-flight executions")
+    await scheduler.stop()
+    waiting = scheduler.cancel_waiting()
+    if waiting:
+        await asyncio.wait(waiting, timeout=1)
+
+    if not await lifecycle.wait_idle(DRAIN_TIMEOUT_SECONDS):
+        dropped = fair_executor.cancel_queued() + async_agents.cancel_waiting()
+        logger.warning(
+            f"Drain deadline passed with {lifecycle.in_flight} executions in flight; "
+            f"{dropped} queued executions were not started"
+        )
+        # Let callers of the dropped executions requeue their jobs.
+        await asyncio.sleep(0.1)
+
+    path = await asyncio.get_running_loop().run_in_executor(
+        None, lifecycle.write_journal
+    )
+    if path:
+        logger.info(f"Wrote unfinished jobs to {path}")
+
+    await load_limiter.stop()
+    fair_executor.shutdown()
+    fork_server.stop()
+    try:
+        tracer_provider.force_flush(TRACE_FLUSH_TIMEOUT_MS)
+        tracer_provider.shutdown()
+    except Exception as e:
+        logger.error(f"Failed to flush traces on shutdown: {e}")
+
+
 @app.get("/")
 def root():
     return {
@@ -775,11 +3027,58 @@ def root():
     }
 
 
+@app.get("/metrics", dependencies=[Depends(verify_api_key)])
+def metrics() -> Dict[str, Any]:
+    """Execution, coalescing and bytecode cache counters for this worker."""
+    return {
+        "executor": fair_executor.stats(),
+        "async_agents": async_agents.stats(),
+        "fork_server": fork_server.stats(),
+        "load": load_limiter.state(),
+        "single_flight": single_flight.stats(),
+        "bytecode": bytecode_cache.stats(),
+    }
+
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
 
+@app.get("/health/ready")
+async def health_ready() -> JSONResponse:
+    """
+    Deep readiness check for load balancers.
+
+    Returns 503 while this worker is draining, congested (event-loop lag or
+    executor queue wait above target) or its fork server is down, so traffic is
+    routed elsewhere before requests start timing out.
+    """
+    load = load_limiter.state()
+    executor = fair_executor.stats()
+    checks = {
+        "accepting": not lifecycle.draining,
+        "event_loop": load["monitoring"] and not load["congested"],
+        "executor": executor["oldest_wait_ms"] <= QUEUE_WAIT_TARGET_MS,
+    }
+    if resolve_backend(None) == FORKSERVER_BACKEND:
+        checks["fork_server"] = fork_server.stats()["running"]
+    ready = all(checks.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "ready" if ready else "unavailable",
+            "checks": checks,
+            "load": load,
+            "executor": {
+                key: executor[key]
+                for key in ("running", "queue_depth", "oldest_wait_ms")
+            },
+            "async_agents": async_agents.stats(),
+        },
+    )
+
+
 # --- Main Entrypoint ---
 
 if __name__ == "__main__":
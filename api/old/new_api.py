@@ -8,30 +8,44 @@ Users must supply their API key via the `x-api-key` header, and they can only ma
 deployments that belong to them.
 
 Endpoints:
-  - POST   /swarms/       Create a new swarm (deployment)
+  - POST   /swarms/       Create a new swarm (deployment, provisioned in the background)
   - GET    /swarms/       List all swarms for the user
-  - GET    /swarms/{id}   Get details of a swarm
+  - GET    /swarms/{id}   Get details and provisioning status of a swarm
   - PUT    /swarms/{id}   Update a swarm’s configuration
   - DELETE /swarms/{id}   Delete a swarm
 
 Each swarm includes a name, description, Docker Hub image, and autoscaling parameters.
 """
 
+import abc
+import asyncio
 import atexit
+import functools
+import hashlib
+import itertools
 import os
 import shutil
+import sqlite3
 import tempfile
+import threading
 import time
 import uuid
-from typing import Any, Dict, List, Optional
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from enum import Enum
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
 
 import docker
-from fastapi import Body, Depends, FastAPI, Header, HTTPException, status
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+import anyio
 import httpx
-from kubernetes import client, config
+from kubernetes import client, config, watch
 from kubernetes.client.rest import ApiException
-from pydantic import BaseModel, Field
+from kubernetes.utils import parse_quantity
+from pydantic import BaseModel, Field, ValidationError
 from loguru import logger
 import uvicorn
 from dotenv import load_dotenv
@@ -135,49 +149,442 @@ def create_docker_client() -> docker.DockerClient:
             raise
 
 
-def pull_docker_image(image: str) -> None:
+_docker_client: Optional[docker.DockerClient] = None
+_docker_client_lock = threading.Lock()
+
+
+def get_docker_client() -> docker.DockerClient:
     """
-    Pulls the specified Docker image from Docker Hub.
+    Return the process-wide Docker client, creating it (and writing the TLS
+    certificate files) only on first use.
     """
-    logger.info("Pulling image '{}' from Docker Hub...", image)
-    docker_client = create_docker_client()
-    try:
-        docker_client.images.pull(image)
+    global _docker_client
+    with _docker_client_lock:
+        if _docker_client is None:
+            _docker_client = create_docker_client()
+        return _docker_client
+
+
+IMAGE_DIGEST_TTL = float(os.environ.get("IMAGE_DIGEST_TTL", "300"))
+
+
+class ImageCache:
+    """
+    Tracks which image digests are present on the Docker host so that images are
+    only pulled when the registry has content we do not already have.
+
+    For each image reference the registry manifest digest is resolved (and cached for
+    `ttl` seconds) and compared against the local image's RepoDigests; a pull only
+    happens on a mismatch. A digest seen locally is also trusted for `ttl` seconds
+    only, after which the host is checked again in case the image was removed.
+    Concurrent requests for the same reference share a single in-flight pull.
+    """
+
+    def __init__(self, ttl: float = IMAGE_DIGEST_TTL) -> None:
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # Digest -> when it was last seen on the Docker host.
+        self._local_digests: Dict[str, float] = {}
+        self._reference_digests: Dict[str, Tuple[str, float]] = {}
+        self._inflight: Dict[str, Future] = {}
+
+    def ensure(self, image: str) -> Optional[str]:
+        """
+        Make sure `image` is present locally, pulling it only if necessary.
+
+        Returns:
+            Optional[str]: The image digest, if it could be determined.
+        """
+        with self._lock:
+            future = self._inflight.get(image)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[image] = future
+        if not owner:
+            logger.info("Waiting for in-flight pull of image '{}'", image)
+            return future.result()
+
+        try:
+            digest = self._ensure(image)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(digest)
+            return digest
+        finally:
+            with self._lock:
+                self._inflight.pop(image, None)
+
+    def _registry_digest(self, docker_client: docker.DockerClient, image: str):
+        with self._lock:
+            cached = self._reference_digests.get(image)
+        if cached and time.monotonic() - cached[1] < self.ttl:
+            return cached[0]
+        try:
+            digest = docker_client.images.get_registry_data(image).id
+        except docker.errors.APIError as e:
+            logger.warning("Could not resolve registry digest for '{}': {}", image, e)
+            return None
+        with self._lock:
+            self._reference_digests[image] = (digest, time.monotonic())
+        return digest
+
+    @staticmethod
+    def _local_repo_digests(docker_client: docker.DockerClient, image: str) -> Set[str]:
+        try:
+            local_image = docker_client.images.get(image)
+        except docker.errors.ImageNotFound:
+            return set()
+        return {
+            repo_digest.split("@", 1)[1]
+            for repo_digest in local_image.attrs.get("RepoDigests", [])
+            if "@" in repo_digest
+        }
+
+    def _ensure(self, image: str) -> Optional[str]:
+        docker_client = get_docker_client()
+        digest = self._registry_digest(docker_client, image)
+        if digest is not None:
+            with self._lock:
+                seen_at = self._local_digests.get(digest)
+            known = seen_at is not None and time.monotonic() - seen_at < self.ttl
+            if known or digest in self._local_repo_digests(docker_client, image):
+                logger.info(
+                    "Image '{}' ({}) already present; skipping pull.", image, digest
+                )
+                if not known:
+                    with self._lock:
+                        self._local_digests[digest] = time.monotonic()
+                return digest
+            with self._lock:
+                self._local_digests.pop(digest, None)
+
+        logger.info("Pulling image '{}' from Docker Hub...", image)
+        try:
+            docker_client.images.pull(image)
+        except docker.errors.APIError as e:
+            logger.error("Failed to pull image '{}': {}", image, e)
+            raise
         logger.success("Successfully pulled image '{}'.", image)
-    except docker.errors.APIError as e:
-        logger.error("Failed to pull image '{}': {}", image, e)
-        raise
 
+        local_digests = self._local_repo_digests(docker_client, image)
+        now = time.monotonic()
+        with self._lock:
+            self._local_digests.update((d, now) for d in local_digests)
+        return digest or next(iter(local_digests), None)
+
+
+image_cache = ImageCache()
+
+
+def pull_docker_image(image: str) -> None:
+    """
+    Ensures the specified Docker image is available, pulling it from Docker Hub only
+    when the local copy is missing or stale.
+    """
+    image_cache.ensure(image)
+
+
+# ------------------------------------------------------------------------------
+# Kubernetes Client Manager
+# ------------------------------------------------------------------------------
+
+K8S_POOL_MAXSIZE = int(os.environ.get("K8S_POOL_MAXSIZE", "32"))
+K8S_CONFIG_REFRESH_SECONDS = float(os.environ.get("K8S_CONFIG_REFRESH_SECONDS", "600"))
+
+
+class KubernetesClientManager:
+    """
+    Lazily loads the Kubernetes configuration once and hands out API objects that
+    share a single `ApiClient` (and therefore a single urllib3 connection pool).
+
+    In-cluster configuration (service account token) is used when available, with a
+    fallback to the local kubeconfig. The configuration is reloaded after
+    `refresh_seconds`, or immediately via `invalidate()` (e.g. after a 401), so
+    rotated credentials are picked up without re-parsing kubeconfig on every call.
+    """
+
+    def __init__(
+        self,
+        pool_maxsize: int = K8S_POOL_MAXSIZE,
+        refresh_seconds: float = K8S_CONFIG_REFRESH_SECONDS,
+    ) -> None:
+        self.pool_maxsize = pool_maxsize
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._api_client: Optional[client.ApiClient] = None
+        self._apis: Dict[type, Any] = {}
+        self._loaded_at = 0.0
+
+    def _load(self) -> None:
+        configuration = client.Configuration()
+        try:
+            config.load_incluster_config(client_configuration=configuration)
+            logger.info("Loaded in-cluster Kubernetes configuration.")
+        except config.ConfigException:
+            config.load_kube_config(client_configuration=configuration)
+            logger.info("Loaded Kubernetes configuration from kubeconfig.")
+        configuration.connection_pool_maxsize = self.pool_maxsize
+
+        # Other threads may still be mid-request on the previous client, so it is
+        # not closed here; its pool is released once the last reference is gone.
+        self._api_client = client.ApiClient(configuration)
+        self._apis = {}
+        self._loaded_at = time.monotonic()
+
+    def api_client(self) -> client.ApiClient:
+        """
+        Return the shared ApiClient, loading or refreshing the configuration if needed.
+        """
+        with self._lock:
+            if (
+                self._api_client is None
+                or time.monotonic() - self._loaded_at > self.refresh_seconds
+            ):
+                self._load()
+            return self._api_client
+
+    def api(self, api_cls: type) -> Any:
+        """
+        Return a cached instance of `api_cls` (e.g. `client.AppsV1Api`) bound to the
+        shared ApiClient.
+        """
+        api_client = self.api_client()
+        with self._lock:
+            api = self._apis.get(api_cls)
+            if api is None or api.api_client is not api_client:
+                api = api_cls(api_client)
+                self._apis[api_cls] = api
+            return api
+
+    @property
+    def apps_v1(self) -> client.AppsV1Api:
+        return self.api(client.AppsV1Api)
+
+    @property
+    def core_v1(self) -> client.CoreV1Api:
+        return self.api(client.CoreV1Api)
+
+    @property
+    def autoscaling_v1(self) -> client.AutoscalingV1Api:
+        return self.api(client.AutoscalingV1Api)
+
+    @property
+    def autoscaling_v2(self) -> client.AutoscalingV2Api:
+        return self.api(client.AutoscalingV2Api)
+
+    @property
+    def coordination_v1(self) -> client.CoordinationV1Api:
+        return self.api(client.CoordinationV1Api)
+
+    def invalidate(self) -> None:
+        """
+        Force the configuration to be reloaded on next use.
+        """
+        with self._lock:
+            self._loaded_at = 0.0
+
+
+k8s_clients = KubernetesClientManager()
+
+
+# ------------------------------------------------------------------------------
+# Controller Leader Election
+# ------------------------------------------------------------------------------
+
+# Set to "false" when a single API process serves the cluster (e.g. local runs).
+CONTROLLER_LEADER_ELECTION = (
+    os.environ.get("CONTROLLER_LEADER_ELECTION", "true").lower() == "true"
+)
+CONTROLLER_LEASE_NAME = os.environ.get(
+    "CONTROLLER_LEASE_NAME", "swarms-api-controllers"
+)
+CONTROLLER_LEASE_SECONDS = int(os.environ.get("CONTROLLER_LEASE_SECONDS", "30"))
+
+
+class ControllerLease:
+    """
+    Elects the one API process that runs the cluster-wide controllers (reconciler,
+    warm pool refill, scale to zero) through a `coordination.k8s.io` Lease, so they
+    act once per cluster however many workers and pods serve the API.
+
+    The holder renews the lease whenever it checks `is_leader`; another process
+    takes over once the lease has gone unrenewed for `duration` seconds. Updates
+    carry the lease's resourceVersion, so of two processes racing for an expired
+    lease only one wins.
+    """
+
+    def __init__(
+        self,
+        name: str = CONTROLLER_LEASE_NAME,
+        duration: int = CONTROLLER_LEASE_SECONDS,
+        identity: Optional[str] = None,
+        enabled: bool = CONTROLLER_LEADER_ELECTION,
+    ) -> None:
+        self.name = name
+        self.duration = duration
+        self.identity = identity or f"{os.environ.get('HOSTNAME', 'api')}-{os.getpid()}"
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._renewed_at: Optional[float] = None
+
+    def _spec(self, acquired: datetime, renewed: datetime) -> client.V1LeaseSpec:
+        return client.V1LeaseSpec(
+            holder_identity=self.identity,
+            lease_duration_seconds=self.duration,
+            acquire_time=acquired,
+            renew_time=renewed,
+        )
+
+    def _try_acquire(self) -> bool:
+        api = k8s_clients.coordination_v1
+        now = datetime.now(timezone.utc)
+        try:
+            lease = api.read_namespaced_lease(name=self.name, namespace="default")
+        except ApiException as e:
+            if e.status != 404:
+                raise
+            body = client.V1Lease(
+                metadata=client.V1ObjectMeta(name=self.name), spec=self._spec(now, now)
+            )
+            try:
+                api.create_namespaced_lease(namespace="default", body=body)
+            except ApiException as e:
+                if e.status == 409:
+                    return False
+                raise
+            return True
+
+        spec = lease.spec or client.V1LeaseSpec()
+        renewed = spec.renew_time
+        if renewed is not None and renewed.tzinfo is None:
+            renewed = renewed.replace(tzinfo=timezone.utc)
+        duration = spec.lease_duration_seconds or self.duration
+        held_by_other = (
+            spec.holder_identity not in (None, self.identity)
+            and renewed is not None
+            and (now - renewed).total_seconds() < duration
+        )
+        if held_by_other:
+            return False
+        acquired = spec.acquire_time if spec.holder_identity == self.identity else now
+        lease.spec = self._spec(acquired or now, now)
+        try:
+            api.replace_namespaced_lease(
+                name=self.name, namespace="default", body=lease
+            )
+        except ApiException as e:
+            if e.status == 409:
+                return False
+            raise
+        return True
+
+    def is_leader(self) -> bool:
+        """
+        Return True if this process holds the lease, acquiring or renewing it as
+        needed. A renewal younger than a third of the lease is trusted as is.
+        """
+        if not self.enabled:
+            return True
+        with self._lock:
+            if (
+                self._renewed_at is not None
+                and time.monotonic() - self._renewed_at < self.duration / 3
+            ):
+                return True
+            try:
+                leader = self._try_acquire()
+            except Exception as e:
+                logger.warning(f"Could not check controller lease: {e}")
+                leader = False
+            if leader and self._renewed_at is None:
+                logger.info(f"{self.identity} now leads the swarm controllers")
+            self._renewed_at = time.monotonic() if leader else None
+            return leader
+
+    def release(self) -> None:
+        """
+        Give up the lease on shutdown so another process takes over immediately.
+        """
+        with self._lock:
+            if not self.enabled or self._renewed_at is None:
+                return
+            self._renewed_at = None
+            try:
+                api = k8s_clients.coordination_v1
+                lease = api.read_namespaced_lease(name=self.name, namespace="default")
+                if lease.spec and lease.spec.holder_identity == self.identity:
+                    lease.spec.holder_identity = None
+                    lease.spec.renew_time = None
+                    api.replace_namespaced_lease(
+                        name=self.name, namespace="default", body=lease
+                    )
+            except Exception as e:
+                logger.warning(f"Could not release controller lease: {e}")
+
+
+controller_lease = ControllerLease()
+
+
+def with_credential_refresh(fn: Callable) -> Callable:
+    """
+    Retry a Kubernetes operation once with reloaded credentials if it fails with 401.
+    """
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        try:
+            return fn(*args, **kwargs)
+        except ApiException as e:
+            if e.status != 401:
+                raise
+            logger.warning(
+                "Kubernetes API returned 401; reloading credentials and retrying."
+            )
+            k8s_clients.invalidate()
+            return fn(*args, **kwargs)
+
+    return wrapper
 
+
+@with_credential_refresh
 def create_deployment(
-    deployment_name: str, image: str, container_port: int = 8080
+    deployment_name: str,
+    image: str,
+    container_port: int = 8080,
+    replicas: int = 1,
+    labels: Optional[Dict[str, str]] = None,
+    resources: Optional[client.V1ResourceRequirements] = None,
 ) -> None:
     """
-    Creates a Kubernetes Deployment using the specified Docker Hub image.
+    Creates a Kubernetes Deployment using the specified Docker Hub image. Extra
+    `labels` are added to the pod template next to the `app` selector label;
+    `resources` defaults to the "small" profile's requests and limits.
     """
 
-    # Load kubeconfig and initialize client
     logger.info(f"Creating deployment '{deployment_name}' with image '{image}'")
-    config.load_kube_config()
-    apps_v1_api = client.AppsV1Api()
+    apps_v1_api = k8s_clients.apps_v1
 
     container = client.V1Container(
         name=deployment_name,
         image=image,
         ports=[client.V1ContainerPort(container_port=container_port)],
-        resources=client.V1ResourceRequirements(
+        resources=resources
+        or client.V1ResourceRequirements(
             requests={"cpu": "100m", "memory": "128Mi"},
             limits={"cpu": "500m", "memory": "512Mi"},
         ),
     )
 
     template = client.V1PodTemplateSpec(
-        metadata=client.V1ObjectMeta(labels={"app": deployment_name}),
+        metadata=client.V1ObjectMeta(labels={**(labels or {}), "app": deployment_name}),
         spec=client.V1PodSpec(containers=[container]),
     )
 
     spec = client.V1DeploymentSpec(
-        replicas=1,
+        replicas=replicas,
         selector=client.V1LabelSelector(match_labels={"app": deployment_name}),
         template=template,
     )
@@ -197,6 +604,7 @@ def create_deployment(
         raise
 
 
+@with_credential_refresh
 def create_service(
     service_name: str,
     deployment_name: str,
@@ -206,8 +614,7 @@ def create_service(
     """
     Creates a Kubernetes Service to expose the deployment externally.
     """
-    config.load_kube_config()
-    core_v1_api = client.CoreV1Api()
+    core_v1_api = k8s_clients.core_v1
 
     service = client.V1Service(
         api_version="v1",
@@ -228,36 +635,119 @@ def create_service(
         raise
 
 
+# External metrics published by the completions proxy (see GET /metrics). They are
+# exposed to the HPA through a metrics adapter (e.g. prometheus-adapter), labelled
+# with the swarm id.
+INFLIGHT_METRIC = "swarm_inflight_completions"
+LATENCY_P95_METRIC = "swarm_completion_latency_p95_ms"
+
+_k8s_serializer: Optional[client.ApiClient] = None
+
+
+def to_k8s_dict(obj: Any) -> Any:
+    """
+    Serialize Kubernetes model objects to their camelCase API representation.
+    """
+    global _k8s_serializer
+    if _k8s_serializer is None:
+        _k8s_serializer = client.ApiClient()
+    return _k8s_serializer.sanitize_for_serialization(obj)
+
+
+def build_hpa_metrics(
+    swarm_id: str,
+    target_cpu_utilization_percentage: Optional[int] = None,
+    target_inflight_per_pod: Optional[int] = None,
+    target_p95_latency_ms: Optional[int] = None,
+) -> List[client.V2MetricSpec]:
+    """
+    Builds the autoscaling/v2 metric list for a swarm: CPU utilization plus the
+    optional in-flight completions per pod and p95 latency external metrics.
+    """
+    selector = client.V1LabelSelector(match_labels={"swarm": swarm_id})
+    metrics = []
+    if target_cpu_utilization_percentage:
+        metrics.append(
+            client.V2MetricSpec(
+                type="Resource",
+                resource=client.V2ResourceMetricSource(
+                    name="cpu",
+                    target=client.V2MetricTarget(
+                        type="Utilization",
+                        average_utilization=target_cpu_utilization_percentage,
+                    ),
+                ),
+            )
+        )
+    if target_inflight_per_pod:
+        metrics.append(
+            client.V2MetricSpec(
+                type="External",
+                external=client.V2ExternalMetricSource(
+                    metric=client.V2MetricIdentifier(
+                        name=INFLIGHT_METRIC, selector=selector
+                    ),
+                    target=client.V2MetricTarget(
+                        type="AverageValue", average_value=str(target_inflight_per_pod)
+                    ),
+                ),
+            )
+        )
+    if target_p95_latency_ms:
+        metrics.append(
+            client.V2MetricSpec(
+                type="External",
+                external=client.V2ExternalMetricSource(
+                    metric=client.V2MetricIdentifier(
+                        name=LATENCY_P95_METRIC, selector=selector
+                    ),
+                    target=client.V2MetricTarget(
+                        type="Value", value=str(target_p95_latency_ms)
+                    ),
+                ),
+            )
+        )
+    return metrics
+
+
+@with_credential_refresh
 def create_horizontal_pod_autoscaler(
     deployment_name: str,
     min_replicas: int,
     max_replicas: int,
-    target_cpu_utilization_percentage: int,
+    target_cpu_utilization_percentage: Optional[int],
+    target_inflight_per_pod: Optional[int] = None,
+    target_p95_latency_ms: Optional[int] = None,
 ) -> None:
     """
-    Creates a Horizontal Pod Autoscaler (HPA) for the deployment.
+    Creates an autoscaling/v2 Horizontal Pod Autoscaler (HPA) for the deployment,
+    scaling on CPU and/or the proxy's in-flight and latency metrics.
     """
-    config.load_kube_config()
-    autoscaling_v1_api = client.AutoscalingV1Api()
+    autoscaling_v2_api = k8s_clients.autoscaling_v2
 
-    hpa_spec = client.V1HorizontalPodAutoscalerSpec(
-        scale_target_ref=client.V1CrossVersionObjectReference(
+    hpa_spec = client.V2HorizontalPodAutoscalerSpec(
+        scale_target_ref=client.V2CrossVersionObjectReference(
             api_version="apps/v1", kind="Deployment", name=deployment_name
         ),
         min_replicas=min_replicas,
         max_replicas=max_replicas,
-        target_cpu_utilization_percentage=target_cpu_utilization_percentage,
+        metrics=build_hpa_metrics(
+            deployment_name.removeprefix("swarm-"),
+            target_cpu_utilization_percentage,
+            target_inflight_per_pod,
+            target_p95_latency_ms,
+        ),
     )
 
-    hpa = client.V1HorizontalPodAutoscaler(
-        api_version="autoscaling/v1",
+    hpa = client.V2HorizontalPodAutoscaler(
+        api_version="autoscaling/v2",
         kind="HorizontalPodAutoscaler",
         metadata=client.V1ObjectMeta(name=deployment_name),
         spec=hpa_spec,
     )
 
     try:
-        autoscaling_v1_api.create_namespaced_horizontal_pod_autoscaler(
+        autoscaling_v2_api.create_namespaced_horizontal_pod_autoscaler(
             namespace="default", body=hpa
         )
         print(f"HPA for '{deployment_name}' created.")
@@ -268,56 +758,192 @@ def create_horizontal_pod_autoscaler(
 
 def delete_k8s_resource(api_function, name: str, resource: str) -> None:
     """
-    Generic deletion for Kubernetes resources in the default namespace.
+    Generic deletion for Kubernetes resources in the default namespace. A resource
+    that does not exist counts as deleted.
     """
     try:
         logger.info(f"Deleting {resource} '{name}' in namespace 'default'")
         api_function(name=name, namespace="default")
         logger.success(f"{resource} '{name}' deleted.")
     except ApiException as e:
+        if e.status == 404:
+            logger.info(f"{resource} '{name}' does not exist; nothing to delete.")
+            return
         logger.error(f"Error deleting {resource} '{name}': {e}")
         raise
 
 
+@with_credential_refresh
 def delete_deployment(deployment_name: str) -> None:
     """
     Deletes a Kubernetes Deployment.
     """
     logger.info(f"Deleting deployment '{deployment_name}' in namespace 'default'")
-    config.load_kube_config()
-    apps_v1_api = client.AppsV1Api()
     delete_k8s_resource(
-        apps_v1_api.delete_namespaced_deployment, deployment_name, "Deployment"
+        k8s_clients.apps_v1.delete_namespaced_deployment, deployment_name, "Deployment"
     )
 
 
+@with_credential_refresh
 def delete_service(service_name: str) -> None:
     """
     Deletes a Kubernetes Service.
     """
     logger.info(f"Deleting service '{service_name}' in namespace 'default'")
-    config.load_kube_config()
-    core_v1_api = client.CoreV1Api()
-    delete_k8s_resource(core_v1_api.delete_namespaced_service, service_name, "Service")
+    delete_k8s_resource(
+        k8s_clients.core_v1.delete_namespaced_service, service_name, "Service"
+    )
 
 
+@with_credential_refresh
 def delete_horizontal_pod_autoscaler(hpa_name: str) -> None:
     """
     Deletes a Kubernetes Horizontal Pod Autoscaler.
     """
     logger.info(f"Deleting HPA '{hpa_name}' in namespace 'default'")
-    config.load_kube_config()
-    autoscaling_v1_api = client.AutoscalingV1Api()
     delete_k8s_resource(
-        autoscaling_v1_api.delete_namespaced_horizontal_pod_autoscaler, hpa_name, "HPA"
+        k8s_clients.autoscaling_v2.delete_namespaced_horizontal_pod_autoscaler,
+        hpa_name,
+        "HPA",
+    )
+
+
+ROLLING_UPDATE_MAX_SURGE = os.environ.get("ROLLING_UPDATE_MAX_SURGE", "25%")
+ROLLING_UPDATE_MAX_UNAVAILABLE = os.environ.get("ROLLING_UPDATE_MAX_UNAVAILABLE", "0")
+
+
+@with_credential_refresh
+def patch_horizontal_pod_autoscaler(hpa_name: str, spec: Dict[str, Any]) -> None:
+    """
+    Applies a strategic-merge patch to an HPA spec, e.g. {"maxReplicas": 10}.
+    A "metrics" entry replaces the whole metric list.
+    """
+    logger.info(f"Patching HPA '{hpa_name}' with {spec}")
+    try:
+        k8s_clients.autoscaling_v2.patch_namespaced_horizontal_pod_autoscaler(
+            name=hpa_name, namespace="default", body={"spec": spec}
+        )
+    except ApiException as e:
+        logger.error(f"Error patching HPA '{hpa_name}': {e}")
+        raise
+
+
+@with_credential_refresh
+def scale_deployment(deployment_name: str, replicas: int) -> None:
+    """
+    Sets the Deployment's replica count through the scale subresource.
+    """
+    logger.info(f"Scaling deployment '{deployment_name}' to {replicas} replicas")
+    try:
+        k8s_clients.apps_v1.patch_namespaced_deployment_scale(
+            name=deployment_name,
+            namespace="default",
+            body={"spec": {"replicas": replicas}},
+        )
+    except ApiException as e:
+        logger.error(f"Error scaling deployment '{deployment_name}': {e}")
+        raise
+
+
+# Wall-clock time a swarm last served a completion, stamped by every API process.
+ACTIVITY_ANNOTATION = "swarms.ai/last-activity"
+
+
+@with_credential_refresh
+def record_deployment_activity(deployment_name: str) -> None:
+    """
+    Stamps the Deployment with the current time as its last completion activity.
+    """
+    k8s_clients.apps_v1.patch_namespaced_deployment(
+        name=deployment_name,
+        namespace="default",
+        body={"metadata": {"annotations": {ACTIVITY_ANNOTATION: f"{time.time():.3f}"}}},
     )
 
 
+def deployment_activity_age(deployment: Any) -> Optional[float]:
+    """
+    Seconds since the activity stamp on a Deployment, or None if it has none.
+    """
+    annotations = deployment.metadata.annotations or {}
+    stamp = annotations.get(ACTIVITY_ANNOTATION)
+    if stamp is None:
+        return None
+    try:
+        return max(0.0, time.time() - float(stamp))
+    except ValueError:
+        return None
+
+
+@with_credential_refresh
+def patch_deployment_container(
+    deployment_name: str,
+    changes: Dict[str, Any],
+    max_surge: str = ROLLING_UPDATE_MAX_SURGE,
+    max_unavailable: str = ROLLING_UPDATE_MAX_UNAVAILABLE,
+) -> None:
+    """
+    Starts a rolling update of the Deployment's container (image, resources) with
+    a strategic-merge patch (containers are merged by name).
+    """
+    logger.info(f"Rolling deployment '{deployment_name}' with {changes}")
+    body = {
+        "spec": {
+            "strategy": {
+                "type": "RollingUpdate",
+                "rollingUpdate": {
+                    "maxSurge": max_surge,
+                    "maxUnavailable": max_unavailable,
+                },
+            },
+            "template": {
+                "spec": {"containers": [{"name": deployment_name, **changes}]}
+            },
+        }
+    }
+    try:
+        k8s_clients.apps_v1.patch_namespaced_deployment(
+            name=deployment_name, namespace="default", body=body
+        )
+    except ApiException as e:
+        logger.error(f"Error patching deployment '{deployment_name}': {e}")
+        raise
+
+
 # ------------------------------------------------------------------------------
 # API Models and In-Memory Stores
 # ------------------------------------------------------------------------------
 
 
+class ResourceSpec(BaseModel):
+    """
+    Container requests and limits, in Kubernetes quantity notation. Setting
+    `dedicated_cpus` pins the container to whole cores: CPU and memory requests are
+    made equal to the limits (Guaranteed QoS), which the kubelet's static CPU
+    manager turns into exclusive cores.
+    """
+
+    cpu_request: str = "100m"
+    cpu_limit: str = "500m"
+    memory_request: str = "128Mi"
+    memory_limit: str = "512Mi"
+    ephemeral_storage_request: Optional[str] = None
+    ephemeral_storage_limit: Optional[str] = None
+    dedicated_cpus: Optional[int] = None
+
+
+class ResourceOverrides(BaseModel):
+    """Per-swarm overrides applied on top of the selected resource profile."""
+
+    cpu_request: Optional[str] = None
+    cpu_limit: Optional[str] = None
+    memory_request: Optional[str] = None
+    memory_limit: Optional[str] = None
+    ephemeral_storage_request: Optional[str] = None
+    ephemeral_storage_limit: Optional[str] = None
+    dedicated_cpus: Optional[int] = None
+
+
 class SwarmBase(BaseModel):
     name: str = Field(..., description="Unique name for the swarm")
     description: Optional[str] = Field(None, description="Description of the swarm")
@@ -333,6 +959,26 @@ class SwarmBase(BaseModel):
     target_cpu: int = Field(
         50, description="Target CPU utilization percentage for autoscaling"
     )
+    target_inflight_per_pod: Optional[int] = Field(
+        None,
+        description="Scale to keep this many in-flight completions per pod (custom metric)",
+    )
+    target_p95_latency_ms: Optional[int] = Field(
+        None, description="Scale out when p95 completion latency exceeds this (ms)"
+    )
+    scale_to_zero: bool = Field(
+        False,
+        description="Scale to zero replicas when idle; requests are buffered during cold start",
+    )
+    idle_timeout_seconds: int = Field(
+        300, description="Idle time before a scale-to-zero swarm is scaled down"
+    )
+    resource_profile: str = Field(
+        "small", description="Named resource profile (see GET /resource-profiles)"
+    )
+    resources: Optional[ResourceOverrides] = Field(
+        None, description="Per-swarm overrides of the profile's requests and limits"
+    )
 
 
 class SwarmCreate(SwarmBase):
@@ -345,16 +991,473 @@ class SwarmUpdate(BaseModel):
     min_replicas: Optional[int] = None
     max_replicas: Optional[int] = None
     target_cpu: Optional[int] = None
+    target_inflight_per_pod: Optional[int] = None
+    target_p95_latency_ms: Optional[int] = None
+    scale_to_zero: Optional[bool] = None
+    idle_timeout_seconds: Optional[int] = None
+    resource_profile: Optional[str] = None
+    resources: Optional[ResourceOverrides] = None
+
+
+class SwarmStatus(str, Enum):
+    PROVISIONING = "provisioning"
+    READY = "ready"
+    FAILED = "failed"
+    DELETING = "deleting"
 
 
 class Swarm(SwarmBase):
     id: str
-    owner: str  # API key of the owner
+    owner: str  # owner_id() of the owner's API key
     endpoint: Optional[str] = None  # Could store the external service URL
+    status: SwarmStatus = SwarmStatus.PROVISIONING
+    progress: Dict[str, str] = Field(
+        default_factory=dict,
+        description="Per-step provisioning state (pending, running, done, failed).",
+    )
+    error: Optional[str] = None
+    scaled_to_zero: bool = False
+
+
+class SwarmBulkCreate(BaseModel):
+    # Items are validated one by one so a bad item fails alone (see bulk_create_swarms).
+    swarms: List[Dict[str, Any]]
+
+
+class SwarmBulkDelete(BaseModel):
+    ids: List[str]
+
 
+class BulkItemResult(BaseModel):
+    index: int
+    id: Optional[str] = None
+    status_code: int
+    swarm: Optional[Swarm] = None
+    error: Optional[str] = None
+
+
+class BulkOperationResult(BaseModel):
+    results: List[BulkItemResult]
+    succeeded: int
+    failed: int
+
+
+# ------------------------------------------------------------------------------
+# Resource Profiles
+# ------------------------------------------------------------------------------
+
+# Ordered from smallest to largest; recommendations pick the first that fits.
+RESOURCE_PROFILES: Dict[str, ResourceSpec] = {
+    "nano": ResourceSpec(
+        cpu_request="50m", cpu_limit="250m", memory_request="64Mi", memory_limit="256Mi"
+    ),
+    "small": ResourceSpec(),
+    "medium": ResourceSpec(
+        cpu_request="500m",
+        cpu_limit="1",
+        memory_request="512Mi",
+        memory_limit="1Gi",
+        ephemeral_storage_request="1Gi",
+        ephemeral_storage_limit="2Gi",
+    ),
+    "large": ResourceSpec(
+        cpu_request="1",
+        cpu_limit="2",
+        memory_request="2Gi",
+        memory_limit="4Gi",
+        ephemeral_storage_request="2Gi",
+        ephemeral_storage_limit="4Gi",
+    ),
+    "xlarge": ResourceSpec(
+        cpu_request="2",
+        cpu_limit="4",
+        memory_request="4Gi",
+        memory_limit="8Gi",
+        ephemeral_storage_request="4Gi",
+        ephemeral_storage_limit="8Gi",
+    ),
+    "pinned-2": ResourceSpec(
+        dedicated_cpus=2,
+        memory_request="4Gi",
+        memory_limit="4Gi",
+        ephemeral_storage_request="2Gi",
+        ephemeral_storage_limit="4Gi",
+    ),
+}
+# Fraction of slack the recommender keeps above the observed peak.
+RESOURCE_HEADROOM = float(os.environ.get("RESOURCE_HEADROOM", "1.25"))
+RESOURCE_USAGE_SAMPLES = int(os.environ.get("RESOURCE_USAGE_SAMPLES", "100"))
+RESOURCE_NAMES = ("cpu", "memory", "ephemeral-storage")
+
+
+class ResourceRecommendation(BaseModel):
+    swarm_id: str
+    current_profile: str
+    recommended_profile: Optional[str] = None
+    samples: int
+    peak_cpu_cores: float = 0.0
+    peak_memory_bytes: int = 0
+    reason: str
+
+
+def resolve_resource_spec(
+    profile: str, overrides: Optional[ResourceOverrides] = None
+) -> ResourceSpec:
+    """
+    Combine a named profile with per-swarm overrides.
+
+    Raises:
+        ValueError: If the profile is unknown or a quantity is invalid.
+    """
+    if profile not in RESOURCE_PROFILES:
+        raise ValueError(
+            f"Unknown resource profile '{profile}', expected one of "
+            f"{sorted(RESOURCE_PROFILES)}"
+        )
+    changes = overrides.dict(exclude_none=True) if overrides else {}
+    spec = RESOURCE_PROFILES[profile].copy(update=changes)
+    for kind in ("cpu", "memory", "ephemeral_storage"):
+        request = getattr(spec, f"{kind}_request")
+        limit = getattr(spec, f"{kind}_limit")
+        if request and limit and parse_quantity(request) > parse_quantity(limit):
+            raise ValueError(f"{kind} request {request} exceeds limit {limit}")
+    if spec.dedicated_cpus is not None and spec.dedicated_cpus < 1:
+        raise ValueError("dedicated_cpus must be at least 1")
+    return spec
+
+
+def build_resource_requirements(spec: ResourceSpec) -> client.V1ResourceRequirements:
+    requests = {"cpu": spec.cpu_request, "memory": spec.memory_request}
+    limits = {"cpu": spec.cpu_limit, "memory": spec.memory_limit}
+    if spec.dedicated_cpus:
+        # Guaranteed QoS with whole cores: eligible for exclusive CPUs.
+        requests["cpu"] = limits["cpu"] = str(spec.dedicated_cpus)
+        requests["memory"] = limits["memory"] = spec.memory_limit
+    if spec.ephemeral_storage_request:
+        requests["ephemeral-storage"] = spec.ephemeral_storage_request
+    if spec.ephemeral_storage_limit:
+        limits["ephemeral-storage"] = spec.ephemeral_storage_limit
+    return client.V1ResourceRequirements(requests=requests, limits=limits)
+
+
+def swarm_resources(swarm: SwarmBase) -> client.V1ResourceRequirements:
+    return build_resource_requirements(
+        resolve_resource_spec(swarm.resource_profile, swarm.resources)
+    )
+
+
+def normalize_resources(resources: Any) -> Dict[str, Dict[str, Any]]:
+    """
+    Parse requests/limits quantities so that e.g. "0.5" and "500m" compare equal.
+    """
+    data = to_k8s_dict(resources) or {}
+    return {
+        kind: {
+            name: parse_quantity(value)
+            for name, value in (data.get(kind) or {}).items()
+        }
+        for kind in ("requests", "limits")
+    }
+
+
+class ResourceAdvisor:
+    """
+    Recommends the smallest resource profile whose requests cover a swarm's peak
+    observed per-pod usage (from metrics-server) plus RESOURCE_HEADROOM. Advisory
+    only: nothing is changed until the owner updates `resource_profile`.
+
+    Usage is sampled periodically by `SwarmReconciler` in every process, so each
+    process keeps the last `max_samples` samples of every ready swarm.
+    """
+
+    def __init__(self, max_samples: int = RESOURCE_USAGE_SAMPLES) -> None:
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._samples: Dict[str, Deque[Tuple[float, int]]] = {}
+
+    def sample(self, swarm_ids: List[str]) -> int:
+        """
+        Record the current usage of every pod of the given swarms, read with one
+        metrics-server listing.
+
+        Returns:
+            int: The number of pod samples recorded.
+        """
+        if not swarm_ids:
+            return 0
+        metrics = k8s_clients.api(
+            client.CustomObjectsApi
+        ).list_namespaced_custom_object(
+            group="metrics.k8s.io",
+            version="v1beta1",
+            namespace="default",
+            plural="pods",
+        )
+        deployments = {f"swarm-{swarm_id}": swarm_id for swarm_id in swarm_ids}
+        recorded = 0
+        with self._lock:
+            for pod in metrics.get("items", []):
+                labels = (pod.get("metadata") or {}).get("labels") or {}
+                swarm_id = deployments.get(labels.get("app"))
+                if swarm_id is None:
+                    continue
+                cpu = memory = 0
+                for container in pod.get("containers", []):
+                    usage = container.get("usage", {})
+                    cpu += parse_quantity(usage.get("cpu", "0"))
+                    memory += parse_quantity(usage.get("memory", "0"))
+                window = self._samples.setdefault(
+                    swarm_id, deque(maxlen=self.max_samples)
+                )
+                window.append((float(cpu), int(memory)))
+                recorded += 1
+        return recorded
+
+    def recommend(self, swarm: Swarm) -> ResourceRecommendation:
+        with self._lock:
+            samples = list(self._samples.get(swarm.id, ()))
+        if not samples:
+            return ResourceRecommendation(
+                swarm_id=swarm.id,
+                current_profile=swarm.resource_profile,
+                samples=0,
+                reason="No usage observed yet",
+            )
+        peak_cpu = max(cpu for cpu, _ in samples)
+        peak_memory = max(memory for _, memory in samples)
+        need_cpu = peak_cpu * RESOURCE_HEADROOM
+        need_memory = peak_memory * RESOURCE_HEADROOM
+        recommended, reason = None, "Usage exceeds every shared-core profile"
+        for name, spec in RESOURCE_PROFILES.items():
+            if spec.dedicated_cpus:
+                continue
+            if (
+                float(parse_quantity(spec.cpu_request)) >= need_cpu
+                and float(parse_quantity(spec.memory_request)) >= need_memory
+            ):
+                recommended = name
+                reason = (
+                    f"Smallest profile whose requests cover peak usage "
+                    f"x{RESOURCE_HEADROOM}"
+                )
+                break
+        return ResourceRecommendation(
+            swarm_id=swarm.id,
+            current_profile=swarm.resource_profile,
+            recommended_profile=recommended,
+            samples=len(samples),
+            peak_cpu_cores=round(peak_cpu, 3),
+            peak_memory_bytes=peak_memory,
+            reason=reason,
+        )
 
-# In-memory store for swarms: mapping swarm id to Swarm data.
-swarm_store: Dict[str, Swarm] = {}
+    def discard(self, swarm_id: str) -> None:
+        with self._lock:
+            self._samples.pop(swarm_id, None)
+
+
+resource_advisor = ResourceAdvisor()
+
+
+# ------------------------------------------------------------------------------
+# Swarm Repository
+# ------------------------------------------------------------------------------
+
+SWARM_STORE_BACKEND = os.environ.get("SWARM_STORE_BACKEND", "sqlite").lower()
+# Directory for the service's persistent state (the SQLite swarm store).
+SWARM_DATA_DIR = os.environ.get("SWARM_DATA_DIR") or os.path.join(
+    os.path.expanduser("~"), ".swarms-cloud"
+)
+SWARM_DB_PATH = os.environ.get("SWARM_DB_PATH") or os.path.join(
+    SWARM_DATA_DIR, "swarms.db"
+)
+
+
+class SwarmRepository(abc.ABC):
+    """
+    Storage interface for swarm records, indexed by id and by owner.
+
+    `update` applies field changes atomically to the stored record so that
+    concurrent writers (API requests and background provisioning) never overwrite
+    each other's fields with stale copies. Owners are identified by `owner_id`,
+    never by the raw API key.
+    """
+
+    @abc.abstractmethod
+    def get(self, swarm_id: str) -> Optional[Swarm]: ...
+
+    @abc.abstractmethod
+    def put(self, swarm: Swarm) -> None: ...
+
+    @abc.abstractmethod
+    def update(self, swarm_id: str, **changes: Any) -> Optional[Swarm]: ...
+
+    @abc.abstractmethod
+    def delete(self, swarm_id: str) -> bool: ...
+
+    @abc.abstractmethod
+    def list_by_owner(
+        self, owner: str, limit: int = 100, offset: int = 0
+    ) -> List[Swarm]: ...
+
+    @abc.abstractmethod
+    def list_all(self) -> List[Swarm]: ...
+
+
+class InMemorySwarmRepository(SwarmRepository):
+    """
+    Process-local repository with a secondary index from owner to swarm ids.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self._swarms: Dict[str, Swarm] = {}
+        # Dicts keep insertion order, so each owner's swarms list oldest first.
+        self._by_owner: Dict[str, Dict[str, None]] = {}
+
+    def get(self, swarm_id: str) -> Optional[Swarm]:
+        with self._lock:
+            swarm = self._swarms.get(swarm_id)
+            return swarm.copy(deep=True) if swarm else None
+
+    def put(self, swarm: Swarm) -> None:
+        with self._lock:
+            previous = self._swarms.get(swarm.id)
+            if previous is not None and previous.owner != swarm.owner:
+                self._by_owner.get(previous.owner, {}).pop(swarm.id, None)
+            self._swarms[swarm.id] = swarm.copy(deep=True)
+            self._by_owner.setdefault(swarm.owner, {})[swarm.id] = None
+
+    def update(self, swarm_id: str, **changes: Any) -> Optional[Swarm]:
+        with self._lock:
+            swarm = self._swarms.get(swarm_id)
+            if swarm is None:
+                return None
+            updated = swarm.copy(update=changes, deep=True)
+            self._swarms[swarm_id] = updated
+            return updated.copy(deep=True)
+
+    def delete(self, swarm_id: str) -> bool:
+        with self._lock:
+            swarm = self._swarms.pop(swarm_id, None)
+            if swarm is None:
+                return False
+            self._by_owner.get(swarm.owner, {}).pop(swarm_id, None)
+            return True
+
+    def list_by_owner(
+        self, owner: str, limit: int = 100, offset: int = 0
+    ) -> List[Swarm]:
+        with self._lock:
+            ids = list(
+                itertools.islice(self._by_owner.get(owner, {}), offset, offset + limit)
+            )
+            return [self._swarms[swarm_id].copy(deep=True) for swarm_id in ids]
+
+    def list_all(self) -> List[Swarm]:
+        with self._lock:
+            return [swarm.copy(deep=True) for swarm in self._swarms.values()]
+
+
+class SQLiteSwarmRepository(SwarmRepository):
+    """
+    SQLite-backed repository so swarm records survive restarts.
+
+    Records are stored as JSON alongside an indexed `owner` column; listing a user's
+    swarms is an index range scan ordered by insertion sequence. Every worker opens
+    the same file, so `update` reads and writes the record inside one
+    `BEGIN IMMEDIATE` transaction: the write lock is taken before the read, and
+    other processes' updates wait for it instead of being overwritten.
+    """
+
+    def __init__(self, path: str = SWARM_DB_PATH) -> None:
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS swarms (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                id TEXT NOT NULL UNIQUE,
+                owner TEXT NOT NULL,
+                data TEXT NOT NULL
+            )
+            """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_swarms_owner ON swarms (owner, seq)"
+        )
+        self._conn.commit()
+        logger.info(f"Using SQLite swarm store at {path}")
+
+    def get(self, swarm_id: str) -> Optional[Swarm]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM swarms WHERE id = ?", (swarm_id,)
+            ).fetchone()
+        return Swarm.parse_raw(row[0]) if row else None
+
+    def put(self, swarm: Swarm) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                INSERT INTO swarms (id, owner, data) VALUES (?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET owner = excluded.owner, data = excluded.data
+                """,
+                (swarm.id, swarm.owner, swarm.json()),
+            )
+
+    def update(self, swarm_id: str, **changes: Any) -> Optional[Swarm]:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT data FROM swarms WHERE id = ?", (swarm_id,)
+                ).fetchone()
+                if row is None:
+                    self._conn.rollback()
+                    return None
+                updated = Swarm.parse_raw(row[0]).copy(update=changes)
+                self._conn.execute(
+                    "UPDATE swarms SET owner = ?, data = ? WHERE id = ?",
+                    (updated.owner, updated.json(), swarm_id),
+                )
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+            return updated
+
+    def delete(self, swarm_id: str) -> bool:
+        with self._lock, self._conn:
+            cursor = self._conn.execute("DELETE FROM swarms WHERE id = ?", (swarm_id,))
+        return cursor.rowcount > 0
+
+    def list_by_owner(
+        self, owner: str, limit: int = 100, offset: int = 0
+    ) -> List[Swarm]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT data FROM swarms WHERE owner = ? ORDER BY seq LIMIT ? OFFSET ?",
+                (owner, limit, offset),
+            ).fetchall()
+        return [Swarm.parse_raw(row[0]) for row in rows]
+
+    def list_all(self) -> List[Swarm]:
+        with self._lock:
+            rows = self._conn.execute("SELECT data FROM swarms ORDER BY seq").fetchall()
+        return [Swarm.parse_raw(row[0]) for row in rows]
+
+
+def create_swarm_repository() -> SwarmRepository:
+    if SWARM_STORE_BACKEND == "memory":
+        return InMemorySwarmRepository()
+    return SQLiteSwarmRepository(SWARM_DB_PATH)
+
+
+swarm_store: SwarmRepository = create_swarm_repository()
 
 # In-memory user store: mapping API key to user information.
 # In a real app, use a database and proper authentication/authorization.
@@ -368,15 +1471,1151 @@ users: Dict[str, Dict] = {
 # ------------------------------------------------------------------------------
 
 
+def owner_id(api_key: str) -> str:
+    """
+    Returns the owner identifier stored with swarms: a SHA-256 digest of the API
+    key, so the key itself never reaches the swarm store or API responses.
+    """
+    return hashlib.sha256(api_key.encode()).hexdigest()
+
+
 def get_current_user(x_api_key: str = Header(..., alias="x-api-key")) -> str:
     """
-    Validates the API key and returns the associated user ID.
+    Validates the API key and returns the associated user ID (its `owner_id`).
     """
     if x_api_key not in users:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid API Key"
         )
-    return x_api_key
+    return owner_id(x_api_key)
+
+
+# ------------------------------------------------------------------------------
+# Warm Replica Pool
+# ------------------------------------------------------------------------------
+
+# Runtime images to keep pre-warmed pods for, comma separated. Empty disables the pool.
+WARM_POOL_IMAGES = [
+    image.strip()
+    for image in os.environ.get("WARM_POOL_IMAGES", "").split(",")
+    if image.strip()
+]
+WARM_POOL_SIZE = int(os.environ.get("WARM_POOL_SIZE", "2"))
+# Resource profile of warm pods; only swarms that resolve to the same requests and
+# limits can claim them.
+WARM_POOL_PROFILE = os.environ.get("WARM_POOL_PROFILE", "small")
+WARM_POOL_REFILL_INTERVAL = float(os.environ.get("WARM_POOL_REFILL_INTERVAL", "30"))
+
+
+def warm_pool_name(image: str) -> str:
+    return "warm-" + hashlib.sha1(image.encode()).hexdigest()[:12]
+
+
+def pod_is_ready(pod: client.V1Pod) -> bool:
+    if pod.metadata.deletion_timestamp or not pod.status:
+        return False
+    return pod.status.phase == "Running" and any(
+        condition.type == "Ready" and condition.status == "True"
+        for condition in pod.status.conditions or []
+    )
+
+
+class WarmPool:
+    """
+    Keeps `size` ready pods per runtime image so new swarms on that image can serve
+    their first completion in seconds.
+
+    Each pool is a Deployment built from the same template as swarm Deployments.
+    A new swarm claims a ready pod by relabelling it `app=swarm-<id>`: the pod leaves
+    the pool's ReplicaSet, which immediately starts a replacement (the refill), and
+    the swarm's Service starts routing to it. The claimed pod is deleted once the
+    swarm's own Deployment is ready. A periodic refill pass, run by the
+    `controller_lease` holder only, recreates or rescales pool Deployments that
+    were removed or resized.
+
+    Warm pods run with the `profile` resource profile. A swarm only claims a pod
+    whose requests and limits equal its own resolved `resource_profile` and
+    overrides; other swarms start cold rather than serve from a wrongly sized pod.
+    """
+
+    def __init__(
+        self,
+        images: List[str] = WARM_POOL_IMAGES,
+        size: int = WARM_POOL_SIZE,
+        refill_interval: float = WARM_POOL_REFILL_INTERVAL,
+        profile: str = WARM_POOL_PROFILE,
+    ) -> None:
+        self.images = list(images)
+        self.size = size
+        self.refill_interval = refill_interval
+        self.resources = build_resource_requirements(resolve_resource_spec(profile))
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def enabled_for(self, image: str) -> bool:
+        return self.size > 0 and image in self.images
+
+    def refill(self) -> None:
+        for image in self.images:
+            name = warm_pool_name(image)
+            try:
+                try:
+                    deployment = k8s_clients.apps_v1.read_namespaced_deployment(
+                        name=name, namespace="default"
+                    )
+                except ApiException as e:
+                    if e.status != 404:
+                        raise
+                    create_deployment(
+                        name,
+                        image,
+                        replicas=self.size,
+                        labels={"pool": "warm"},
+                        resources=self.resources,
+                    )
+                    continue
+                if deployment.spec.replicas != self.size:
+                    scale_deployment(name, self.size)
+            except Exception as e:
+                logger.error(f"Failed to refill warm pool for '{image}': {e}")
+
+    def claim(self, swarm: Swarm) -> Optional[str]:
+        """
+        Hand a ready pool pod with the swarm's resources to the swarm.
+
+        Returns:
+            Optional[str]: The claimed pod's name, or None if no pod was available.
+        """
+        if not self.enabled_for(swarm.dockerhub_image):
+            return None
+        wanted = normalize_resources(swarm_resources(swarm))
+        if wanted != normalize_resources(self.resources):
+            logger.info(f"Swarm {swarm.id} needs other resources than the warm pool")
+            return None
+        pool_name = warm_pool_name(swarm.dockerhub_image)
+        labels = {"app": f"swarm-{swarm.id}", "pool": "claimed", "swarm": swarm.id}
+        try:
+            with self._lock:
+                pods = k8s_clients.core_v1.list_namespaced_pod(
+                    namespace="default", label_selector=f"app={pool_name}"
+                )
+                for pod in pods.items:
+                    # Pods started before the pool's profile changed keep the old one.
+                    if not pod_is_ready(pod) or (
+                        normalize_resources(pod.spec.containers[0].resources) != wanted
+                    ):
+                        continue
+                    # resourceVersion makes the claim fail with 409 if another API
+                    # instance relabelled the pod first.
+                    body = {
+                        "metadata": {
+                            "labels": labels,
+                            "resourceVersion": pod.metadata.resource_version,
+                        }
+                    }
+                    try:
+                        k8s_clients.core_v1.patch_namespaced_pod(
+                            name=pod.metadata.name, namespace="default", body=body
+                        )
+                    except ApiException as e:
+                        if e.status == 409:
+                            continue
+                        raise
+                    logger.info(
+                        f"Swarm {swarm.id} claimed warm pod '{pod.metadata.name}'"
+                    )
+                    return pod.metadata.name
+        except Exception as e:
+            logger.warning(f"Could not claim a warm pod for swarm {swarm.id}: {e}")
+        return None
+
+    def release(self, swarm_id: str) -> None:
+        """
+        Delete the warm pods claimed by a swarm.
+        """
+        if not self.images:
+            return
+        try:
+            k8s_clients.core_v1.delete_collection_namespaced_pod(
+                namespace="default", label_selector=f"pool=claimed,swarm={swarm_id}"
+            )
+        except Exception as e:
+            logger.error(f"Failed to release warm pods of swarm {swarm_id}: {e}")
+
+    def _run(self) -> None:
+        while True:
+            if controller_lease.is_leader():
+                self.refill()
+            if self._stop.wait(self.refill_interval):
+                return
+
+    def start(self) -> None:
+        if not self.images or self.size <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="swarm-warm-pool", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+warm_pool = WarmPool()
+
+
+# ------------------------------------------------------------------------------
+# Background Provisioning
+# ------------------------------------------------------------------------------
+
+PROVISIONING_WORKERS = int(os.environ.get("PROVISIONING_WORKERS", "16"))
+DEPLOYMENT_READY_TIMEOUT = int(os.environ.get("DEPLOYMENT_READY_TIMEOUT", "600"))
+
+PROVISIONING_STEPS = ("image", "deployment", "service", "hpa", "rollout")
+
+
+def wait_for_deployment_ready(
+    deployment_name: str, timeout_seconds: int = DEPLOYMENT_READY_TIMEOUT
+) -> None:
+    """
+    Block until the Deployment reports at least one available replica, using a
+    watch on the Deployment instead of polling.
+
+    Raises:
+        TimeoutError: If the Deployment does not become ready within the timeout.
+    """
+    apps_v1_api = k8s_clients.apps_v1
+    w = watch.Watch()
+    deadline = time.monotonic() + timeout_seconds
+    while True:
+        remaining = int(deadline - time.monotonic())
+        if remaining <= 0:
+            raise TimeoutError(
+                f"Deployment '{deployment_name}' not ready after {timeout_seconds}s"
+            )
+        for event in w.stream(
+            apps_v1_api.list_namespaced_deployment,
+            namespace="default",
+            field_selector=f"metadata.name={deployment_name}",
+            timeout_seconds=remaining,
+        ):
+            deployment = event["object"]
+            if deployment.status and (deployment.status.available_replicas or 0) > 0:
+                w.stop()
+                logger.success(f"Deployment '{deployment_name}' is ready.")
+                return
+
+
+def delete_swarm_resources(swarm_id: str) -> None:
+    """
+    Delete a swarm's Deployment, Service, HPA and claimed warm pods, skipping any
+    that do not exist.
+    """
+    deployment_name = f"swarm-{swarm_id}"
+    delete_deployment(deployment_name)
+    delete_service(f"svc-{swarm_id}")
+    delete_horizontal_pod_autoscaler(deployment_name)
+    warm_pool.release(swarm_id)
+
+
+class SwarmDeleted(Exception):
+    """Stops a provisioning run whose swarm is being deleted."""
+
+
+class SwarmProvisioner:
+    """
+    Provisions swarms in the background so `POST /swarms/` can return immediately.
+
+    Independent steps (image pull, Deployment, Service) run concurrently; the HPA is
+    created once the Deployment exists, and readiness is awaited with a watch rather
+    than a fixed sleep. Progress is written to the swarm record as each step finishes,
+    so clients can follow it with `GET /swarms/{id}`.
+
+    Before and after every step the record is checked: once the swarm is being
+    deleted (or is gone) the run stops, and anything created after the teardown
+    started is deleted again. Steps may be re-run on a swarm whose provisioning was
+    interrupted (see `resume`); objects that already exist count as created.
+    """
+
+    def __init__(self, max_workers: int = PROVISIONING_WORKERS) -> None:
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="swarm-provisioner"
+        )
+        # Steps of a single swarm run on their own pool so a burst of provisioning
+        # pipelines cannot deadlock waiting on each other's steps.
+        self.step_executor = ThreadPoolExecutor(
+            max_workers=max_workers * 3, thread_name_prefix="swarm-provisioner-step"
+        )
+        self._lock = threading.Lock()
+        self._active: Set[str] = set()
+
+    def submit(self, swarm: Swarm) -> None:
+        swarm.status = SwarmStatus.PROVISIONING
+        swarm.progress = {step: "pending" for step in PROVISIONING_STEPS}
+        swarm_store.update(swarm.id, status=swarm.status, progress=dict(swarm.progress))
+        with self._lock:
+            self._active.add(swarm.id)
+        self.executor.submit(self._provision, swarm)
+
+    def resume(self, swarm: Swarm) -> bool:
+        """
+        Provision a swarm left `provisioning` by a process that stopped. Returns
+        False if this process is already provisioning it.
+        """
+        with self._lock:
+            if swarm.id in self._active:
+                return False
+            self._active.add(swarm.id)
+        logger.info(f"Resuming provisioning of swarm {swarm.id}")
+        self.executor.submit(self._provision, swarm, False)
+        return True
+
+    def _wanted(self, swarm: Swarm) -> bool:
+        current = swarm_store.get(swarm.id)
+        return current is not None and current.status != SwarmStatus.DELETING
+
+    def _ensure_wanted(self, swarm: Swarm, created: bool = False) -> None:
+        if not self._wanted(swarm):
+            if created:
+                delete_swarm_resources(swarm.id)
+            raise SwarmDeleted(swarm.id)
+
+    def _set_progress(self, swarm: Swarm, step: str, state: str) -> None:
+        swarm.progress[step] = state
+        swarm_store.update(swarm.id, progress=dict(swarm.progress))
+
+    def _run_step(self, swarm: Swarm, step: str, fn: Callable, *args, **kwargs):
+        self._ensure_wanted(swarm)
+        self._set_progress(swarm, step, "running")
+        result = None
+        try:
+            result = fn(*args, **kwargs)
+        except ApiException as e:
+            if e.status != 409:
+                self._set_progress(swarm, step, "failed")
+                raise
+            logger.info(f"Swarm {swarm.id}: {step} already exists")
+        except Exception:
+            self._set_progress(swarm, step, "failed")
+            raise
+        self._set_progress(swarm, step, "done")
+        self._ensure_wanted(swarm, created=True)
+        return result
+
+    def _provision(self, swarm: Swarm, claim_warm_pod: bool = True) -> None:
+        deployment_name = f"swarm-{swarm.id}"
+        service_name = f"svc-{swarm.id}"
+        logger.info(f"Provisioning swarm {swarm.id}")
+        warm_pod = warm_pool.claim(swarm) if claim_warm_pod else None
+        try:
+            futures = [
+                self.step_executor.submit(
+                    self._run_step,
+                    swarm,
+                    "image",
+                    pull_docker_image,
+                    swarm.dockerhub_image,
+                ),
+                self.step_executor.submit(
+                    self._run_step,
+                    swarm,
+                    "deployment",
+                    create_deployment,
+                    deployment_name,
+                    swarm.dockerhub_image,
+                    resources=swarm_resources(swarm),
+                ),
+                self.step_executor.submit(
+                    self._run_step,
+                    swarm,
+                    "service",
+                    create_service,
+                    service_name,
+                    deployment_name,
+                ),
+            ]
+            wait(futures)
+            for future in futures:
+                future.result()
+
+            self._run_step(
+                swarm,
+                "hpa",
+                create_horizontal_pod_autoscaler,
+                deployment_name,
+                min_replicas=swarm.min_replicas,
+                max_replicas=swarm.max_replicas,
+                target_cpu_utilization_percentage=swarm.target_cpu,
+                target_inflight_per_pod=swarm.target_inflight_per_pod,
+                target_p95_latency_ms=swarm.target_p95_latency_ms,
+            )
+            if warm_pod:
+                # The Service already routes to the claimed warm pod.
+                self._ensure_wanted(swarm)
+                swarm_store.update(swarm.id, status=SwarmStatus.READY)
+            self._run_step(swarm, "rollout", wait_for_deployment_ready, deployment_name)
+            self._ensure_wanted(swarm)
+            swarm_store.update(swarm.id, status=SwarmStatus.READY)
+        except SwarmDeleted:
+            logger.info(f"Swarm {swarm.id} was deleted during provisioning")
+            return
+        except Exception as e:
+            logger.error(f"Provisioning of swarm {swarm.id} failed: {e}")
+            if self._wanted(swarm):
+                swarm_store.update(swarm.id, status=SwarmStatus.FAILED, error=str(e))
+            return
+        finally:
+            if warm_pod:
+                warm_pool.release(swarm.id)
+            with self._lock:
+                self._active.discard(swarm.id)
+        logger.success(f"Swarm {swarm.id} is ready.")
+
+
+provisioner = SwarmProvisioner()
+
+
+# ------------------------------------------------------------------------------
+# Live Reconciliation
+# ------------------------------------------------------------------------------
+
+PATCH_COALESCE_SECONDS = float(os.environ.get("PATCH_COALESCE_SECONDS", "0.5"))
+RECONCILE_INTERVAL_SECONDS = float(os.environ.get("RECONCILE_INTERVAL_SECONDS", "60"))
+
+# Swarm fields that map onto the HPA spec.
+HPA_FIELDS = {
+    "min_replicas": "minReplicas",
+    "max_replicas": "maxReplicas",
+}
+# Swarm fields that feed the HPA metric list, in build_hpa_metrics order.
+METRIC_FIELDS = ("target_cpu", "target_inflight_per_pod", "target_p95_latency_ms")
+# Swarm fields that map onto the container's requests and limits.
+RESOURCE_FIELDS = {"resource_profile", "resources"}
+CLUSTER_FIELDS = (
+    set(HPA_FIELDS) | set(METRIC_FIELDS) | RESOURCE_FIELDS | {"dockerhub_image"}
+)
+
+
+def swarm_hpa_metrics(swarm: Swarm) -> List[Dict[str, Any]]:
+    return to_k8s_dict(
+        build_hpa_metrics(
+            swarm.id,
+            swarm.target_cpu,
+            swarm.target_inflight_per_pod,
+            swarm.target_p95_latency_ms,
+        )
+    )
+
+
+def apply_swarm_spec(swarm: Swarm, fields: Set[str]) -> None:
+    """
+    Push the given fields of a swarm record to the cluster as minimal patches: one
+    HPA patch for the scaling bounds and metrics, and one rolling update for the
+    image and resources.
+    """
+    deployment_name = f"swarm-{swarm.id}"
+    hpa_spec = {
+        HPA_FIELDS[field]: getattr(swarm, field)
+        for field in sorted(fields)
+        if field in HPA_FIELDS
+    }
+    if fields & set(METRIC_FIELDS):
+        hpa_spec["metrics"] = swarm_hpa_metrics(swarm)
+    if hpa_spec:
+        patch_horizontal_pod_autoscaler(deployment_name, hpa_spec)
+    container = {}
+    if "dockerhub_image" in fields:
+        container["image"] = swarm.dockerhub_image
+    if fields & RESOURCE_FIELDS:
+        resources = to_k8s_dict(swarm_resources(swarm))
+        # Strategic merge keeps map keys that are absent; null removes them.
+        container["resources"] = {
+            kind: {name: resources.get(kind, {}).get(name) for name in RESOURCE_NAMES}
+            for kind in ("requests", "limits")
+        }
+    if container:
+        patch_deployment_container(deployment_name, container)
+
+
+def detect_drift(swarm: Swarm) -> Set[str]:
+    """
+    Compare a swarm record with its Deployment and HPA and return the fields whose
+    live value differs from the stored one.
+    """
+    deployment_name = f"swarm-{swarm.id}"
+    drift = set()
+
+    hpa = k8s_clients.autoscaling_v2.read_namespaced_horizontal_pod_autoscaler(
+        name=deployment_name, namespace="default"
+    )
+    live_spec = to_k8s_dict(hpa)["spec"]
+    drift.update(
+        field
+        for field, key in HPA_FIELDS.items()
+        if getattr(swarm, field) != live_spec.get(key)
+    )
+    live_metrics = live_spec.get("metrics") or []
+    if live_metrics != swarm_hpa_metrics(swarm):
+        drift.update(field for field in METRIC_FIELDS if getattr(swarm, field))
+
+    deployment = k8s_clients.apps_v1.read_namespaced_deployment(
+        name=deployment_name, namespace="default"
+    )
+    containers = deployment.spec.template.spec.containers
+    if not containers or containers[0].image != swarm.dockerhub_image:
+        drift.add("dockerhub_image")
+    if containers and normalize_resources(containers[0].resources) != (
+        normalize_resources(swarm_resources(swarm))
+    ):
+        drift.add("resources")
+    return drift
+
+
+class SwarmPatchCoalescer:
+    """
+    Debounces swarm updates so that rapid successive edits reach the cluster as a
+    single patch.
+
+    Changed field names are accumulated per swarm for `delay` seconds; the flush
+    then reads the latest stored record and applies only those fields.
+    """
+
+    def __init__(self, delay: float = PATCH_COALESCE_SECONDS) -> None:
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Set[str]] = {}
+        self._timers: Dict[str, threading.Timer] = {}
+
+    def schedule(self, swarm_id: str, fields: Set[str]) -> None:
+        fields = set(fields) & CLUSTER_FIELDS
+        if not fields:
+            return
+        with self._lock:
+            self._pending.setdefault(swarm_id, set()).update(fields)
+            if swarm_id not in self._timers:
+                timer = threading.Timer(self.delay, self.flush, args=(swarm_id,))
+                timer.daemon = True
+                self._timers[swarm_id] = timer
+                timer.start()
+
+    def flush(self, swarm_id: str) -> None:
+        with self._lock:
+            fields = self._pending.pop(swarm_id, set())
+            timer = self._timers.pop(swarm_id, None)
+        if timer is not None:
+            timer.cancel()
+        swarm = swarm_store.get(swarm_id)
+        if not fields or swarm is None or swarm.status != SwarmStatus.READY:
+            # Swarms still provisioning are brought in line by the reconcile loop.
+            return
+        try:
+            apply_swarm_spec(swarm, fields)
+        except Exception as e:
+            logger.error(f"Failed to apply update to swarm {swarm_id}: {e}")
+
+    def flush_all(self) -> None:
+        with self._lock:
+            swarm_ids = list(self._pending)
+        for swarm_id in swarm_ids:
+            self.flush(swarm_id)
+
+
+class SwarmReconciler:
+    """
+    Periodically compares every ready swarm with the cluster and patches any drift
+    (missed updates, manual edits, updates made while the swarm was provisioning).
+    Only the `controller_lease` holder reconciles. When a process becomes the
+    holder it first finishes the work of processes that stopped midway (see
+    `resume_interrupted`). Every process, leader or not, samples the usage of
+    ready swarms each interval for its `resource_advisor`.
+    """
+
+    def __init__(self, interval: float = RECONCILE_INTERVAL_SECONDS) -> None:
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._resumed = False
+
+    def resume_interrupted(self) -> List[str]:
+        """
+        Resume provisioning of swarms still `provisioning` and finish tearing down
+        swarms still `deleting`, e.g. after the process doing it restarted.
+
+        Returns:
+            List[str]: The ids of the swarms that were picked up.
+        """
+        picked_up = []
+        for swarm in swarm_store.list_all():
+            try:
+                if swarm.status == SwarmStatus.PROVISIONING:
+                    if provisioner.resume(swarm):
+                        picked_up.append(swarm.id)
+                elif swarm.status == SwarmStatus.DELETING:
+                    teardown_swarm(swarm.id)
+                    picked_up.append(swarm.id)
+            except Exception as e:
+                logger.error(f"Failed to resume swarm {swarm.id}: {e}")
+        return picked_up
+
+    def reconcile_once(self) -> Dict[str, Set[str]]:
+        """
+        Run one reconciliation pass.
+
+        Returns:
+            Dict[str, Set[str]]: The drifted fields that were patched, per swarm id.
+        """
+        patched = {}
+        for swarm in swarm_store.list_all():
+            if swarm.status != SwarmStatus.READY:
+                continue
+            try:
+                drift = detect_drift(swarm)
+                if drift:
+                    logger.warning(f"Swarm {swarm.id} drifted on {sorted(drift)}")
+                    apply_swarm_spec(swarm, drift)
+                    patched[swarm.id] = drift
+            except Exception as e:
+                logger.error(f"Failed to reconcile swarm {swarm.id}: {e}")
+        return patched
+
+    def sample_usage(self) -> int:
+        ready = [
+            swarm.id
+            for swarm in swarm_store.list_all()
+            if swarm.status == SwarmStatus.READY
+        ]
+        try:
+            return resource_advisor.sample(ready)
+        except Exception as e:
+            logger.warning(f"Could not sample swarm resource usage: {e}")
+            return 0
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.sample_usage()
+            if not controller_lease.is_leader():
+                self._resumed = False
+                continue
+            if not self._resumed:
+                self.resume_interrupted()
+                self._resumed = True
+            self.reconcile_once()
+
+    def start(self) -> None:
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="swarm-reconciler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+swarm_patcher = SwarmPatchCoalescer()
+reconciler = SwarmReconciler()
+
+
+# ------------------------------------------------------------------------------
+# Completions Proxy
+# ------------------------------------------------------------------------------
+
+COMPLETIONS_CONNECT_TIMEOUT = float(os.environ.get("COMPLETIONS_CONNECT_TIMEOUT", "5"))
+COMPLETIONS_READ_TIMEOUT = float(os.environ.get("COMPLETIONS_READ_TIMEOUT", "300"))
+COMPLETIONS_MAX_CONNECTIONS = int(os.environ.get("COMPLETIONS_MAX_CONNECTIONS", "100"))
+COMPLETIONS_MAX_KEEPALIVE = int(os.environ.get("COMPLETIONS_MAX_KEEPALIVE", "20"))
+# "auto" routes straight to pod IPs when this API itself runs inside the cluster.
+COMPLETIONS_POD_ROUTING = os.environ.get("COMPLETIONS_POD_ROUTING", "auto").lower()
+REPLICA_ENDPOINTS_TTL = float(os.environ.get("REPLICA_ENDPOINTS_TTL", "10"))
+# Number of recent request latencies kept per swarm for the p95 metric.
+LATENCY_WINDOW = int(os.environ.get("LATENCY_WINDOW", "512"))
+# Requests buffered while a scaled-to-zero swarm cold starts, and how long they wait.
+COLD_START_MAX_BUFFERED = int(os.environ.get("COLD_START_MAX_BUFFERED", "100"))
+COLD_START_TIMEOUT = float(os.environ.get("COLD_START_TIMEOUT", "120"))
+
+# Hop-by-hop headers must not be forwarded by a proxy.
+HOP_BY_HOP_HEADERS = {
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "te",
+    "trailers",
+    "transfer-encoding",
+    "upgrade",
+    "content-length",
+}
+
+
+def pod_routing_enabled() -> bool:
+    if COMPLETIONS_POD_ROUTING == "auto":
+        return "KUBERNETES_SERVICE_HOST" in os.environ
+    return COMPLETIONS_POD_ROUTING in ("1", "true", "yes", "on")
+
+
+def list_replica_endpoints(service_name: str) -> List[str]:
+    """
+    Resolve the ready pod addresses behind a swarm's Service.
+    """
+    endpoints = k8s_clients.core_v1.read_namespaced_endpoints(
+        name=service_name, namespace="default"
+    )
+    urls = []
+    for subset in endpoints.subsets or []:
+        port = subset.ports[0].port if subset.ports else 8080
+        for address in subset.addresses or []:
+            urls.append(f"http://{address.ip}:{port}")
+    return urls
+
+
+class UpstreamStreamingResponse(StreamingResponse):
+    """
+    A StreamingResponse that runs `on_close` however the response ends: after the
+    last chunk, on a client disconnect, or when the request is cancelled. A
+    BackgroundTask would only run after a complete response.
+    """
+
+    def __init__(
+        self, content: Any, on_close: Callable[[], Awaitable[None]], **kwargs: Any
+    ) -> None:
+        super().__init__(content, **kwargs)
+        self.on_close = on_close
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            with anyio.CancelScope(shield=True):
+                await self.on_close()
+
+
+class CompletionsProxy:
+    """
+    Streams completion requests to a swarm's containers over pooled keep-alive
+    connections.
+
+    Each swarm gets its own `httpx.AsyncClient` (one connection pool per swarm).
+    When pod routing is enabled, requests are spread across the Service's ready
+    replicas, preferring the replica with the fewest in-flight requests; otherwise
+    they go to the swarm's configured endpoint. Upstream response bodies are passed
+    through chunk by chunk without buffering.
+
+    The proxy also keeps the per-swarm in-flight count and latency window that the
+    HPA scales on (see GET /metrics), and wakes swarms that were scaled to zero,
+    holding their requests until a replica is ready. Because each process only
+    sees its own traffic, `report_activity` publishes it on the swarm's Deployment
+    for the scale-to-zero controller.
+    """
+
+    def __init__(self) -> None:
+        self.timeout = httpx.Timeout(
+            COMPLETIONS_READ_TIMEOUT, connect=COMPLETIONS_CONNECT_TIMEOUT
+        )
+        self.limits = httpx.Limits(
+            max_connections=COMPLETIONS_MAX_CONNECTIONS,
+            max_keepalive_connections=COMPLETIONS_MAX_KEEPALIVE,
+        )
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._replicas: Dict[str, Tuple[List[str], float]] = {}
+        self._inflight: Dict[str, int] = {}
+        self._counter = itertools.count()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._swarm_inflight: Dict[str, int] = {}
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._last_request: Dict[str, float] = {}
+        self._waking: Dict[str, asyncio.Future] = {}
+        self._buffered: Dict[str, int] = {}
+        self._reported_at = 0.0
+
+    def client_for(self, swarm_id: str) -> httpx.AsyncClient:
+        self._loop = asyncio.get_running_loop()
+        http_client = self._clients.get(swarm_id)
+        if http_client is None:
+            http_client = httpx.AsyncClient(timeout=self.timeout, limits=self.limits)
+            self._clients[swarm_id] = http_client
+        return http_client
+
+    async def replica_endpoints(self, swarm: Swarm) -> List[str]:
+        if not pod_routing_enabled():
+            return [swarm.endpoint]
+        cached = self._replicas.get(swarm.id)
+        if cached and time.monotonic() - cached[1] < REPLICA_ENDPOINTS_TTL:
+            return cached[0]
+        try:
+            urls = await asyncio.to_thread(list_replica_endpoints, f"svc-{swarm.id}")
+        except Exception as e:
+            logger.warning(f"Could not resolve replicas for swarm {swarm.id}: {e}")
+            urls = []
+        urls = urls or [swarm.endpoint]
+        self._replicas[swarm.id] = (urls, time.monotonic())
+        return urls
+
+    def pick_endpoint(self, endpoints: List[str]) -> str:
+        """
+        Least-in-flight selection, rotating the starting point to break ties.
+        """
+        start = next(self._counter) % len(endpoints)
+        rotated = endpoints[start:] + endpoints[:start]
+        return min(rotated, key=lambda url: self._inflight.get(url, 0))
+
+    def inflight(self, swarm_id: str) -> int:
+        return self._swarm_inflight.get(swarm_id, 0)
+
+    def idle_seconds(self, swarm_id: str) -> Optional[float]:
+        last = self._last_request.get(swarm_id)
+        return None if last is None else time.monotonic() - last
+
+    def is_waking(self, swarm_id: str) -> bool:
+        return swarm_id in self._waking
+
+    def report_activity(self) -> List[str]:
+        """
+        Stamp the Deployment of every swarm this process served since the last
+        report, or is still serving, with `record_deployment_activity`. Runs on
+        the controller thread of every process, leader or not.
+
+        Returns:
+            List[str]: The ids of the swarms that were stamped.
+        """
+        since, self._reported_at = self._reported_at, time.monotonic()
+        active = {
+            swarm_id
+            for swarm_id, last in list(self._last_request.items())
+            if last >= since
+        }
+        active.update(
+            swarm_id
+            for swarm_id, count in list(self._swarm_inflight.items())
+            if count > 0
+        )
+        for swarm_id in active:
+            try:
+                record_deployment_activity(f"swarm-{swarm_id}")
+            except Exception as e:
+                logger.warning(f"Could not record activity of swarm {swarm_id}: {e}")
+        return sorted(active)
+
+    def metrics_snapshot(self) -> Dict[str, Dict[str, float]]:
+        """
+        Per-swarm in-flight completions and p95 latency (ms) over the recent window.
+        """
+        snapshot = {}
+        for swarm_id in set(self._swarm_inflight) | set(self._latencies):
+            latencies = sorted(self._latencies.get(swarm_id, ()))
+            p95 = latencies[int(0.95 * (len(latencies) - 1))] if latencies else 0.0
+            snapshot[swarm_id] = {
+                INFLIGHT_METRIC: self.inflight(swarm_id),
+                LATENCY_P95_METRIC: round(p95, 3),
+            }
+        return snapshot
+
+    def _record_latency(self, swarm_id: str, started: float) -> None:
+        window = self._latencies.get(swarm_id)
+        if window is None:
+            window = self._latencies[swarm_id] = deque(maxlen=LATENCY_WINDOW)
+        window.append((time.monotonic() - started) * 1000)
+
+    def _wake_swarm(self, swarm: Swarm) -> None:
+        deployment_name = f"swarm-{swarm.id}"
+        try:
+            # Stamp first so the leader does not see a stale stamp on a woken swarm.
+            record_deployment_activity(deployment_name)
+        except Exception as e:
+            logger.warning(f"Could not record activity of swarm {swarm.id}: {e}")
+        scale_deployment(deployment_name, max(1, swarm.min_replicas))
+        wait_for_deployment_ready(deployment_name, COLD_START_TIMEOUT)
+        swarm_store.update(swarm.id, scaled_to_zero=False)
+        self._replicas.pop(swarm.id, None)
+        logger.info(f"Swarm {swarm.id} woke from zero replicas")
+
+    async def wake(self, swarm: Swarm) -> None:
+        """
+        Scale a swarm back up from zero and wait until it is ready. Concurrent
+        callers share one wake-up; at most COLD_START_MAX_BUFFERED requests wait.
+        """
+        if self._buffered.get(swarm.id, 0) >= COLD_START_MAX_BUFFERED:
+            raise HTTPException(
+                status_code=503,
+                detail="Swarm is starting, too many requests buffered",
+                headers={"Retry-After": str(int(COLD_START_TIMEOUT))},
+            )
+        waking = self._waking.get(swarm.id)
+        if waking is None:
+            waking = asyncio.ensure_future(asyncio.to_thread(self._wake_swarm, swarm))
+            self._waking[swarm.id] = waking
+            waking.add_done_callback(lambda _: self._waking.pop(swarm.id, None))
+
+        self._buffered[swarm.id] = self._buffered.get(swarm.id, 0) + 1
+        try:
+            await asyncio.wait_for(asyncio.shield(waking), COLD_START_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail="Swarm cold start timed out")
+        except Exception as e:
+            logger.error(f"Failed to wake swarm {swarm.id}: {e}")
+            raise HTTPException(status_code=503, detail="Swarm failed to start")
+        finally:
+            self._buffered[swarm.id] -= 1
+
+    async def forward(self, swarm: Swarm, request: Request) -> StreamingResponse:
+        self._last_request[swarm.id] = time.monotonic()
+        if swarm.scaled_to_zero:
+            await self.wake(swarm)
+        endpoint = self.pick_endpoint(await self.replica_endpoints(swarm))
+        http_client = self.client_for(swarm.id)
+        headers = {
+            "content-type": request.headers.get("content-type", "application/json")
+        }
+        upstream_request = http_client.build_request(
+            "POST",
+            f"{endpoint}/completions",
+            content=await request.body(),
+            headers=headers,
+        )
+
+        self._inflight[endpoint] = self._inflight.get(endpoint, 0) + 1
+        self._swarm_inflight[swarm.id] = self.inflight(swarm.id) + 1
+        started = time.monotonic()
+        released = False
+
+        def release() -> None:
+            nonlocal released
+            if not released:
+                released = True
+                self._inflight[endpoint] -= 1
+                self._swarm_inflight[swarm.id] -= 1
+                self._last_request[swarm.id] = time.monotonic()
+                self._record_latency(swarm.id, started)
+
+        try:
+            upstream = await http_client.send(upstream_request, stream=True)
+        except httpx.HTTPError as e:
+            release()
+            logger.error(f"Error fetching completions from {endpoint}: {e}")
+            raise HTTPException(status_code=502, detail=str(e))
+
+        if upstream.is_error:
+            body = await upstream.aread()
+            await upstream.aclose()
+            release()
+            logger.error(
+                f"Error fetching completions from {endpoint}: {upstream.status_code}"
+            )
+            raise HTTPException(
+                status_code=upstream.status_code, detail=body.decode(errors="replace")
+            )
+
+        async def close_upstream() -> None:
+            release()
+            await upstream.aclose()
+
+        response_headers = {
+            k: v
+            for k, v in upstream.headers.items()
+            if k.lower() not in HOP_BY_HOP_HEADERS
+        }
+        return UpstreamStreamingResponse(
+            upstream.aiter_raw(),
+            on_close=close_upstream,
+            status_code=upstream.status_code,
+            headers=response_headers,
+        )
+
+    def discard(self, swarm_id: str) -> None:
+        """
+        Drop the pool for a deleted swarm. Safe to call from worker threads.
+        """
+        self._replicas.pop(swarm_id, None)
+        self._swarm_inflight.pop(swarm_id, None)
+        self._latencies.pop(swarm_id, None)
+        self._last_request.pop(swarm_id, None)
+        http_client = self._clients.pop(swarm_id, None)
+        if http_client is not None and self._loop is not None:
+            asyncio.run_coroutine_threadsafe(http_client.aclose(), self._loop)
+
+    async def aclose(self) -> None:
+        clients, self._clients = list(self._clients.values()), {}
+        for http_client in clients:
+            await http_client.aclose()
+
+
+completions_proxy = CompletionsProxy()
+
+
+# ------------------------------------------------------------------------------
+# Scale to Zero
+# ------------------------------------------------------------------------------
+
+SCALE_TO_ZERO_INTERVAL_SECONDS = float(
+    os.environ.get("SCALE_TO_ZERO_INTERVAL_SECONDS", "30")
+)
+
+
+class ScaleToZeroController:
+    """
+    Scales idle swarms that opted into `scale_to_zero` down to zero replicas.
+
+    A swarm is idle when it has no in-flight completions and has not seen a request
+    for `idle_timeout_seconds`. The HPA is inactive while its target has zero
+    replicas; the completions proxy scales the Deployment back up on the next request.
+
+    Every process reports its own traffic each interval; only the
+    `controller_lease` holder scales, judging idleness from the activity stamp all
+    processes leave on the Deployment. Processes with requests in flight re-stamp
+    every interval, so the idle timeout is never shorter than two intervals.
+    """
+
+    def __init__(self, interval: float = SCALE_TO_ZERO_INTERVAL_SECONDS) -> None:
+        self.interval = interval
+        self._first_seen: Dict[str, float] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _idle_seconds(self, swarm_id: str) -> float:
+        idle = completions_proxy.idle_seconds(swarm_id)
+        deployment = k8s_clients.apps_v1.read_namespaced_deployment(
+            name=f"swarm-{swarm_id}", namespace="default"
+        )
+        reported = deployment_activity_age(deployment)
+        if reported is not None:
+            idle = reported if idle is None else min(idle, reported)
+        if idle is None:
+            first_seen = self._first_seen.setdefault(swarm_id, time.monotonic())
+            idle = time.monotonic() - first_seen
+        return idle
+
+    def check_once(self) -> Dict[str, int]:
+        """
+        Run one pass.
+
+        Returns:
+            Dict[str, int]: The new replica count of every swarm that was scaled.
+        """
+        scaled = {}
+        for swarm in swarm_store.list_all():
+            if swarm.status != SwarmStatus.READY:
+                continue
+            deployment_name = f"swarm-{swarm.id}"
+            try:
+                if swarm.scaled_to_zero and not swarm.scale_to_zero:
+                    # Opted out while asleep: restore the HPA's floor.
+                    replicas = max(1, swarm.min_replicas)
+                    scale_deployment(deployment_name, replicas)
+                    swarm_store.update(swarm.id, scaled_to_zero=False)
+                    scaled[swarm.id] = replicas
+                elif (
+                    swarm.scale_to_zero
+                    and not swarm.scaled_to_zero
+                    and completions_proxy.inflight(swarm.id) == 0
+                    and not completions_proxy.is_waking(swarm.id)
+                    and self._idle_seconds(swarm.id)
+                    >= max(swarm.idle_timeout_seconds, 2 * self.interval)
+                ):
+                    logger.info(f"Scaling idle swarm {swarm.id} to zero")
+                    scale_deployment(deployment_name, 0)
+                    swarm_store.update(swarm.id, scaled_to_zero=True)
+                    scaled[swarm.id] = 0
+            except Exception as e:
+                logger.error(f"Failed to scale swarm {swarm.id}: {e}")
+        return scaled
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            completions_proxy.report_activity()
+            if controller_lease.is_leader():
+                self.check_once()
+
+    def start(self) -> None:
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="swarm-scale-to-zero", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+scale_to_zero_controller = ScaleToZeroController()
+
+
+# ------------------------------------------------------------------------------
+# Swarm Lifecycle and Bulk Operations
+# ------------------------------------------------------------------------------
+
+BULK_MAX_ITEMS = int(os.environ.get("BULK_MAX_ITEMS", "100"))
+BULK_CONCURRENCY = int(os.environ.get("BULK_CONCURRENCY", "8"))
+
+bulk_executor = ThreadPoolExecutor(
+    max_workers=BULK_CONCURRENCY, thread_name_prefix="swarm-bulk"
+)
+
+
+def register_swarm(swarm_data: SwarmCreate, owner: str) -> Swarm:
+    """
+    Record a new swarm as provisioning and hand it to the background provisioner.
+    """
+    swarm_id = str(uuid.uuid4())
+    service_name = f"svc-{swarm_id}"
+
+    # In a real-world scenario, you might fetch the external endpoint (e.g., from the Service status)
+    endpoint = f"http://{service_name}.example.com"  # Placeholder
+
+    swarm = Swarm(
+        id=swarm_id,
+        owner=owner,
+        endpoint=endpoint,
+        **swarm_data.dict(),
+    )
+    swarm_store.put(swarm)
+    provisioner.submit(swarm)
+    return swarm
+
+
+def teardown_swarm(swarm_id: str) -> None:
+    """
+    Delete a swarm's Kubernetes resources, then its record and proxy pool.
+
+    The record is marked `deleting` first, which stops a provisioner still working
+    on the swarm. Resources that were never created are skipped, so failed and
+    provisioning swarms can be deleted too; if teardown fails the record stays
+    `deleting` and the delete can be retried.
+    """
+    swarm_store.update(swarm_id, status=SwarmStatus.DELETING)
+    delete_swarm_resources(swarm_id)
+
+    swarm_store.delete(swarm_id)
+    resource_advisor.discard(swarm_id)
+    completions_proxy.discard(swarm_id)
+
+
+def check_bulk_size(items: List[Any]) -> None:
+    if len(items) > BULK_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {BULK_MAX_ITEMS} items are allowed per bulk request",
+        )
+
+
+def summarize_bulk(results: List[BulkItemResult]) -> BulkOperationResult:
+    failed = sum(1 for result in results if result.status_code >= 400)
+    return BulkOperationResult(
+        results=results, succeeded=len(results) - failed, failed=failed
+    )
 
 
 # ------------------------------------------------------------------------------
@@ -404,54 +2643,102 @@ def create_swarm(
     swarm_data: SwarmCreate, current_user: str = Depends(get_current_user)
 ) -> Swarm:
     """
-    Create a new swarm deployment. This will:
-      1. Pull the Docker image from Docker Hub.
-      2. Create a Kubernetes Deployment, Service, and HPA.
+    Create a new swarm deployment.
+
+    The swarm is recorded with status `provisioning` and returned immediately. A
+    background provisioner then pulls the Docker image and creates the Kubernetes
+    Deployment, Service, and HPA; poll `GET /swarms/{id}` for progress.
     """
     logger.info(f"Creating swarm with data: {swarm_data}")
-    swarm_id = str(uuid.uuid4())
-    deployment_name = f"swarm-{swarm_id}"
-    service_name = f"svc-{swarm_id}"
+    try:
+        resolve_resource_spec(swarm_data.resource_profile, swarm_data.resources)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return register_swarm(swarm_data, current_user)
 
-    # Pull the Docker image
-    pull_docker_image(swarm_data.dockerhub_image)
-
-    # Create Kubernetes resources
-    create_deployment(deployment_name, swarm_data.dockerhub_image)
-    create_service(service_name, deployment_name)
-    # Allow some time for deployment registration.
-    time.sleep(5)
-    create_horizontal_pod_autoscaler(
-        deployment_name,
-        min_replicas=swarm_data.min_replicas,
-        max_replicas=swarm_data.max_replicas,
-        target_cpu_utilization_percentage=swarm_data.target_cpu,
-    )
 
-    # In a real-world scenario, you might fetch the external endpoint (e.g., from the Service status)
-    endpoint = f"http://{service_name}.example.com"  # Placeholder
+@app.post("/swarms/bulk", response_model=BulkOperationResult)
+def bulk_create_swarms(
+    bulk: SwarmBulkCreate, current_user: str = Depends(get_current_user)
+) -> BulkOperationResult:
+    """
+    Create many swarms in one call.
 
-    swarm = Swarm(
-        id=swarm_id,
-        name=swarm_data.name,
-        description=swarm_data.description,
-        dockerhub_image=swarm_data.dockerhub_image,
-        min_replicas=swarm_data.min_replicas,
-        max_replicas=swarm_data.max_replicas,
-        target_cpu=swarm_data.target_cpu,
-        owner=current_user,
-        endpoint=endpoint,
-    )
-    swarm_store[swarm_id] = swarm
-    return swarm
+    Every item gets its own result: 201 with the new swarm (status `provisioning`),
+    or 422 if the item is invalid. Valid items are created even when others fail.
+    Kubernetes resources are provisioned in the background, PROVISIONING_WORKERS
+    swarms at a time.
+    """
+    check_bulk_size(bulk.swarms)
+    results = []
+    for index, item in enumerate(bulk.swarms):
+        try:
+            swarm_data = SwarmCreate.parse_obj(item)
+            resolve_resource_spec(swarm_data.resource_profile, swarm_data.resources)
+        except (ValidationError, ValueError) as e:
+            results.append(BulkItemResult(index=index, status_code=422, error=str(e)))
+            continue
+        try:
+            swarm = register_swarm(swarm_data, current_user)
+        except Exception as e:
+            logger.error(f"Bulk create failed for item {index}: {e}")
+            results.append(BulkItemResult(index=index, status_code=500, error=str(e)))
+            continue
+        results.append(
+            BulkItemResult(index=index, id=swarm.id, status_code=201, swarm=swarm)
+        )
+    logger.info(f"Bulk created {len(results)} swarms for {current_user}")
+    return summarize_bulk(results)
+
+
+@app.delete("/swarms/bulk", response_model=BulkOperationResult)
+def bulk_delete_swarms(
+    bulk: SwarmBulkDelete, current_user: str = Depends(get_current_user)
+) -> BulkOperationResult:
+    """
+    Delete many swarms in one call, tearing them down BULK_CONCURRENCY at a time.
+
+    Every id gets its own result: 204 when deleted, 404 when it does not exist or
+    belongs to someone else, or the Kubernetes error status when teardown failed.
+    """
+    check_bulk_size(bulk.ids)
+
+    def delete_one(index: int, swarm_id: str) -> BulkItemResult:
+        swarm = swarm_store.get(swarm_id)
+        if not swarm or swarm.owner != current_user:
+            return BulkItemResult(
+                index=index, id=swarm_id, status_code=404, error="Swarm not found"
+            )
+        try:
+            teardown_swarm(swarm_id)
+        except ApiException as e:
+            return BulkItemResult(
+                index=index, id=swarm_id, status_code=e.status or 500, error=e.reason
+            )
+        except Exception as e:
+            logger.error(f"Bulk delete failed for swarm {swarm_id}: {e}")
+            return BulkItemResult(
+                index=index, id=swarm_id, status_code=500, error=str(e)
+            )
+        return BulkItemResult(index=index, id=swarm_id, status_code=204)
+
+    futures = [
+        bulk_executor.submit(delete_one, index, swarm_id)
+        for index, swarm_id in enumerate(bulk.ids)
+    ]
+    return summarize_bulk([future.result() for future in futures])
 
 
 @app.get("/swarms/", response_model=List[Swarm])
-def list_swarms(current_user: str = Depends(get_current_user)) -> List[Swarm]:
+def list_swarms(
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    current_user: str = Depends(get_current_user),
+) -> List[Swarm]:
     """
-    List all swarms that belong to the current user.
+    List the swarms that belong to the current user, oldest first, one page at a time.
     """
-    return [swarm for swarm in swarm_store.values() if swarm.owner == current_user]
+    return swarm_store.list_by_owner(current_user, limit=limit, offset=offset)
 
 
 @app.get("/swarms/{swarm_id}", response_model=Swarm)
@@ -472,22 +2759,34 @@ def update_swarm(
     current_user: str = Depends(get_current_user),
 ) -> Swarm:
     """
-    Update a swarm's configuration. For simplicity, this example only supports updating
-    metadata and scaling parameters. To update the image, you might need to perform a rolling update.
+    Update a swarm's configuration.
+
+    The stored record is updated immediately. Changes to the scaling parameters and
+    image are pushed to the cluster shortly afterwards as HPA patches and a rolling
+    update; rapid successive updates are coalesced into one patch.
     """
     swarm = swarm_store.get(swarm_id)
     if not swarm or swarm.owner != current_user:
         raise HTTPException(status_code=404, detail="Swarm not found")
 
-    # Update local record
+    # Update stored record
     update_data = swarm_update.dict(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(swarm, key, value)
+    if "resources" in update_data and swarm_update.resources is not None:
+        update_data["resources"] = swarm_update.resources
+    try:
+        resolve_resource_spec(
+            update_data.get("resource_profile", swarm.resource_profile),
+            update_data.get("resources", swarm.resources),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    updated = swarm_store.update(swarm_id, **update_data)
 
-    # For a full update, you might perform additional Kubernetes API calls to patch/update
-    # the Deployment, Service, and HPA accordingly.
-    swarm_store[swarm_id] = swarm
-    return swarm
+    changed = {
+        field for field, value in update_data.items() if getattr(swarm, field) != value
+    }
+    swarm_patcher.schedule(swarm_id, changed)
+    return updated
 
 
 @app.delete("/swarms/{swarm_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -499,16 +2798,36 @@ def delete_swarm(swarm_id: str, current_user: str = Depends(get_current_user)) -
     if not swarm or swarm.owner != current_user:
         raise HTTPException(status_code=404, detail="Swarm not found")
 
-    # Delete Kubernetes resources.
-    deployment_name = f"swarm-{swarm_id}"
-    service_name = f"svc-{swarm_id}"
+    try:
+        teardown_swarm(swarm_id)
+    except ApiException as e:
+        raise HTTPException(status_code=e.status or 500, detail=e.reason)
 
-    delete_deployment(deployment_name)
-    delete_service(service_name)
-    delete_horizontal_pod_autoscaler(deployment_name)
 
-    # Remove from local store.
-    del swarm_store[swarm_id]
+@app.get("/resource-profiles", response_model=Dict[str, ResourceSpec])
+def list_resource_profiles() -> Dict[str, ResourceSpec]:
+    """
+    List the named resource profiles a swarm can select.
+    """
+    return RESOURCE_PROFILES
+
+
+@app.get(
+    "/swarms/{swarm_id}/resources/recommendation",
+    response_model=ResourceRecommendation,
+)
+def recommend_swarm_resources(
+    swarm_id: str, current_user: str = Depends(get_current_user)
+) -> ResourceRecommendation:
+    """
+    Recommend a resource profile from the swarm's observed usage: the peak over
+    the last RESOURCE_USAGE_SAMPLES samples, taken every RECONCILE_INTERVAL_SECONDS
+    while the swarm is ready. Reading a recommendation does not take a sample.
+    """
+    swarm = swarm_store.get(swarm_id)
+    if not swarm or swarm.owner != current_user:
+        raise HTTPException(status_code=404, detail="Swarm not found")
+    return resource_advisor.recommend(swarm)
 
 
 @app.get("/health")
@@ -521,33 +2840,74 @@ def root() -> Dict[str, str]:
     return {"status": "ok"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics() -> str:
+    """
+    Completion proxy metrics in Prometheus text format, labelled by swarm. A metrics
+    adapter exposes these to the HPAs as external metrics.
+    """
+    snapshot = completions_proxy.metrics_snapshot()
+    lines = [
+        f"# HELP {INFLIGHT_METRIC} Completions currently in flight.",
+        f"# TYPE {INFLIGHT_METRIC} gauge",
+    ]
+    lines += [
+        f'{INFLIGHT_METRIC}{{swarm="{swarm_id}"}} {values[INFLIGHT_METRIC]}'
+        for swarm_id, values in sorted(snapshot.items())
+    ]
+    lines += [
+        f"# HELP {LATENCY_P95_METRIC} p95 completion latency over the recent window.",
+        f"# TYPE {LATENCY_P95_METRIC} gauge",
+    ]
+    lines += [
+        f'{LATENCY_P95_METRIC}{{swarm="{swarm_id}"}} {values[LATENCY_P95_METRIC]}'
+        for swarm_id, values in sorted(snapshot.items())
+    ]
+    return "\n".join(lines) + "\n"
+
+
 @app.post("/swarms/{swarm_id}/completions")
-def get_completions(
+async def get_completions(
     swarm_id: str,
-    payload: Dict[str, Any] = Body(...),
+    request: Request,
     current_user: str = Depends(get_current_user),
-) -> Dict[str, str]:
+) -> StreamingResponse:
     """
-    Sends a user-defined payload to the user's Dockerfile endpoint and fetches completions.
+    Sends a user-defined payload to the user's Dockerfile endpoint and streams back
+    the completions.
     """
     swarm = swarm_store.get(swarm_id)
     if not swarm or swarm.owner != current_user:
         raise HTTPException(status_code=404, detail="Swarm not found")
 
     # Assuming the endpoint is stored in the swarm's data
-    endpoint = swarm.endpoint
-    if not endpoint:
+    if not swarm.endpoint:
         raise HTTPException(
             status_code=400, detail="Endpoint not configured for this swarm"
         )
 
-    try:
-        response = httpx.post(f"{endpoint}/completions", json=payload)
-        response.raise_for_status()
-        return response.json()
-    except httpx.HTTPStatusError as e:
-        logger.error(f"Error fetching completions from {endpoint}: {e}")
-        raise HTTPException(status_code=e.response.status_code, detail=e.response.text)
+    return await completions_proxy.forward(swarm, request)
+
+
+@app.on_event("shutdown")
+async def close_completions_proxy() -> None:
+    await completions_proxy.aclose()
+
+
+@app.on_event("startup")
+def start_reconciler() -> None:
+    reconciler.start()
+    scale_to_zero_controller.start()
+    warm_pool.start()
+
+
+@app.on_event("shutdown")
+def stop_reconciler() -> None:
+    warm_pool.stop()
+    scale_to_zero_controller.stop()
+    reconciler.stop()
+    controller_lease.release()
+    swarm_patcher.flush_all()
 
 
 if __name__ == "__main__":
@@ -1,7 +1,21 @@
 from dotenv import load_dotenv
-from swarms_cloud.main import SwarmCloudAPI
+from swarms_cloud.main import (
+    CircuitBreaker,
+    CircuitBreakerOpenError,
+    ResponseCache,
+    RetryPolicy,
+    SwarmCloudAPI,
+    create_transport,
+)
 
 load_dotenv()
 
 
-__all__ = ["SwarmCloudAPI"]
+__all__ = [
+    "SwarmCloudAPI",
+    "create_transport",
+    "RetryPolicy",
+    "CircuitBreaker",
+    "CircuitBreakerOpenError",
+    "ResponseCache",
+]
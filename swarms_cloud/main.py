@@ -34,15 +34,22 @@ Usage:
     >>> client.close()
 """
 
+import gzip
+import json
 import os
-from typing import Any, Dict, List, Optional
+import random
+import threading
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, Iterator, List, Optional, Union
 import uuid
 
 import httpx
 from loguru import logger
 from pydantic import BaseModel, Field
-from datetime import datetime
-
+from datetime import datetime, timezone
 
 # ------------------------------------------------------------------------------
 # Pydantic Models corresponding to the API's data structures
@@ -78,6 +85,10 @@ class AgentCreate(AgentBase):
         False,
         description="If true, the system will allow the agent to scale its executions concurrently.",
     )
+    coalesce: Optional[bool] = Field(
+        False,
+        description="If true, concurrent executions with identical payloads share one run.",
+    )
 
 
 class AgentUpdate(BaseModel):
@@ -86,12 +97,14 @@ class AgentUpdate(BaseModel):
     code: Optional[str] = None
     requirements: Optional[str] = None
     autoscaling: Optional[bool] = None
+    coalesce: Optional[bool] = None
 
 
 class AgentOut(AgentBase):
     id: str
     created_at: datetime
     autoscaling: bool = False
+    coalesce: bool = False
 
 
 class ExecutionPayload(BaseModel):
@@ -108,6 +121,445 @@ class AgentExecutionHistory(BaseModel):
     executions: List[ExecutionLog]
 
 
+class WorkflowNode(BaseModel):
+    id: str
+    agent_id: str
+    payload: Optional[Dict[str, Any]] = Field(default_factory=dict)
+
+
+class WorkflowEdge(BaseModel):
+    source: str
+    target: str
+    input_key: Optional[str] = None
+
+
+class SwarmCreate(BaseModel):
+    name: str
+    description: Optional[str] = None
+    dockerhub_image: str
+    min_replicas: int = 1
+    max_replicas: int = 5
+    target_cpu: int = 50
+
+
+class BulkItemResult(BaseModel):
+    index: int
+    id: Optional[str] = None
+    status_code: int
+    swarm: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+
+class BulkOperationResult(BaseModel):
+    results: List[BulkItemResult]
+    succeeded: int
+    failed: int
+
+
+# ------------------------------------------------------------------------------
+# Response Decoding
+# ------------------------------------------------------------------------------
+
+try:
+    import orjson
+
+    json_loads = orjson.loads
+    json_dumps = orjson.dumps
+except ImportError:
+    json_loads = json.loads
+
+    def json_dumps(obj: Any) -> bytes:
+        return json.dumps(obj, separators=(",", ":"), default=str).encode()
+
+
+try:
+    from pydantic import TypeAdapter
+except ImportError:  # pydantic v1
+    TypeAdapter = None
+
+
+@lru_cache(maxsize=None)
+def _type_adapter(model_type: Any) -> Any:
+    return TypeAdapter(model_type)
+
+
+def decode_response(
+    response: Union[httpx.Response, bytes],
+    model_type: Optional[Any] = None,
+    raw: bool = False,
+) -> Any:
+    """
+    Decode a JSON response body, optionally validating it into `model_type`.
+
+    With pydantic v2 the body is parsed and validated in a single pass by a cached
+    `TypeAdapter`, so a `List[AgentOut]` is validated as a whole instead of item by
+    item. Raw decoding uses orjson when it is installed.
+
+    Args:
+        response (Union[httpx.Response, bytes]): The response (or its body) to decode.
+        model_type (Optional[Any]): The type to validate into, e.g. `List[AgentOut]`.
+        raw (bool): Skip model construction and return plain JSON data.
+
+    Returns:
+        Any: The validated model(s), or the decoded JSON when `raw` or no type is given.
+    """
+    content = response.content if isinstance(response, httpx.Response) else response
+    if raw or model_type is None:
+        return json_loads(content)
+    if TypeAdapter is not None:
+        return _type_adapter(model_type).validate_json(content)
+    from pydantic import parse_obj_as
+
+    return parse_obj_as(model_type, json_loads(content))
+
+
+# ------------------------------------------------------------------------------
+# Request Body Compression
+# ------------------------------------------------------------------------------
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def compress_request_body(
+    body: bytes, encoding: str = "gzip", level: Optional[int] = None
+) -> bytes:
+    """
+    Compress a request body with gzip or zstd.
+
+    Args:
+        body (bytes): The encoded request body.
+        encoding (str): "gzip" or "zstd" (requires the optional 'zstandard' package).
+        level (Optional[int]): Compression level; defaults to a fast setting.
+
+    Returns:
+        bytes: The compressed body.
+    """
+    if encoding == "zstd":
+        if zstandard is None:
+            raise ValueError("zstd compression requires the 'zstandard' package")
+        return zstandard.ZstdCompressor(level=level or 3).compress(body)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=level or 5)
+    raise ValueError(f"Unsupported request compression: {encoding}")
+
+
+# ------------------------------------------------------------------------------
+# Client-side Response Cache
+# ------------------------------------------------------------------------------
+
+
+class CacheEntry(BaseModel):
+    content: bytes
+    etag: Optional[str] = None
+    expires_at: float
+
+    @property
+    def fresh(self) -> bool:
+        return time.monotonic() < self.expires_at
+
+
+class ResponseCache:
+    """
+    Thread-safe TTL + LRU cache for agent metadata responses.
+
+    Response bodies are stored undecoded and validated on every hit, so callers
+    never share mutable model instances. Expired entries that carry an ETag are
+    kept for conditional revalidation (`If-None-Match`); a 304 reply renews them
+    without transferring the body again.
+
+    Args:
+        maxsize (int): Maximum number of entries before the least recently used is evicted.
+        ttl (float): Seconds an entry is served without contacting the server.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Any, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Any) -> Optional[CacheEntry]:
+        """
+        Return the entry for `key`, including expired entries that can be revalidated.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if not entry.fresh and entry.etag is None:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            if entry.fresh:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return entry
+
+    def set(self, key: Any, content: bytes, etag: Optional[str] = None) -> None:
+        with self._lock:
+            self._entries[key] = CacheEntry(
+                content=content, etag=etag, expires_at=time.monotonic() + self.ttl
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def refresh(self, key: Any) -> None:
+        """
+        Extend the lifetime of an entry after a successful revalidation.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.expires_at = time.monotonic() + self.ttl
+
+    def invalidate(self, key: Any) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# ------------------------------------------------------------------------------
+# Connection Pooling and Transport Helpers
+# ------------------------------------------------------------------------------
+
+try:
+    import h2  # noqa: F401
+
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+def _resolve_http2(http2: bool) -> bool:
+    """
+    Return whether HTTP/2 can actually be enabled, warning if the optional
+    ``h2`` dependency is missing.
+    """
+    if http2 and not HTTP2_AVAILABLE:
+        logger.warning(
+            "HTTP/2 requested but the 'h2' package is not installed; falling back to HTTP/1.1. "
+            "Install it with `pip install httpx[http2]`."
+        )
+        return False
+    return http2
+
+
+def create_transport(
+    max_connections: int = 100,
+    max_keepalive_connections: int = 20,
+    keepalive_expiry: float = 30.0,
+    http2: bool = False,
+    retries: int = 0,
+) -> httpx.HTTPTransport:
+    """
+    Build a pooled HTTP transport that can be shared by several SwarmCloudAPI clients.
+
+    Args:
+        max_connections (int): Maximum number of concurrent connections in the pool.
+        max_keepalive_connections (int): Maximum number of idle keep-alive connections.
+        keepalive_expiry (float): Seconds an idle keep-alive connection is kept open.
+        http2 (bool): Enable HTTP/2 (requires the optional 'h2' package).
+        retries (int): Number of connection-level retries (connect errors only).
+
+    Returns:
+        httpx.HTTPTransport: The configured transport.
+    """
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive_connections,
+        keepalive_expiry=keepalive_expiry,
+    )
+    return httpx.HTTPTransport(
+        limits=limits, http2=_resolve_http2(http2), retries=retries
+    )
+
+
+class _SharedTransport(httpx.BaseTransport):
+    """
+    Wraps a transport owned by the caller so that closing one client does not
+    tear down the connection pool used by the other clients sharing it.
+    """
+
+    def __init__(self, transport: httpx.BaseTransport) -> None:
+        self._transport = transport
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        return self._transport.handle_request(request)
+
+    def close(self) -> None:
+        # The owner of the shared transport is responsible for closing it.
+        pass
+
+
+# ------------------------------------------------------------------------------
+# Retry Policy and Circuit Breaker
+# ------------------------------------------------------------------------------
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+
+class RetryPolicy(BaseModel):
+    """
+    Exponential backoff with full jitter for transient failures.
+
+    Only idempotent requests (GET/HEAD/OPTIONS/PUT/DELETE) are retried after a
+    response or a mid-request failure. Other methods, including POST requests
+    that carry an idempotency key, are retried only on connection failures, where
+    the request never reached the server.
+    """
+
+    max_retries: int = Field(3, description="Maximum number of retries per request.")
+    backoff_factor: float = Field(
+        0.5, description="Base delay in seconds; doubled on every attempt."
+    )
+    max_backoff: float = Field(30.0, description="Upper bound for a single delay.")
+    retry_statuses: FrozenSet[int] = Field(
+        frozenset({429, 502, 503, 504}),
+        description="HTTP status codes considered transient.",
+    )
+    respect_retry_after: bool = Field(
+        True, description="Wait for the server's Retry-After header when present."
+    )
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        Compute the delay before the given retry attempt (0-based).
+        """
+        if retry_after is not None and self.respect_retry_after:
+            return min(retry_after, self.max_backoff)
+        ceiling = min(self.max_backoff, self.backoff_factor * (2**attempt))
+        return random.uniform(0, ceiling)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a Retry-After header given either as delta-seconds or an HTTP date.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class CircuitBreakerOpenError(httpx.HTTPError):
+    """
+    Raised when a request is rejected locally because the host's circuit is open.
+    """
+
+
+class CircuitBreaker:
+    """
+    Per-host circuit breaker.
+
+    After `failure_threshold` consecutive failures (transport errors or 5xx
+    responses) the circuit opens and requests fail fast for `recovery_timeout`
+    seconds. A single trial request is then let through (half-open); its outcome
+    closes or re-opens the circuit.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        """
+        Return whether a request may be sent right now.
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.recovery_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def release_trial(self) -> None:
+        """
+        Give back a half-open trial whose outcome says nothing about the host,
+        such as a request interrupted by a local error.
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("Circuit breaker closed after successful trial request.")
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(
+                        f"Circuit breaker opened after {self.failures} consecutive failures."
+                    )
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+_circuit_breakers: Dict[str, CircuitBreaker] = {}
+_circuit_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(host: str, **kwargs: Any) -> CircuitBreaker:
+    """
+    Return the process-wide circuit breaker for `host`, creating it on first use.
+    """
+    with _circuit_breakers_lock:
+        breaker = _circuit_breakers.get(host)
+        if breaker is None:
+            breaker = CircuitBreaker(**kwargs)
+            _circuit_breakers[host] = breaker
+        return breaker
+
+
 # ------------------------------------------------------------------------------
 # SwarmCloudAPI Client Implementation
 # ------------------------------------------------------------------------------
@@ -120,14 +572,36 @@ class SwarmCloudAPI:
     Attributes:
         base_url (str): The base URL of the API.
         api_key (str): The API key used for authentication.
-        timeout (float): Request timeout in seconds.
+        timeout (httpx.Timeout): Default request timeouts.
+        execute_timeout (Optional[float]): Default read timeout for agent executions.
+        retry_policy (RetryPolicy): Backoff policy for transient failures.
+        circuit_breaker (Optional[CircuitBreaker]): Breaker guarding the API host.
+        cache (Optional[ResponseCache]): Cache for agent metadata lookups, if enabled.
+        request_compression (Optional[str]): Content-Encoding used for large request bodies.
+        compression_threshold (int): Minimum JSON body size (bytes) that gets compressed.
     """
 
     def __init__(
         self,
         base_url: str = "https://swarmcloud-285321057562.us-central1.run.app",
         api_key: str = os.getenv("SWARMS_API_KEY"),
-        timeout: float = 10.0,
+        timeout: Union[float, httpx.Timeout] = 10.0,
+        connect_timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
+        write_timeout: Optional[float] = None,
+        pool_timeout: Optional[float] = None,
+        execute_timeout: Optional[float] = None,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        http2: bool = False,
+        transport: Optional[httpx.BaseTransport] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        use_circuit_breaker: bool = True,
+        cache: Optional[ResponseCache] = None,
+        request_compression: Optional[str] = None,
+        compression_threshold: int = 64 * 1024,
     ) -> None:
         """
         Initialize the client.
@@ -135,19 +609,95 @@ class SwarmCloudAPI:
         Args:
             base_url (str): The API's base URL (e.g., "http://localhost:8080").
             api_key (str): The API key to be included in request headers.
-            timeout (float, optional): Timeout for HTTP requests. Defaults to 10.0 seconds.
+            timeout (Union[float, httpx.Timeout], optional): Default timeout for HTTP requests.
+                Defaults to 10.0 seconds.
+            connect_timeout (Optional[float]): Overrides the connect timeout.
+            read_timeout (Optional[float]): Overrides the read timeout.
+            write_timeout (Optional[float]): Overrides the write timeout.
+            pool_timeout (Optional[float]): Overrides the time to wait for a pooled connection.
+            execute_timeout (Optional[float]): Read timeout used by execute calls, which
+                typically run much longer than metadata calls. Defaults to the read timeout.
+            max_connections (int): Maximum number of concurrent connections in the pool.
+            max_keepalive_connections (int): Maximum number of idle keep-alive connections.
+            keepalive_expiry (float): Seconds an idle keep-alive connection is kept open.
+            http2 (bool): Enable HTTP/2 (requires the optional 'h2' package).
+            transport (Optional[httpx.BaseTransport]): A transport shared with other clients,
+                e.g. one built with `create_transport`. When given, the pool settings above are
+                ignored and closing this client leaves the transport open.
+            retry_policy (Optional[RetryPolicy]): Retry/backoff policy. Defaults to `RetryPolicy()`;
+                pass `RetryPolicy(max_retries=0)` to disable retries.
+            circuit_breaker (Optional[CircuitBreaker]): Breaker to use. Defaults to the
+                process-wide breaker for the API host, shared by all clients of that host.
+            use_circuit_breaker (bool): Set to False to disable the circuit breaker.
+            cache (Optional[ResponseCache]): Enables client-side caching of `get_agent` and
+                `list_agents`. May be shared between clients. Disabled by default.
+            request_compression (Optional[str]): "gzip" or "zstd" to compress JSON request
+                bodies of at least `compression_threshold` bytes. Disabled (None) by default;
+                only enable it against servers that accept compressed request bodies.
+                Responses are decompressed transparently by httpx.
+            compression_threshold (int): Minimum body size in bytes before compressing.
+                Defaults to 64 KiB.
         """
         try:
             self.base_url = base_url.rstrip("/")
             self.api_key = api_key
-            self.timeout = timeout
+            base_timeout = (
+                timeout
+                if isinstance(timeout, httpx.Timeout)
+                else httpx.Timeout(timeout)
+            )
+            self.timeout = httpx.Timeout(
+                connect=(
+                    connect_timeout
+                    if connect_timeout is not None
+                    else base_timeout.connect
+                ),
+                read=read_timeout if read_timeout is not None else base_timeout.read,
+                write=(
+                    write_timeout if write_timeout is not None else base_timeout.write
+                ),
+                pool=pool_timeout if pool_timeout is not None else base_timeout.pool,
+            )
+            self.execute_timeout = execute_timeout
             self.headers = {
                 "x-api-key": self.api_key,
                 "Content-Type": "application/json",
             }
+            if transport is not None:
+                client_transport = _SharedTransport(transport)
+            else:
+                client_transport = create_transport(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_keepalive_connections,
+                    keepalive_expiry=keepalive_expiry,
+                    http2=http2,
+                )
             self.client = httpx.Client(
-                base_url=self.base_url, headers=self.headers, timeout=self.timeout
+                base_url=self.base_url,
+                headers=self.headers,
+                timeout=self.timeout,
+                transport=client_transport,
             )
+            self.retry_policy = retry_policy or RetryPolicy()
+            if not use_circuit_breaker:
+                self.circuit_breaker = None
+            else:
+                self.circuit_breaker = circuit_breaker or get_circuit_breaker(
+                    httpx.URL(self.base_url).host
+                )
+            self.cache = cache
+            if request_compression not in (None, "gzip", "zstd"):
+                raise ValueError(
+                    f"Unsupported request compression: {request_compression}"
+                )
+            if request_compression == "zstd" and zstandard is None:
+                logger.warning(
+                    "zstd request compression requested but the 'zstandard' package is "
+                    "not installed; falling back to gzip."
+                )
+                request_compression = "gzip"
+            self.request_compression = request_compression
+            self.compression_threshold = compression_threshold
             logger.info(
                 f"SwarmCloudAPI client initialized with base URL: {self.base_url}"
             )
@@ -166,12 +716,154 @@ class SwarmCloudAPI:
             logger.error(f"Error closing SwarmCloudAPI client: {str(e)}")
             raise
 
-    def list_agents(self) -> List[AgentOut]:
+    def _request(
+        self,
+        method: str,
+        endpoint: str,
+        idempotency_key: Optional[str] = None,
+        stream: bool = False,
+        **kwargs: Any,
+    ) -> httpx.Response:
+        """
+        Send a request through the circuit breaker, retrying transient failures
+        according to the client's retry policy.
+
+        The final response is returned as-is; callers are expected to call
+        `raise_for_status()` on it. With `stream=True` the body is not read and the
+        caller must close the response.
+
+        Raises:
+            CircuitBreakerOpenError: If the host's circuit is open.
+            httpx.TransportError: If the request could not be completed.
+        """
+        method = method.upper()
+        if idempotency_key:
+            headers = dict(kwargs.pop("headers", None) or {})
+            headers["Idempotency-Key"] = idempotency_key
+            kwargs["headers"] = headers
+        if self.request_compression and kwargs.get("json") is not None:
+            body = json_dumps(kwargs.pop("json"))
+            if len(body) >= self.compression_threshold:
+                original_size = len(body)
+                body = compress_request_body(body, self.request_compression)
+                headers = dict(kwargs.pop("headers", None) or {})
+                headers["Content-Encoding"] = self.request_compression
+                kwargs["headers"] = headers
+                logger.debug(
+                    f"Compressed {method} {endpoint} body from {original_size} "
+                    f"to {len(body)} bytes ({self.request_compression})"
+                )
+            kwargs["content"] = body
+        retryable = method in IDEMPOTENT_METHODS
+        policy = self.retry_policy
+        breaker = self.circuit_breaker
+
+        attempt = 0
+        while True:
+            if breaker is not None and not breaker.allow_request():
+                raise CircuitBreakerOpenError(
+                    f"Circuit breaker open for {self.base_url}; failing fast."
+                )
+            error: Optional[httpx.TransportError] = None
+            healthy: Optional[bool] = None
+            try:
+                response = self.client.send(
+                    self.client.build_request(method, endpoint, **kwargs),
+                    stream=stream,
+                )
+                healthy = response.status_code < 500
+            except httpx.TransportError as e:
+                error = e
+                healthy = False
+            finally:
+                if breaker is not None:
+                    if healthy is None:
+                        # Any other error (decoding, KeyboardInterrupt) says nothing
+                        # about the host; never leave a half-open trial claimed.
+                        breaker.release_trial()
+                    elif healthy:
+                        breaker.record_success()
+                    else:
+                        breaker.record_failure()
+            if error is not None:
+                # Connection failures never reached the server and are safe to retry.
+                safe = retryable or isinstance(
+                    error, (httpx.ConnectError, httpx.ConnectTimeout)
+                )
+                if not safe or attempt >= policy.max_retries:
+                    raise error
+                delay = policy.backoff(attempt)
+                logger.warning(
+                    f"{method} {endpoint} failed ({type(error).__name__}); "
+                    f"retrying in {delay:.2f}s (attempt {attempt + 1}/{policy.max_retries})"
+                )
+            else:
+                if (
+                    not retryable
+                    or response.status_code not in policy.retry_statuses
+                    or attempt >= policy.max_retries
+                ):
+                    return response
+                delay = policy.backoff(
+                    attempt, parse_retry_after(response.headers.get("Retry-After"))
+                )
+                logger.warning(
+                    f"{method} {endpoint} returned {response.status_code}; "
+                    f"retrying in {delay:.2f}s (attempt {attempt + 1}/{policy.max_retries})"
+                )
+                response.close()
+            time.sleep(delay)
+            attempt += 1
+
+    def _cache_key(self, *parts: str) -> tuple:
+        return (self.base_url, self.api_key, *parts)
+
+    def _invalidate_cache(self, *keys: tuple) -> None:
+        if self.cache is not None:
+            for key in keys:
+                self.cache.invalidate(key)
+
+    def _cached_get(self, key: tuple, endpoint: str) -> bytes:
+        """
+        GET `endpoint` through the response cache and return the response body.
+
+        Fresh entries are served without a network round trip. Stale entries with an
+        ETag are revalidated with `If-None-Match`.
+
+        Raises:
+            httpx.HTTPError: If the HTTP request fails.
+        """
+        if self.cache is None:
+            response = self._request("GET", endpoint)
+            response.raise_for_status()
+            return response.content
+
+        entry = self.cache.get(key)
+        if entry is not None and entry.fresh:
+            logger.debug(f"Cache hit for {endpoint}")
+            return entry.content
+
+        headers = {"If-None-Match": entry.etag} if entry is not None else None
+        response = self._request("GET", endpoint, headers=headers)
+        if response.status_code == 304 and entry is not None:
+            logger.debug(f"Cache entry for {endpoint} revalidated")
+            self.cache.refresh(key)
+            return entry.content
+        response.raise_for_status()
+        self.cache.set(key, response.content, etag=response.headers.get("ETag"))
+        return response.content
+
+    def list_agents(
+        self, raw: bool = False
+    ) -> Union[List[AgentOut], List[Dict[str, Any]]]:
         """
         Retrieve all agents.
 
+        Args:
+            raw (bool, optional): Return plain dicts instead of `AgentOut` models. Defaults to False.
+
         Returns:
-            List[AgentOut]: A list of agents.
+            List[AgentOut]: A list of agents (or dicts when `raw` is set).
 
         Raises:
             httpx.HTTPError: If the HTTP request fails.
@@ -179,10 +871,8 @@ class SwarmCloudAPI:
         try:
             endpoint = "/agents"
             logger.debug(f"Requesting list of agents from {endpoint}")
-            response = self.client.get(endpoint)
-            response.raise_for_status()
-            agents_data = response.json()
-            agents = [AgentOut.parse_obj(agent) for agent in agents_data]
+            content = self._cached_get(self._cache_key("agents"), endpoint)
+            agents = decode_response(content, List[AgentOut], raw=raw)
             logger.info(f"Retrieved {len(agents)} agents.")
             return agents
         except httpx.HTTPError as e:
@@ -192,12 +882,16 @@ class SwarmCloudAPI:
             logger.error(f"Unexpected error while listing agents: {str(e)}")
             raise
 
-    def create_agent(self, agent: AgentCreate) -> AgentOut:
+    def create_agent(
+        self, agent: AgentCreate, idempotency_key: Optional[str] = None
+    ) -> AgentOut:
         """
         Create a new agent.
 
         Args:
             agent (AgentCreate): The agent data to create.
+            idempotency_key (Optional[str], optional): Sent as the Idempotency-Key header
+                for servers that deduplicate requests; it does not make the call retryable.
 
         Returns:
             AgentOut: The created agent's data.
@@ -208,9 +902,12 @@ class SwarmCloudAPI:
         try:
             endpoint = "/agents"
             logger.debug(f"Creating new agent with name: {agent.name}")
-            response = self.client.post(endpoint, json=agent.dict())
+            response = self._request(
+                "POST", endpoint, idempotency_key=idempotency_key, json=agent.dict()
+            )
             response.raise_for_status()
-            agent_out = AgentOut.parse_obj(response.json())
+            agent_out = decode_response(response, AgentOut)
+            self._invalidate_cache(self._cache_key("agents"))
             logger.info(f"Agent created with id: {agent_out.id}")
             return agent_out
         except httpx.HTTPError as e:
@@ -220,15 +917,18 @@ class SwarmCloudAPI:
             logger.error(f"Unexpected error while creating agent: {str(e)}")
             raise
 
-    def get_agent(self, agent_id: str) -> AgentOut:
+    def get_agent(
+        self, agent_id: str, raw: bool = False
+    ) -> Union[AgentOut, Dict[str, Any]]:
         """
         Retrieve details of a specific agent.
 
         Args:
             agent_id (str): The unique identifier of the agent.
+            raw (bool, optional): Return a plain dict instead of an `AgentOut`. Defaults to False.
 
         Returns:
-            AgentOut: The agent data.
+            AgentOut: The agent data (or a dict when `raw` is set).
 
         Raises:
             httpx.HTTPError: If the HTTP request fails.
@@ -236,10 +936,12 @@ class SwarmCloudAPI:
         try:
             endpoint = f"/agents/{agent_id}"
             logger.debug(f"Retrieving agent with id: {agent_id}")
-            response = self.client.get(endpoint)
-            response.raise_for_status()
-            agent_out = AgentOut.parse_obj(response.json())
-            logger.info(f"Retrieved agent: {agent_out.name} (id: {agent_out.id})")
+            content = self._cached_get(self._cache_key("agent", agent_id), endpoint)
+            agent_out = decode_response(content, AgentOut, raw=raw)
+            if raw:
+                logger.info(f"Retrieved agent (raw) with id: {agent_id}")
+            else:
+                logger.info(f"Retrieved agent: {agent_out.name} (id: {agent_out.id})")
             return agent_out
         except httpx.HTTPError as e:
             logger.error(f"HTTP error while getting agent {agent_id}: {str(e)}")
@@ -267,9 +969,14 @@ class SwarmCloudAPI:
             logger.debug(
                 f"Updating agent with id: {agent_id} with data: {update.dict(exclude_unset=True)}"
             )
-            response = self.client.put(endpoint, json=update.dict(exclude_unset=True))
+            response = self._request(
+                "PUT", endpoint, json=update.dict(exclude_unset=True)
+            )
+            self._invalidate_cache(
+                self._cache_key("agent", agent_id), self._cache_key("agents")
+            )
             response.raise_for_status()
-            agent_out = AgentOut.parse_obj(response.json())
+            agent_out = decode_response(response, AgentOut)
             logger.info(f"Updated agent: {agent_out.name} (id: {agent_out.id})")
             return agent_out
         except httpx.HTTPError as e:
@@ -279,8 +986,31 @@ class SwarmCloudAPI:
             logger.error(f"Unexpected error while updating agent {agent_id}: {str(e)}")
             raise
 
+    def _execution_timeout(
+        self, timeout: Optional[Union[float, httpx.Timeout]]
+    ) -> httpx.Timeout:
+        """
+        Resolve the timeout for an execute call from a per-call override or the
+        client's `execute_timeout`.
+        """
+        if isinstance(timeout, httpx.Timeout):
+            return timeout
+        read = timeout if timeout is not None else self.execute_timeout
+        if read is None:
+            return self.timeout
+        return httpx.Timeout(
+            connect=self.timeout.connect,
+            read=read,
+            write=self.timeout.write,
+            pool=self.timeout.pool,
+        )
+
     def execute_agent(
-        self, agent_id: str, payload: Optional[Dict[str, Any]] = None
+        self,
+        agent_id: str,
+        payload: Optional[Dict[str, Any]] = None,
+        timeout: Optional[Union[float, httpx.Timeout]] = None,
+        idempotency_key: Optional[str] = None,
     ) -> Dict[str, Any]:
         """
         Execute an agent manually.
@@ -288,6 +1018,10 @@ class SwarmCloudAPI:
         Args:
             agent_id (str): The unique identifier of the agent.
             payload (Optional[Dict[str, Any]], optional): The execution payload. Defaults to None.
+            timeout (Optional[Union[float, httpx.Timeout]], optional): Per-call timeout override.
+                A float sets the read timeout only. Defaults to the client's `execute_timeout`.
+            idempotency_key (Optional[str], optional): Sent as the Idempotency-Key header
+                for servers that deduplicate requests; it does not make the call retryable.
 
         Returns:
             Dict[str, Any]: The response from the execution endpoint.
@@ -301,9 +1035,15 @@ class SwarmCloudAPI:
             logger.debug(
                 f"Executing agent with id: {agent_id} with payload: {payload_obj.payload}"
             )
-            response = self.client.post(endpoint, json=payload_obj.dict())
+            response = self._request(
+                "POST",
+                endpoint,
+                idempotency_key=idempotency_key,
+                json=payload_obj.dict(),
+                timeout=self._execution_timeout(timeout),
+            )
             response.raise_for_status()
-            result = response.json()
+            result = decode_response(response)
             logger.info(f"Executed agent {agent_id}. Response: {result}")
             return result
         except httpx.HTTPError as e:
@@ -313,15 +1053,19 @@ class SwarmCloudAPI:
             logger.error(f"Unexpected error while executing agent {agent_id}: {str(e)}")
             raise
 
-    def get_agent_history(self, agent_id: str) -> AgentExecutionHistory:
+    def get_agent_history(
+        self, agent_id: str, raw: bool = False
+    ) -> Union[AgentExecutionHistory, Dict[str, Any]]:
         """
         Fetch the execution history (logs) for an agent.
 
         Args:
             agent_id (str): The unique identifier of the agent.
+            raw (bool, optional): Return a plain dict instead of an `AgentExecutionHistory`.
+                Defaults to False.
 
         Returns:
-            AgentExecutionHistory: The agent's execution logs.
+            AgentExecutionHistory: The agent's execution logs (or a dict when `raw` is set).
 
         Raises:
             httpx.HTTPError: If the HTTP request fails.
@@ -329,9 +1073,9 @@ class SwarmCloudAPI:
         try:
             endpoint = f"/agents/{agent_id}/history"
             logger.debug(f"Fetching execution history for agent id: {agent_id}")
-            response = self.client.get(endpoint)
+            response = self._request("GET", endpoint)
             response.raise_for_status()
-            history = AgentExecutionHistory.parse_obj(response.json())
+            history = decode_response(response, AgentExecutionHistory, raw=raw)
             logger.info(f"Retrieved execution history for agent id: {agent_id}")
             return history
         except httpx.HTTPError as e:
@@ -346,7 +1090,11 @@ class SwarmCloudAPI:
             raise
 
     def batch_execute_agents(
-        self, agents: List[AgentOut], payload: Optional[Dict[str, Any]] = None
+        self,
+        agents: List[AgentOut],
+        payload: Optional[Dict[str, Any]] = None,
+        timeout: Optional[Union[float, httpx.Timeout]] = None,
+        idempotency_key: Optional[str] = None,
     ) -> List[Any]:
         """
         Batch execute multiple agents.
@@ -355,6 +1103,10 @@ class SwarmCloudAPI:
             agents (List[AgentOut]): The list of agents to execute.
             payload (Optional[Dict[str, Any]], optional): The execution payload to use for all agents.
                 Defaults to None.
+            timeout (Optional[Union[float, httpx.Timeout]], optional): Per-call timeout override.
+                Defaults to the client's `execute_timeout`.
+            idempotency_key (Optional[str], optional): Sent as the Idempotency-Key header
+                for servers that deduplicate requests; it does not make the call retryable.
 
         Returns:
             List[Any]: A list containing the response for each agent execution.
@@ -369,11 +1121,15 @@ class SwarmCloudAPI:
             logger.debug(
                 f"Batch executing {len(agents)} agents with payload: {payload_obj.payload}"
             )
-            response = self.client.post(
-                endpoint, json={"agents": agents_list, **payload_obj.dict()}
+            response = self._request(
+                "POST",
+                endpoint,
+                idempotency_key=idempotency_key,
+                json={"agents": agents_list, **payload_obj.dict()},
+                timeout=self._execution_timeout(timeout),
             )
             response.raise_for_status()
-            results = response.json()
+            results = decode_response(response)
             logger.info(f"Batch executed {len(agents)} agents.")
             return results
         except httpx.HTTPError as e:
@@ -383,6 +1139,154 @@ class SwarmCloudAPI:
             logger.error(f"Unexpected error during batch execution: {str(e)}")
             raise
 
+    def run_workflow(
+        self,
+        nodes: List[Union[WorkflowNode, Dict[str, Any]]],
+        edges: Optional[List[Union[WorkflowEdge, Dict[str, Any]]]] = None,
+        payload: Optional[Dict[str, Any]] = None,
+        fail_fast: bool = True,
+        timeout: Optional[Union[float, httpx.Timeout]] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Run a DAG of agents on the server and iterate over per-node results as they
+        finish.
+
+        Each edge passes its source node's return value to the target node's payload
+        under `input_key` (default: the source node id). Nodes whose inputs are ready
+        run concurrently. The request is sent when iteration starts.
+
+        Args:
+            nodes (List[Union[WorkflowNode, Dict[str, Any]]]): The workflow nodes.
+            edges (Optional[List[Union[WorkflowEdge, Dict[str, Any]]]], optional): Data
+                dependencies between nodes. Defaults to none (all nodes concurrent).
+            payload (Optional[Dict[str, Any]], optional): Base payload for every node.
+            fail_fast (bool, optional): Stop starting nodes after the first failure.
+            timeout (Optional[Union[float, httpx.Timeout]], optional): Per-call timeout override.
+                Defaults to the client's `execute_timeout`.
+
+        Yields:
+            Dict[str, Any]: One event per node (`node`, `status`, `result` or `error`),
+                then a summary event with the `workflow` outcome.
+
+        Raises:
+            httpx.HTTPError: If the HTTP request fails.
+        """
+
+        def as_dict(item: Union[BaseModel, Dict[str, Any]]) -> Dict[str, Any]:
+            return item.dict() if isinstance(item, BaseModel) else item
+
+        try:
+            endpoint = "/workflows/run"
+            body = {
+                "nodes": [as_dict(node) for node in nodes],
+                "edges": [as_dict(edge) for edge in edges or []],
+                "payload": payload or {},
+                "fail_fast": fail_fast,
+            }
+            logger.debug(f"Running workflow with {len(body['nodes'])} nodes.")
+            response = self._request(
+                "POST",
+                endpoint,
+                json=body,
+                timeout=self._execution_timeout(timeout),
+                stream=True,
+            )
+            try:
+                if response.is_error:
+                    response.read()
+                    response.raise_for_status()
+                for line in response.iter_lines():
+                    if line:
+                        yield json_loads(line)
+            finally:
+                response.close()
+            logger.info("Workflow finished.")
+        except httpx.HTTPError as e:
+            logger.error(f"HTTP error while running workflow: {str(e)}")
+            raise
+        except Exception as e:
+            logger.error(f"Unexpected error while running workflow: {str(e)}")
+            raise
+
+    def bulk_create_swarms(
+        self,
+        swarms: List[Union[SwarmCreate, Dict[str, Any]]],
+        idempotency_key: Optional[str] = None,
+    ) -> BulkOperationResult:
+        """
+        Create many swarms in one request.
+
+        Items that fail (e.g. validation errors) are reported per item instead of
+        failing the whole call; check `result.failed` or each item's `ok`.
+
+        Args:
+            swarms (List[Union[SwarmCreate, Dict[str, Any]]]): The swarms to create.
+            idempotency_key (Optional[str], optional): Sent as the Idempotency-Key header
+                for servers that deduplicate requests; it does not make the call retryable.
+
+        Returns:
+            BulkOperationResult: Per-item status, in request order.
+
+        Raises:
+            httpx.HTTPError: If the HTTP request fails.
+        """
+        try:
+            endpoint = "/swarms/bulk"
+            items = [
+                swarm.dict(exclude_none=True) if isinstance(swarm, BaseModel) else swarm
+                for swarm in swarms
+            ]
+            logger.debug(f"Bulk creating {len(items)} swarms.")
+            response = self._request(
+                "POST",
+                endpoint,
+                idempotency_key=idempotency_key,
+                json={"swarms": items},
+            )
+            response.raise_for_status()
+            result = decode_response(response, BulkOperationResult)
+            logger.info(
+                f"Bulk created swarms: {result.succeeded} succeeded, {result.failed} failed."
+            )
+            return result
+        except httpx.HTTPError as e:
+            logger.error(f"HTTP error during bulk swarm creation: {str(e)}")
+            raise
+        except Exception as e:
+            logger.error(f"Unexpected error during bulk swarm creation: {str(e)}")
+            raise
+
+    def bulk_delete_swarms(self, swarm_ids: List[str]) -> BulkOperationResult:
+        """
+        Delete many swarms in one request.
+
+        Args:
+            swarm_ids (List[str]): The ids of the swarms to delete.
+
+        Returns:
+            BulkOperationResult: Per-item status, in request order. Unknown ids are
+                reported with status 404.
+
+        Raises:
+            httpx.HTTPError: If the HTTP request fails.
+        """
+        try:
+            endpoint = "/swarms/bulk"
+            logger.debug(f"Bulk deleting {len(swarm_ids)} swarms.")
+            response = self._request("DELETE", endpoint, json={"ids": swarm_ids})
+            response.raise_for_status()
+            result = decode_response(response, BulkOperationResult)
+            logger.info(
+                f"Bulk deleted swarms: {result.succeeded} succeeded, {result.failed} failed."
+            )
+            return result
+        except httpx.HTTPError as e:
+            logger.error(f"HTTP error during bulk swarm deletion: {str(e)}")
+            raise
+        except Exception as e:
+            logger.error(f"Unexpected error during bulk swarm deletion: {str(e)}")
+            raise
+
     def health(self) -> Dict[str, Any]:
         """
         Check the health of the API.
@@ -396,9 +1300,9 @@ class SwarmCloudAPI:
         try:
             endpoint = "/health"
             logger.debug("Checking API health.")
-            response = self.client.get(endpoint)
+            response = self._request("GET", endpoint)
             response.raise_for_status()
-            status_info = response.json()
+            status_info = decode_response(response)
             logger.info(f"API health: {status_info}")
             return status_info
         except httpx.HTTPError as e:
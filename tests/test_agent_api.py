@@ -0,0 +1,866 @@
+"""
+Tests for the agent API in api/api.py.
+
+The module is loaded in-process. When Supabase or the OpenTelemetry SDK, exporter
+and instrumentation packages are not installed they are replaced by the minimal
+stand-ins below; nothing here talks to a database or a collector.
+"""
+
+import asyncio
+import gzip
+import importlib.util
+import json
+import os
+import pickle
+import shutil
+import socket
+import sys
+import threading
+import time
+import types
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("psutil")
+pytest.importorskip("opentelemetry.trace")
+
+from opentelemetry import trace  # noqa: E402
+
+API_DIR = os.path.join(os.path.dirname(__file__), "..", "api")
+
+
+class FakeTracerProvider(trace.NoOpTracerProvider):
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def add_span_processor(self, processor):
+        pass
+
+
+class FakeComponent:
+    def __init__(self, *args, **kwargs):
+        pass
+
+
+def unavailable_supabase_client(url, key):
+    raise RuntimeError("Supabase is not available in tests")
+
+
+STAND_INS = {
+    "supabase": {"create_client": unavailable_supabase_client},
+    "opentelemetry.exporter.otlp.proto.grpc.trace_exporter": {
+        "OTLPSpanExporter": FakeComponent
+    },
+    "opentelemetry.instrumentation.fastapi": {
+        "FastAPIInstrumentor": types.SimpleNamespace(instrument_app=lambda app: None)
+    },
+    "opentelemetry.sdk.resources": {
+        "SERVICE_NAME": "service.name",
+        "Resource": FakeComponent,
+    },
+    "opentelemetry.sdk.trace": {"TracerProvider": FakeTracerProvider},
+    "opentelemetry.sdk.trace.export": {"BatchSpanProcessor": FakeComponent},
+}
+
+
+def is_installed(name):
+    try:
+        return importlib.util.find_spec(name) is not None
+    except ModuleNotFoundError:
+        return False
+
+
+def load_agent_api():
+    for name, attrs in STAND_INS.items():
+        if not is_installed(name):
+            module = types.ModuleType(name)
+            module.__dict__.update(attrs)
+            sys.modules.setdefault(name, module)
+    if API_DIR not in sys.path:
+        sys.path.insert(0, API_DIR)
+    spec = importlib.util.spec_from_file_location(
+        "agent_api", os.path.join(API_DIR, "api.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+agent_api = load_agent_api()
+agent_runtime = agent_api.agent_runtime
+
+
+def make_agent(agent_id, code, **fields):
+    agent = agent_api.AgentOut(
+        id=agent_id, name=agent_id, code=code, created_at=datetime.utcnow(), **fields
+    )
+    agent_api.agents_db[agent_id] = agent
+    return agent
+
+
+def epoch(*args):
+    return (datetime(*args) - datetime(1970, 1, 1)).total_seconds()
+
+
+# Cron schedules
+
+
+def test_parse_cron_field_handles_lists_ranges_and_steps():
+    assert agent_api.parse_cron_field("*/15", 0, 59) == {0, 15, 30, 45}
+    assert agent_api.parse_cron_field("1,5-7", 0, 59) == {1, 5, 6, 7}
+    assert agent_api.parse_cron_field("10-20/5", 0, 59) == {10, 15, 20}
+    assert agent_api.parse_cron_field("7", 0, 6) == {0}  # Sunday
+    assert agent_api.parse_cron_field("5-7", 0, 6) == {0, 5, 6}
+    assert agent_api.parse_cron_field("4-7/2", 0, 6) == {4, 6}
+    for bad in ("60", "*/0", "5-1", "x"):
+        with pytest.raises(ValueError):
+            agent_api.parse_cron_field(bad, 0, 59)
+
+
+def test_cron_spec_next_after():
+    weekdays = agent_api.CronSpec("*/15 9-17 * * 1-5")
+    saturday_noon = epoch(2026, 10, 17, 12, 0)
+    assert weekdays.next_after(saturday_noon) == epoch(2026, 10, 19, 9, 0)
+    assert weekdays.next_after(epoch(2026, 10, 19, 9, 0)) == epoch(2026, 10, 19, 9, 15)
+
+    leap_day = agent_api.CronSpec("0 0 29 2 *")
+    assert leap_day.next_after(saturday_noon) == epoch(2028, 2, 29, 0, 0)
+
+    # With both day fields restricted, either one matching fires.
+    either = agent_api.CronSpec("0 0 1 * 1")
+    assert either.next_after(saturday_noon) == epoch(2026, 10, 19, 0, 0)
+
+    for bad in ("* * *", "61 * * * *", "0 0 31 2 *"):
+        with pytest.raises(ValueError):
+            agent_api.CronSpec(bad).next_after(saturday_noon)
+
+
+def test_schedules_that_never_fire_are_rejected_before_storing(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    monkeypatch.setattr(agent_api, "check_api_key", lambda api_key: True)
+    make_agent("never", "def main(request, store):\n    return 1\n")
+    stored = dict(agent_api.schedules_db)
+    client = TestClient(agent_api.app)
+    for cron in ("0 0 30 2 *", "0 0 * *"):
+        response = client.post(
+            "/agents/never/schedules", json={"cron": cron}, headers={"x-api-key": "k"}
+        )
+        assert response.status_code == 422
+    assert agent_api.schedules_db == stored
+
+    response = client.post(
+        "/agents/never/schedules",
+        json={"cron": "0 0 29 2 *"},
+        headers={"x-api-key": "k"},
+    )
+    assert response.status_code == 201
+    assert response.json()["next_run_at"] is not None
+    agent_api.scheduler.remove(agent_api.schedules_db.pop(response.json()["id"]).id)
+
+
+def test_every_worker_fires_the_schedules_it_holds():
+    make_agent("sched", "def main(request, store):\n    return request.scheduled\n")
+
+    async def run():
+        workers = [agent_api.AgentScheduler(), agent_api.AgentScheduler()]
+        schedules = []
+        for i, worker in enumerate(workers):
+            worker.start()
+            schedule = agent_api.ScheduleOut(
+                id=f"s{i}",
+                agent_id="sched",
+                created_at=datetime.utcnow(),
+                interval_seconds=1,
+            )
+            agent_api.schedules_db[schedule.id] = schedule
+            worker.add(schedule)
+            schedules.append(schedule)
+        await asyncio.sleep(1.5)
+        for worker in workers:
+            await worker.stop()
+        return schedules
+
+    schedules = asyncio.run(run())
+    assert [schedule.run_count >= 1 for schedule in schedules] == [True, True]
+    assert "result: True" in agent_api.executions_db["sched"][-1].log
+
+
+def test_missed_runs_follow_the_schedule_policy():
+    scheduler = agent_api.AgentScheduler()
+    now = time.time()
+    schedule = agent_api.ScheduleOut(
+        id="missed",
+        agent_id="sched",
+        created_at=datetime.utcfromtimestamp(now - 3600),
+        interval_seconds=60,
+    )
+    for policy, runs in (("skip", 0), ("run_once", 1), ("catch_up", 10)):
+        schedule.missed_run_policy = policy
+        assert scheduler._missed_runs(schedule, now - 600, now) == runs
+
+
+# Compression middleware
+
+
+def run_asgi(app, headers, body=b"", path="/", sent=None):
+    """Drive an ASGI app with one request and return the messages it sends."""
+    sent = [] if sent is None else sent
+    received = [{"type": "http.request", "body": body, "more_body": False}]
+
+    async def receive():
+        return received.pop(0) if received else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "POST", "path": path, "headers": headers}
+    asyncio.run(app(scope, receive, send))
+    return sent
+
+
+def test_streamed_responses_pass_through_chunk_by_chunk():
+    sent = []
+    forwarded = []
+
+    async def streaming_app(scope, receive, send):
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", b"application/x-ndjson")],
+            }
+        )
+        for line in (b'{"node": "a"}\n', b'{"node": "b"}\n' * 200):
+            await send({"type": "http.response.body", "body": line, "more_body": True})
+            # Each chunk has reached the client before the next is produced.
+            forwarded.append(len(sent))
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    middleware = agent_api.CompressionMiddleware(streaming_app)
+    run_asgi(middleware, [(b"accept-encoding", b"gzip")], sent=sent)
+    assert forwarded == [2, 3]
+    start, *bodies = sent
+    assert b"content-encoding" not in dict(start["headers"])
+    assert bodies[0]["body"] == b'{"node": "a"}\n'
+
+
+def test_large_responses_are_compressed_and_small_ones_are_not():
+    async def sized_app(scope, receive, send):
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", b"application/json")],
+            }
+        )
+        size = int(scope["path"].strip("/"))
+        await send({"type": "http.response.body", "body": b"x" * size})
+
+    middleware = agent_api.CompressionMiddleware(sized_app)
+    accept = [(b"accept-encoding", b"br;q=1, gzip")]
+
+    start, body = run_asgi(middleware, accept, path="/4096")
+    assert dict(start["headers"])[b"content-encoding"] == b"gzip"
+    assert gzip.decompress(body["body"]) == b"x" * 4096
+    start, body = run_asgi(middleware, accept, path="/10")
+    assert b"content-encoding" not in dict(start["headers"])
+
+
+def test_compressed_request_bodies_are_decoded():
+    seen = []
+
+    async def echo_app(scope, receive, send):
+        message = await receive()
+        seen.append((dict(scope["headers"]), message["body"]))
+        await send({"type": "http.response.start", "status": 204, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    middleware = agent_api.CompressionMiddleware(echo_app)
+    payload = json.dumps({"payload": list(range(100))}).encode()
+    sent = run_asgi(
+        middleware, [(b"content-encoding", b"gzip")], gzip.compress(payload)
+    )
+    headers, body = seen[0]
+    assert body == payload
+    assert b"content-encoding" not in headers
+    assert sent[0]["status"] == 204
+
+    sent = run_asgi(middleware, [(b"content-encoding", b"br")], b"...")
+    assert sent[0]["status"] == 415
+    sent = run_asgi(middleware, [(b"content-encoding", b"gzip")], b"not gzip")
+    assert sent[0]["status"] == 400
+
+
+def test_workflow_results_stream_as_ndjson(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    monkeypatch.setattr(agent_api, "check_api_key", lambda api_key: True)
+    make_agent(
+        "double", "def main(request, store):\n    return request.payload['x'] * 2\n"
+    )
+    make_agent(
+        "add",
+        "def main(request, store):\n"
+        "    return request.payload['left'] + request.payload['right']\n",
+    )
+    workflow = {
+        "nodes": [
+            {"id": "a", "agent_id": "double"},
+            {"id": "b", "agent_id": "double", "payload": {"x": 5}},
+            {"id": "c", "agent_id": "add"},
+        ],
+        "edges": [
+            {"source": "a", "target": "c", "input_key": "left"},
+            {"source": "b", "target": "c", "input_key": "right"},
+        ],
+        "payload": {"x": 1},
+    }
+    headers = {"x-api-key": "key", "accept-encoding": "gzip"}
+    client = TestClient(agent_api.app)
+    with client.stream("POST", "/workflows/run", json=workflow, headers=headers) as r:
+        assert r.headers["content-type"] == "application/x-ndjson"
+        assert "content-encoding" not in r.headers
+        events = [json.loads(line) for line in r.iter_lines() if line]
+    results = {event["node"]: event for event in events if "node" in event}
+    assert results["c"]["result"] == 12
+    assert list(results)[-1] == "c"
+    assert events[-1]["workflow"] == "completed"
+
+
+# Fair scheduling across tenants
+
+
+def fair_order(submissions, max_workers=1):
+    """
+    Queue `(policy, lane, name)` jobs behind a blocker so they are all waiting
+    before the first is dispatched, and return the order they ran in. Expected
+    costs are fixed at one quantum so each turn's share is exact.
+    """
+
+    async def run():
+        executor = agent_api.FairExecutor(max_workers=max_workers)
+        executor._record_cost = lambda cost_key, seconds: None
+        gate = threading.Event()
+        order = []
+        blocker = asyncio.ensure_future(
+            executor.run(
+                agent_api.TenantPolicy(tenant_id="gate"),
+                agent_api.INTERACTIVE,
+                "job",
+                gate.wait,
+            )
+        )
+        jobs = [
+            asyncio.ensure_future(executor.run(policy, lane, "job", order.append, name))
+            for policy, lane, name in submissions
+        ]
+        await asyncio.sleep(0)
+        gate.set()
+        await asyncio.gather(blocker, *jobs)
+        return order
+
+    return asyncio.run(run())
+
+
+def test_tenants_share_execution_by_weight():
+    light = agent_api.TenantPolicy(tenant_id="light")
+    heavy = agent_api.TenantPolicy(tenant_id="heavy", weight=3)
+    order = fair_order(
+        [(light, agent_api.INTERACTIVE, f"l{i}") for i in range(8)]
+        + [(heavy, agent_api.INTERACTIVE, f"h{i}") for i in range(8)]
+    )
+    # The heavy tenant submitted last but gets three turns for each light one.
+    assert order[:8] == ["l0", "h0", "h1", "h2", "l1", "h3", "h4", "h5"]
+    assert order[-5:] == ["l3", "l4", "l5", "l6", "l7"]
+
+
+def test_batch_lane_is_not_starved_by_interactive_work():
+    tenant = agent_api.TenantPolicy(tenant_id="t")
+    order = fair_order(
+        [(tenant, agent_api.INTERACTIVE, f"i{i}") for i in range(10)]
+        + [(tenant, agent_api.BATCH, "batch")]
+    )
+    assert order.index("batch") < agent_api.BATCH_LANE_EVERY
+
+
+def test_tenant_concurrency_cap_and_errors():
+    capped = agent_api.TenantPolicy(tenant_id="capped", max_concurrency=1)
+    lock = threading.Lock()
+    running = []
+    peak = []
+
+    def job():
+        with lock:
+            running.append(1)
+            peak.append(len(running))
+        time.sleep(0.02)
+        with lock:
+            running.pop()
+
+    def fail():
+        raise KeyError("missing")
+
+    async def run():
+        executor = agent_api.FairExecutor(max_workers=4)
+        await asyncio.gather(
+            *[executor.run(capped, agent_api.INTERACTIVE, "job", job) for _ in range(4)]
+        )
+        with pytest.raises(KeyError):
+            await executor.run(capped, agent_api.INTERACTIVE, "fail", fail)
+
+    asyncio.run(run())
+    assert max(peak) == 1
+
+
+# Request coalescing
+
+
+def test_single_flight_shares_one_execution_per_key():
+    calls = []
+
+    async def work(value):
+        calls.append(value)
+        await asyncio.sleep(0.05)
+        return value * 2
+
+    async def run():
+        flight = agent_api.SingleFlight()
+        results = await asyncio.gather(
+            *[flight.do(("k",), lambda: work(1)) for _ in range(4)],
+            flight.do(("other",), lambda: work(2)),
+        )
+        # A caller that goes away does not cancel the shared execution.
+        first = asyncio.ensure_future(flight.do(("k",), lambda: work(3)))
+        second = asyncio.ensure_future(flight.do(("k",), lambda: work(3)))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return results, await second, flight.stats()
+
+    results, survivor, stats = asyncio.run(run())
+    assert results == [2, 2, 2, 2, 4]
+    assert survivor == 6
+    assert calls == [1, 2, 3]
+    assert (stats["executions"], stats["coalesced"], stats["inflight"]) == (3, 4, 0)
+
+
+def test_coalesced_executions_are_not_shared_across_tenants():
+    agent = make_agent(
+        "coalesced",
+        "import time\n"
+        "def main(request, store):\n"
+        "    time.sleep(0.1)\n"
+        "    return request.payload['n'] * 2\n",
+        coalesce=True,
+    )
+    tenants = [agent_api.TenantPolicy(tenant_id=t) for t in ("a", "a", "b")]
+
+    async def run():
+        before = agent_api.single_flight.executions
+        results = await asyncio.gather(
+            *[agent_api.execute_agent(agent, {"n": 1}, tenant=t) for t in tenants]
+        )
+        return results, agent_api.single_flight.executions - before
+
+    results, executions = asyncio.run(run())
+    assert results == [2, 2, 2]
+    assert executions == 2
+
+
+# Persisted agent bytecode
+
+AGENT_CODE = "def main():\n    return 'compiled'\n"
+
+
+def test_bytecode_is_shared_through_a_private_directory(tmp_path):
+    writer = agent_api.BytecodeCache(str(tmp_path / "bytecode"), max_items=8)
+    writer.store(AGENT_CODE)
+    assert os.stat(writer.directory).st_mode & 0o777 == 0o700
+    assert os.stat(writer.root).st_mode & 0o777 == 0o700
+
+    reader = agent_api.BytecodeCache(str(tmp_path / "bytecode"), max_items=8)
+    assert reader.preload(10) == 1
+    code_obj = reader.get(AGENT_CODE)
+    assert agent_api.load_main(code_obj)() == "compiled"
+    assert (reader.hits, reader.compiles) == (1, 0)
+
+
+def test_bytecode_for_other_source_is_never_run(tmp_path):
+    planted = agent_api.BytecodeCache(str(tmp_path), max_items=8)
+    planted_key = planted.store("def main():\n    return 'planted'\n")
+
+    for preload in (False, True):
+        # A file whose embedded digest does not match the source, under its key.
+        shutil.copy(
+            planted._path(planted_key),
+            planted._path(agent_api.code_version(AGENT_CODE)),
+        )
+        reader = agent_api.BytecodeCache(str(tmp_path), max_items=8)
+        if preload:
+            reader.preload(10)
+        assert agent_api.load_main(reader.get(AGENT_CODE))() == "compiled"
+        assert reader.compiles == 1
+
+
+def test_bytecode_directory_owned_by_someone_else_is_ignored(tmp_path, monkeypatch):
+    agent_api.BytecodeCache(str(tmp_path), max_items=8).store(AGENT_CODE)
+    monkeypatch.setattr(os, "getuid", lambda: os.stat(tmp_path).st_uid + 1)
+
+    cache = agent_api.BytecodeCache(str(tmp_path), max_items=8)
+    assert cache.preload(10) == 0
+    cache.get(AGENT_CODE)
+    assert (cache.loads, cache.compiles) == (0, 1)
+
+
+# Fork-server runtime
+
+
+class Exploit:
+    def __reduce__(self):
+        return (os.system, ("echo exploited",))
+
+
+def test_restricted_messages_carry_plain_values_only(monkeypatch):
+    value = {"rows": [1, 2.5, None, True], "raw": b"\x00", "tags": {"a"}, "z": 1j}
+    for threshold in (0, 1):  # inline, then through a shared segment
+        parent, child = socket.socketpair()
+        with parent, child:
+            monkeypatch.setattr(agent_runtime, "SHM_THRESHOLD_BYTES", threshold)
+            agent_runtime.send_message(child, (True, value))
+            assert agent_runtime.recv_message(parent, restricted=True) == (True, value)
+
+            agent_runtime.send_message(child, (True, Exploit()))
+            with pytest.raises(pickle.UnpicklingError):
+                agent_runtime.recv_message(parent, restricted=True)
+
+
+@pytest.mark.skipif(
+    not agent_api.ForkServerRuntime.available(), reason="needs fork and AF_UNIX"
+)
+def test_fork_server_rejects_results_that_are_not_plain_data():
+    runtime = agent_api.ForkServerRuntime(preload=[], timeout=10)
+    returns_data = "def main():\n    return {'answer': [42]}\n"
+    returns_object = (
+        "import os\n"
+        "class Exploit:\n"
+        "    def __reduce__(self):\n"
+        "        return (os.getpid, ())\n"
+        "def main():\n"
+        "    return Exploit()\n"
+    )
+    try:
+        assert runtime.run({"code": returns_data}, {}) == {"answer": [42]}
+        with pytest.raises(Exception, match="could not be returned"):
+            runtime.run({"code": returns_object}, {})
+    finally:
+        runtime.stop()
+
+
+def send_segment_handle(sock, path):
+    handle = pickle.dumps((path, [(0, 1)]))
+    sock.sendall(agent_runtime.HEADER.pack(agent_runtime.SHARED, len(handle)) + handle)
+
+
+def test_peer_cannot_make_us_map_or_unlink_other_files(tmp_path, monkeypatch):
+    shm_dir = tmp_path / "shm"
+    shm_dir.mkdir()
+    monkeypatch.setattr(agent_runtime, "SHM_DIR", str(shm_dir))
+    victim = tmp_path / "important.txt"
+    victim.write_text("keep me")
+    disguised = shm_dir / (agent_runtime.SEGMENT_PREFIX + "1-link")
+    disguised.symlink_to(victim)
+
+    for path in (
+        str(victim),
+        str(shm_dir / ".." / "important.txt"),
+        str(shm_dir / "not-a-segment"),
+        str(disguised),
+    ):
+        parent, child = socket.socketpair()
+        with parent, child:
+            send_segment_handle(child, path)
+            with pytest.raises((ValueError, OSError)):
+                agent_runtime.recv_message(parent, restricted=True)
+    assert victim.read_text() == "keep me"
+
+
+def test_segments_of_a_dead_child_are_discarded(tmp_path, monkeypatch):
+    monkeypatch.setattr(agent_runtime, "SHM_DIR", str(tmp_path))
+    for name in ("123-a", "123-b", "1234-c"):
+        (tmp_path / (agent_runtime.SEGMENT_PREFIX + name)).write_bytes(b"x")
+    assert agent_runtime.discard_segments_of(123) == 2
+    assert [p.name for p in tmp_path.iterdir()] == [
+        agent_runtime.SEGMENT_PREFIX + "1234-c"
+    ]
+
+
+# Adaptive load shedding
+
+
+def test_limit_backs_off_multiplicatively_and_grows_additively(monkeypatch):
+    monkeypatch.setattr(agent_api, "ADAPTIVE_LIMIT_ADJUST_SECONDS", 0)
+    limiter = agent_api.AdaptiveLimiter()
+    limiter.limit = 10.0
+    congested = agent_api.LOOP_LAG_TARGET_MS / 1000 * 5
+
+    limiter.observe(congested)
+    assert limiter.congested and limiter.limit == pytest.approx(9.0)
+    for _ in range(100):
+        limiter.observe(congested)
+    assert limiter.limit == agent_api.ADAPTIVE_LIMIT_MIN
+
+    # Healthy again: the limit only grows while it is actually binding.
+    limiter.loop_lag = 0.0
+    limiter.observe(0.0)
+    assert not limiter.congested
+    assert limiter.limit == agent_api.ADAPTIVE_LIMIT_MIN
+    while limiter.try_acquire():
+        pass
+    limiter.observe(0.0)
+    assert limiter.limit == agent_api.ADAPTIVE_LIMIT_MIN + 1
+
+
+def test_requests_above_the_limit_are_shed_with_retry_after(monkeypatch):
+    limiter = agent_api.AdaptiveLimiter()
+    limiter.limit = 1.0
+    monkeypatch.setattr(agent_api, "load_limiter", limiter)
+    release = asyncio.Event()
+
+    async def slow_app(scope, receive, send):
+        await release.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    middleware = agent_api.LoadSheddingMiddleware(slow_app)
+
+    async def request(path):
+        sent = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "method": "GET", "path": path, "headers": []}
+        await middleware(scope, receive, send)
+        return sent[0]["status"], dict(sent[0]["headers"])
+
+    async def run():
+        first = asyncio.ensure_future(request("/agents"))
+        await asyncio.sleep(0)
+        shed_status, shed_headers = await request("/agents")
+        probe = asyncio.ensure_future(request("/health/ready"))
+        await asyncio.sleep(0)
+        release.set()
+        return shed_status, shed_headers, (await first)[0], (await probe)[0]
+
+    shed_status, shed_headers, first_status, probe_status = asyncio.run(run())
+    assert shed_status == 503
+    assert int(shed_headers[b"retry-after"]) >= 1
+    assert (first_status, probe_status) == (200, 200)
+    assert (limiter.shed, limiter.in_flight) == (1, 0)
+
+
+# Drain and requeue
+
+
+def test_wait_idle_waits_for_tracked_executions():
+    lifecycle = agent_api.Lifecycle(None)
+
+    async def run():
+        release = asyncio.Event()
+
+        async def execution():
+            with lifecycle.track():
+                await release.wait()
+
+        task = asyncio.ensure_future(execution())
+        await asyncio.sleep(0)
+        idle_while_running = await lifecycle.wait_idle(0.01)
+        release.set()
+        idle_after = await lifecycle.wait_idle(1)
+        await task
+        return idle_while_running, idle_after
+
+    assert asyncio.run(run()) == (False, True)
+    assert lifecycle.in_flight == 0
+
+
+def test_queued_executions_fail_as_not_started_and_are_requeued(monkeypatch):
+    lifecycle = agent_api.Lifecycle(None)
+    monkeypatch.setattr(agent_api, "lifecycle", lifecycle)
+    tenant = agent_api.TenantPolicy(tenant_id="t")
+
+    async def run():
+        executor = agent_api.FairExecutor(max_workers=1)
+        gate = threading.Event()
+        blocker = asyncio.ensure_future(
+            executor.run(tenant, agent_api.INTERACTIVE, "job", gate.wait)
+        )
+        queued = asyncio.ensure_future(
+            executor.run(tenant, agent_api.BATCH, "job", lambda: None)
+        )
+        await asyncio.sleep(0)
+        cancelled = executor.cancel_queued()
+        gate.set()
+        await blocker
+        with pytest.raises(agent_api.ExecutionNotStarted):
+            await queued
+        executor.shutdown()
+        return cancelled
+
+    async def not_started(agent, payload, **kwargs):
+        raise agent_api.ExecutionNotStarted("shutting down")
+
+    assert asyncio.run(run()) == 1
+    monkeypatch.setattr(agent_api, "execute_agent", not_started)
+    job = agent_api.execution_job(
+        make_agent("drained", "def main():\n    return 1\n"), None, tenant
+    )
+    asyncio.run(agent_api.run_job(job))
+    assert lifecycle._requeued == [job]
+
+
+def test_journal_is_written_durably_and_claimed_once(tmp_path, monkeypatch):
+    journal_dir = str(tmp_path / "journal")
+    draining = agent_api.Lifecycle(journal_dir)
+    agent = make_agent("nightly", "def main(request, store):\n    return 1\n")
+    draining.requeue(agent_api.execution_job(agent, {"x": 1}, None))
+    path = draining.write_journal()
+    assert os.path.dirname(path) == journal_dir
+    assert draining.write_journal() is None
+
+    jobs = agent_api.Lifecycle(journal_dir).claim_journal()
+    assert [job["agent"]["id"] for job in jobs] == ["nightly"]
+    assert agent_api.Lifecycle(journal_dir).claim_journal() == []
+    assert os.listdir(journal_dir) == []
+
+    calls = []
+
+    async def record(agent, payload, **kwargs):
+        calls.append((agent.id, payload, kwargs["scheduled"], kwargs["lane"]))
+
+    monkeypatch.setattr(agent_api, "execute_agent", record)
+    asyncio.run(agent_api.run_job(jobs[0]))
+    assert calls == [("nightly", {"x": 1}, False, agent_api.BATCH)]
+
+
+def test_jobs_are_logged_as_lost_without_a_journal(monkeypatch):
+    errors = []
+    monkeypatch.setattr(agent_api.logger, "error", errors.append)
+    lifecycle = agent_api.Lifecycle(None)
+    agent = make_agent("orphan", "def main():\n    return 1\n")
+    assert not lifecycle.hand_off(agent_api.execution_job(agent, None, None))
+    lifecycle.requeue(agent_api.execution_job(agent, None, None))
+    assert lifecycle.write_journal() is None
+    assert len(errors) == 1 and "Lost 1 unstarted jobs" in errors[0]
+    assert "orphan" in errors[0]
+    assert lifecycle.claim_journal() == []
+
+
+@pytest.mark.parametrize("journal", [True, False])
+def test_unstarted_interactive_and_batch_executions_are_handed_off(
+    journal, tmp_path, monkeypatch
+):
+    from fastapi.testclient import TestClient
+
+    lifecycle = agent_api.Lifecycle(str(tmp_path) if journal else None)
+    monkeypatch.setattr(agent_api, "lifecycle", lifecycle)
+    monkeypatch.setattr(agent_api, "check_api_key", lambda api_key: True)
+    ran = make_agent("ran", "def main():\n    return 1\n")
+    queued = make_agent("queued", "def main():\n    return 2\n")
+
+    async def drained(agent, *args):
+        if agent.id == "queued":
+            raise agent_api.ExecutionNotStarted("Execution was not started")
+        return 1
+
+    monkeypatch.setattr(agent_api, "run_agent_execution", drained)
+    client = TestClient(agent_api.app)
+    headers = {"x-api-key": "key"}
+    single = client.post(
+        "/agents/queued/execute", json={"payload": {"n": 1}}, headers=headers
+    )
+    batch = client.post(
+        "/agents/batch_execute",
+        json={
+            "agents": [json.loads(ran.json()), json.loads(queued.json())],
+            "payload": {"payload": {"n": 2}},
+        },
+        headers=headers,
+    )
+
+    if not journal:
+        assert (single.status_code, batch.status_code) == (503, 503)
+        assert single.headers["retry-after"] == "1"
+        assert lifecycle._requeued == []
+        return
+    assert single.status_code == 202
+    assert single.json()["status"] == "requeued"
+    assert batch.status_code == 200
+    assert batch.json()[0] == 1
+    assert batch.json()[1]["status"] == "requeued"
+    assert [(job["agent"]["id"], job["payload"]) for job in lifecycle._requeued] == [
+        ("queued", {"n": 1}),
+        ("queued", {"n": 2}),
+    ]
+
+
+def test_coalesced_callers_hand_off_one_execution(tmp_path, monkeypatch):
+    lifecycle = agent_api.Lifecycle(str(tmp_path))
+    monkeypatch.setattr(agent_api, "lifecycle", lifecycle)
+    agent = make_agent("shared", "def main():\n    return 1\n", coalesce=True)
+    tenant = agent_api.TenantPolicy(tenant_id="t")
+
+    async def drained(*args):
+        await asyncio.sleep(0.01)
+        raise agent_api.ExecutionNotStarted("Execution was not started")
+
+    monkeypatch.setattr(agent_api, "run_agent_execution", drained)
+
+    async def run():
+        callers = [
+            agent_api.execute_agent(agent, {"q": 1}, tenant=tenant, hand_off=True)
+            for _ in range(5)
+        ]
+        # A requeued job joining the same execution does not journal it again.
+        job = agent_api.run_job(agent_api.execution_job(agent, {"q": 1}, tenant))
+        return await asyncio.gather(*callers, job, return_exceptions=True)
+
+    *outcomes, job_outcome = asyncio.run(run())
+    assert all(isinstance(o, agent_api.ExecutionHandedOff) for o in outcomes)
+    assert job_outcome is None
+    assert [job["payload"] for job in lifecycle._requeued] == [{"q": 1}]
+
+
+def test_async_agents_waiting_for_a_slot_fail_as_not_started_on_drain():
+    limiter = agent_api.AsyncAgentLimiter(1)
+    tenant = agent_api.TenantPolicy(tenant_id="t", max_concurrency=4)
+
+    async def run():
+        release = asyncio.Event()
+
+        async def hold():
+            await release.wait()
+            return "done"
+
+        running = asyncio.ensure_future(limiter.run(tenant, hold))
+        waiting = [asyncio.ensure_future(limiter.run(tenant, hold)) for _ in range(2)]
+        await asyncio.sleep(0)
+        assert (limiter.running, limiter.waiting) == (1, 2)
+
+        assert limiter.cancel_waiting() == 2
+        for task in waiting:
+            with pytest.raises(agent_api.ExecutionNotStarted):
+                await task
+        release.set()
+        assert await running == "done"
+        with pytest.raises(agent_api.ExecutionNotStarted):
+            await limiter.run(tenant, hold)
+        return limiter.stats(), limiter._global._value
+
+    stats, free_slots = asyncio.run(run())
+    assert (stats["running"], stats["waiting"], free_slots) == (0, 0, 1)
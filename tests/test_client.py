@@ -0,0 +1,227 @@
+"""
+Tests for the SwarmCloudAPI client in swarms_cloud/main.py.
+
+Requests are served by httpx.MockTransport handlers, so no server is needed.
+"""
+
+import gzip
+import json
+
+import httpx
+import pytest
+
+from swarms_cloud.main import (
+    AgentCreate,
+    AgentUpdate,
+    CircuitBreaker,
+    CircuitBreakerOpenError,
+    ResponseCache,
+    RetryPolicy,
+    SwarmCloudAPI,
+)
+
+AGENT = {
+    "id": "a1",
+    "name": "echo",
+    "description": None,
+    "code": "def main():\n    return 1\n",
+    "requirements": None,
+    "envs": None,
+    "creator": "me",
+    "autoscaling": False,
+    "created_at": "2025-01-01T00:00:00",
+}
+
+
+def make_client(handler, **kwargs):
+    kwargs.setdefault("retry_policy", RetryPolicy(max_retries=2, backoff_factor=0))
+    kwargs.setdefault("circuit_breaker", CircuitBreaker(failure_threshold=2))
+    return SwarmCloudAPI(
+        base_url="http://swarms.test",
+        api_key="key",
+        transport=httpx.MockTransport(handler),
+        **kwargs,
+    )
+
+
+# Retries and circuit breaker
+
+
+def test_get_is_retried_on_transient_status():
+    statuses = [503, 503, 200]
+    seen = []
+
+    def handler(request):
+        seen.append(request.method)
+        status = statuses.pop(0)
+        return httpx.Response(status, json=AGENT if status == 200 else {})
+
+    client = make_client(handler, use_circuit_breaker=False)
+    assert client.get_agent("a1").id == "a1"
+    assert seen == ["GET", "GET", "GET"]
+
+
+def test_post_with_idempotency_key_is_not_retried_after_reaching_server():
+    calls = []
+
+    def handler(request):
+        calls.append(request.headers.get("Idempotency-Key"))
+        raise httpx.ReadTimeout("slow", request=request)
+
+    client = make_client(handler, use_circuit_breaker=False)
+    with pytest.raises(httpx.ReadTimeout):
+        client.create_agent(
+            AgentCreate(name="echo", code=AGENT["code"]), idempotency_key="k-1"
+        )
+    assert calls == ["k-1"]
+
+
+def test_post_is_retried_on_connect_errors():
+    attempts = []
+
+    def handler(request):
+        attempts.append(request.method)
+        if len(attempts) < 3:
+            raise httpx.ConnectError("refused", request=request)
+        return httpx.Response(201, json=AGENT)
+
+    client = make_client(handler, use_circuit_breaker=False)
+    assert client.create_agent(AgentCreate(name="echo", code=AGENT["code"])).id == "a1"
+    assert attempts == ["POST", "POST", "POST"]
+
+
+def test_breaker_opens_and_fails_fast():
+    calls = []
+
+    def handler(request):
+        calls.append(1)
+        return httpx.Response(500, json={})
+
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=60)
+    client = make_client(
+        handler, retry_policy=RetryPolicy(max_retries=0), circuit_breaker=breaker
+    )
+    for _ in range(2):
+        with pytest.raises(httpx.HTTPStatusError):
+            client.get_agent("a1")
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitBreakerOpenError):
+        client.get_agent("a1")
+    assert len(calls) == 2
+
+
+def test_half_open_trial_closes_or_reopens_the_circuit():
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0)
+    breaker.record_failure()
+    assert breaker.allow_request()  # the trial
+    assert not breaker.allow_request()  # only one trial at a time
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request() and breaker.allow_request()
+
+
+def test_local_error_during_trial_releases_it():
+    outcomes = [RuntimeError("decode failed"), httpx.Response(200, json=AGENT)]
+
+    def handler(request):
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0)
+    breaker.record_failure()
+    client = make_client(handler, circuit_breaker=breaker)
+    with pytest.raises(RuntimeError):
+        client.get_agent("a1")
+    assert client.get_agent("a1").id == "a1"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+# Response cache
+
+
+def test_cache_serves_fresh_entries_and_revalidates_stale_ones_with_etag():
+    requests = []
+
+    def handler(request):
+        requests.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304)
+        return httpx.Response(200, json=AGENT, headers={"ETag": '"v1"'})
+
+    cache = ResponseCache(ttl=60)
+    client = make_client(handler, cache=cache)
+    assert client.get_agent("a1").name == "echo"
+    assert client.get_agent("a1").name == "echo"
+    assert requests == [None]
+
+    cache.ttl = 0
+    cache.refresh(client._cache_key("agent", "a1"))
+    assert client.get_agent("a1").name == "echo"
+    assert requests == [None, '"v1"']
+
+
+def test_update_invalidates_cached_agent():
+    versions = iter(["first", "second", "second"])
+
+    def handler(request):
+        return httpx.Response(200, json=dict(AGENT, name=next(versions)))
+
+    client = make_client(handler, cache=ResponseCache(ttl=60))
+    assert client.get_agent("a1").name == "first"
+    client.update_agent("a1", AgentUpdate(description="new"))
+    assert client.get_agent("a1").name == "second"
+
+
+def test_cache_evicts_least_recently_used():
+    cache = ResponseCache(maxsize=2, ttl=60)
+    cache.set("a", b"1")
+    cache.set("b", b"2")
+    cache.get("a")
+    cache.set("c", b"3")
+    assert cache.get("b") is None
+    assert cache.get("a").content == b"1"
+
+
+# Request compression
+
+
+def capture_requests(status=200, body=None):
+    captured = []
+
+    def handler(request):
+        captured.append(request)
+        return httpx.Response(status, json=body if body is not None else AGENT)
+
+    return captured, handler
+
+
+def large_agent():
+    return AgentCreate(name="big", code="x = '" + "a" * 100_000 + "'\n")
+
+
+def test_request_bodies_are_not_compressed_by_default():
+    captured, handler = capture_requests(201)
+    make_client(handler).create_agent(large_agent())
+    assert "Content-Encoding" not in captured[0].headers
+    assert json.loads(captured[0].content)["name"] == "big"
+
+
+def test_large_bodies_are_gzipped_when_enabled():
+    captured, handler = capture_requests(201)
+    client = make_client(handler, request_compression="gzip")
+    client.create_agent(large_agent())
+    client.create_agent(AgentCreate(name="small", code=AGENT["code"]))
+    big, small = captured
+    assert big.headers["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(big.content))["name"] == "big"
+    assert "Content-Encoding" not in small.headers
+
+
+def test_unsupported_compression_is_rejected():
+    with pytest.raises(ValueError):
+        make_client(lambda request: httpx.Response(200), request_compression="br")
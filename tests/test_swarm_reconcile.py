@@ -0,0 +1,747 @@
+"""
+Tests for live reconciliation of swarm updates in api/old/new_api.py.
+
+Kubernetes is replaced by FakeKubernetesApi, an in-memory stand-in for the
+AppsV1/CoreV1/AutoscalingV2 calls the swarm API makes, so no cluster is needed.
+"""
+
+import asyncio
+import copy
+import os
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+pytest.importorskip("docker")
+pytest.importorskip("fastapi")
+pytest.importorskip("kubernetes")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from kubernetes.client.rest import ApiException  # noqa: E402
+
+os.environ.setdefault("SWARM_STORE_BACKEND", "memory")
+os.environ.setdefault("RECONCILE_INTERVAL_SECONDS", "0")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "api", "old"))
+
+import new_api  # noqa: E402
+
+API_KEY = "user-api-key-123"
+HEADERS = {"x-api-key": API_KEY}
+
+HPA_SPEC_FIELDS = {
+    "minReplicas": "min_replicas",
+    "maxReplicas": "max_replicas",
+    "metrics": "metrics",
+}
+
+
+class FakeKubernetesApi:
+    """
+    In-memory Kubernetes API covering the Deployment, Service and HPA calls used
+    by the swarm API. Every call is recorded in `calls` as (method, name, body).
+    """
+
+    def __init__(self):
+        self.deployments = {}
+        self.services = {}
+        self.hpas = {}
+        self.pods = {}
+        self.leases = {}
+        self.pod_metrics = []
+        self.calls = []
+
+    def _get(self, store, name):
+        if name not in store:
+            raise ApiException(status=404, reason="Not Found")
+        return store[name]
+
+    def _create(self, store, body):
+        if body.metadata.name in store:
+            raise ApiException(status=409, reason="AlreadyExists")
+        store[body.metadata.name] = body
+
+    # Deployments
+    def create_namespaced_deployment(self, namespace, body):
+        self.calls.append(("create_deployment", body.metadata.name, body))
+        self._create(self.deployments, body)
+
+    def read_namespaced_deployment(self, name, namespace):
+        return self._get(self.deployments, name)
+
+    def patch_namespaced_deployment(self, name, namespace, body):
+        self.calls.append(("patch_deployment", name, body))
+        deployment = self._get(self.deployments, name)
+        if "metadata" in body:
+            annotations = deployment.metadata.annotations or {}
+            annotations.update(body["metadata"]["annotations"])
+            deployment.metadata.annotations = annotations
+            return
+        for patch in body["spec"]["template"]["spec"]["containers"]:
+            for container in deployment.spec.template.spec.containers:
+                if container.name != patch["name"]:
+                    continue
+                container.image = patch.get("image", container.image)
+                if "resources" in patch:
+                    container.resources = new_api.client.V1ResourceRequirements(
+                        **{
+                            kind: {k: v for k, v in values.items() if v is not None}
+                            for kind, values in patch["resources"].items()
+                        }
+                    )
+
+    def patch_namespaced_deployment_scale(self, name, namespace, body):
+        self.calls.append(("patch_scale", name, body))
+        self._get(self.deployments, name).spec.replicas = body["spec"]["replicas"]
+
+    def delete_namespaced_deployment(self, name, namespace):
+        self.calls.append(("delete_deployment", name, None))
+        self._get(self.deployments, name)
+        del self.deployments[name]
+
+    # Services
+    def create_namespaced_service(self, namespace, body):
+        self.calls.append(("create_service", body.metadata.name, body))
+        self._create(self.services, body)
+
+    def delete_namespaced_service(self, name, namespace):
+        self.calls.append(("delete_service", name, None))
+        self._get(self.services, name)
+        del self.services[name]
+
+    # Pods
+    def list_namespaced_pod(self, namespace, label_selector):
+        key, value = label_selector.split("=")
+        items = [p for p in self.pods.values() if p.metadata.labels.get(key) == value]
+        return SimpleNamespace(items=items)
+
+    def patch_namespaced_pod(self, name, namespace, body):
+        self.calls.append(("patch_pod", name, body))
+        self._get(self.pods, name).metadata.labels.update(body["metadata"]["labels"])
+
+    def delete_collection_namespaced_pod(self, namespace, label_selector):
+        self.calls.append(("delete_pods", label_selector, None))
+        selector = dict(term.split("=") for term in label_selector.split(","))
+        for name, pod in list(self.pods.items()):
+            if selector.items() <= pod.metadata.labels.items():
+                del self.pods[name]
+
+    # Horizontal Pod Autoscalers
+    def create_namespaced_horizontal_pod_autoscaler(self, namespace, body):
+        self.calls.append(("create_hpa", body.metadata.name, body))
+        self._create(self.hpas, body)
+
+    def read_namespaced_horizontal_pod_autoscaler(self, name, namespace):
+        return self._get(self.hpas, name)
+
+    def patch_namespaced_horizontal_pod_autoscaler(self, name, namespace, body):
+        self.calls.append(("patch_hpa", name, body))
+        hpa = self._get(self.hpas, name)
+        for key, value in body["spec"].items():
+            setattr(hpa.spec, HPA_SPEC_FIELDS[key], value)
+
+    def delete_namespaced_horizontal_pod_autoscaler(self, name, namespace):
+        self.calls.append(("delete_hpa", name, None))
+        self._get(self.hpas, name)
+        del self.hpas[name]
+
+    # Leases
+    def read_namespaced_lease(self, name, namespace):
+        return copy.deepcopy(self._get(self.leases, name))
+
+    def create_namespaced_lease(self, namespace, body):
+        if body.metadata.name in self.leases:
+            raise ApiException(status=409, reason="Conflict")
+        body.metadata.resource_version = "1"
+        self.leases[body.metadata.name] = copy.deepcopy(body)
+
+    def replace_namespaced_lease(self, name, namespace, body):
+        current = self._get(self.leases, name)
+        if body.metadata.resource_version != current.metadata.resource_version:
+            raise ApiException(status=409, reason="Conflict")
+        body.metadata.resource_version = str(int(current.metadata.resource_version) + 1)
+        self.leases[name] = copy.deepcopy(body)
+
+    # Metrics
+    def list_namespaced_custom_object(self, group, version, namespace, plural):
+        return {"items": copy.deepcopy(self.pod_metrics)}
+
+    def patches(self):
+        return [call for call in self.calls if call[0].startswith("patch_")]
+
+
+class FakeKubernetesClients:
+    """Drop-in replacement for new_api.k8s_clients backed by one FakeKubernetesApi."""
+
+    def __init__(self, api):
+        self.apps_v1 = api
+        self.core_v1 = api
+        self.autoscaling_v2 = api
+        self.coordination_v1 = api
+
+    def api(self, api_cls):
+        return self.apps_v1
+
+    def invalidate(self):
+        pass
+
+
+@pytest.fixture
+def fake_k8s(monkeypatch):
+    api = FakeKubernetesApi()
+    monkeypatch.setattr(new_api, "k8s_clients", FakeKubernetesClients(api))
+    monkeypatch.setattr(new_api, "swarm_store", new_api.InMemorySwarmRepository())
+    monkeypatch.setattr(new_api, "swarm_patcher", new_api.SwarmPatchCoalescer(60))
+    return api
+
+
+@pytest.fixture
+def ready_swarm(fake_k8s):
+    swarm = new_api.Swarm(
+        id="abc",
+        name="test",
+        dockerhub_image="example/agent:1",
+        min_replicas=1,
+        max_replicas=5,
+        target_cpu=50,
+        target_inflight_per_pod=4,
+        owner=new_api.owner_id(API_KEY),
+        status=new_api.SwarmStatus.READY,
+    )
+    new_api.swarm_store.put(swarm)
+    new_api.create_deployment("swarm-abc", swarm.dockerhub_image)
+    new_api.create_horizontal_pod_autoscaler(
+        "swarm-abc",
+        min_replicas=1,
+        max_replicas=5,
+        target_cpu_utilization_percentage=50,
+        target_inflight_per_pod=4,
+    )
+    return swarm
+
+
+def test_rapid_updates_are_coalesced_into_minimal_patches(fake_k8s, ready_swarm):
+    api_client = TestClient(new_api.app)
+    for update in (
+        {"max_replicas": 6},
+        {"max_replicas": 8},
+        {"dockerhub_image": "example/agent:2"},
+        {"description": "metadata only"},
+    ):
+        response = api_client.put("/swarms/abc", json=update, headers=HEADERS)
+        assert response.status_code == 200
+
+    assert fake_k8s.patches() == []
+    new_api.swarm_patcher.flush("abc")
+
+    patches = fake_k8s.patches()
+    assert [call[0] for call in patches] == ["patch_hpa", "patch_deployment"]
+    assert patches[0][2] == {"spec": {"maxReplicas": 8}}
+    assert fake_k8s.hpas["swarm-abc"].spec.max_replicas == 8
+    container = fake_k8s.deployments["swarm-abc"].spec.template.spec.containers[0]
+    assert container.image == "example/agent:2"
+
+
+def test_reconcile_patches_drift(fake_k8s, ready_swarm):
+    fake_k8s.hpas["swarm-abc"].spec.min_replicas = 3
+    fake_k8s.deployments["swarm-abc"].spec.template.spec.containers[0].image = "x"
+
+    patched = new_api.reconciler.reconcile_once()
+
+    assert patched == {"abc": {"min_replicas", "dockerhub_image"}}
+    assert fake_k8s.hpas["swarm-abc"].spec.min_replicas == 1
+    container = fake_k8s.deployments["swarm-abc"].spec.template.spec.containers[0]
+    assert container.image == "example/agent:1"
+    assert new_api.reconciler.reconcile_once() == {}
+
+
+def test_reconcile_skips_swarms_still_provisioning(fake_k8s, ready_swarm):
+    new_api.swarm_store.update("abc", status=new_api.SwarmStatus.PROVISIONING)
+    fake_k8s.hpas["swarm-abc"].spec.max_replicas = 9
+
+    assert new_api.reconciler.reconcile_once() == {}
+    assert fake_k8s.patches() == []
+
+
+def test_metric_target_updates_replace_hpa_metrics(fake_k8s, ready_swarm):
+    api_client = TestClient(new_api.app)
+    response = api_client.put(
+        "/swarms/abc", json={"target_p95_latency_ms": 800}, headers=HEADERS
+    )
+    assert response.status_code == 200
+    new_api.swarm_patcher.flush("abc")
+
+    [(_, _, body)] = fake_k8s.patches()
+    metrics = body["spec"]["metrics"]
+    assert [m["type"] for m in metrics] == ["Resource", "External", "External"]
+    assert metrics[2]["external"]["metric"]["name"] == new_api.LATENCY_P95_METRIC
+    assert metrics[2]["external"]["target"] == {"type": "Value", "value": "800"}
+    assert new_api.reconciler.reconcile_once() == {}
+
+
+def test_idle_swarm_scales_to_zero_and_back(fake_k8s, ready_swarm, monkeypatch):
+    new_api.swarm_store.update("abc", scale_to_zero=True, idle_timeout_seconds=0)
+    controller = new_api.ScaleToZeroController(interval=0)
+
+    assert controller.check_once() == {"abc": 0}
+    assert fake_k8s.deployments["swarm-abc"].spec.replicas == 0
+    assert new_api.swarm_store.get("abc").scaled_to_zero
+
+    monkeypatch.setattr(new_api, "wait_for_deployment_ready", lambda *args: None)
+    new_api.completions_proxy._wake_swarm(new_api.swarm_store.get("abc"))
+    assert fake_k8s.deployments["swarm-abc"].spec.replicas == 1
+    assert not new_api.swarm_store.get("abc").scaled_to_zero
+
+
+def test_bulk_operations_report_per_item_status(fake_k8s, ready_swarm, monkeypatch):
+    monkeypatch.setattr(new_api.provisioner, "submit", lambda swarm: None)
+    fake_k8s.services["svc-abc"] = None
+    api_client = TestClient(new_api.app)
+
+    response = api_client.post(
+        "/swarms/bulk",
+        json={"swarms": [{"name": "a", "dockerhub_image": "x/a:1"}, {"name": "b"}]},
+        headers=HEADERS,
+    )
+    assert response.status_code == 200
+    created = response.json()
+    assert (created["succeeded"], created["failed"]) == (1, 1)
+    assert [r["status_code"] for r in created["results"]] == [201, 422]
+
+    new_id = created["results"][0]["id"]
+    response = api_client.request(
+        "DELETE", "/swarms/bulk", json={"ids": ["abc", new_id]}, headers=HEADERS
+    )
+    deleted = response.json()
+    # The new swarm was never provisioned; there is nothing to tear down but its record.
+    assert [r["status_code"] for r in deleted["results"]] == [204, 204]
+    assert new_api.swarm_store.get("abc") is None
+    assert new_api.swarm_store.get(new_id) is None
+
+
+def test_new_swarm_claims_a_warm_pod(fake_k8s, monkeypatch):
+    pool = new_api.WarmPool(images=["example/runtime:1"], size=2)
+    monkeypatch.setattr(new_api, "warm_pool", pool)
+    pool.refill()
+    pool_name = new_api.warm_pool_name("example/runtime:1")
+    assert fake_k8s.deployments[pool_name].spec.replicas == 2
+
+    pool_template = fake_k8s.deployments[pool_name].spec.template.spec
+    medium = new_api.build_resource_requirements(
+        new_api.resolve_resource_spec("medium")
+    )
+    for name, ready, resources in (
+        ("warm-pod-1", "False", pool.resources),
+        ("warm-pod-2", "True", medium),
+        ("warm-pod-3", "True", pool_template.containers[0].resources),
+    ):
+        fake_k8s.pods[name] = new_api.client.V1Pod(
+            metadata=new_api.client.V1ObjectMeta(
+                name=name, labels={"app": pool_name, "pool": "warm"}
+            ),
+            spec=new_api.client.V1PodSpec(
+                containers=[
+                    new_api.client.V1Container(name=pool_name, resources=resources)
+                ]
+            ),
+            status=new_api.client.V1PodStatus(
+                phase="Running",
+                conditions=[new_api.client.V1PodCondition(type="Ready", status=ready)],
+            ),
+        )
+    swarm = new_api.Swarm(
+        id="xyz",
+        name="w",
+        dockerhub_image="example/runtime:1",
+        owner=new_api.owner_id(API_KEY),
+    )
+    # A swarm asking for other resources than the pool's never takes a warm pod.
+    assert pool.claim(swarm.copy(update={"resource_profile": "medium"})) is None
+    overrides = new_api.ResourceOverrides(memory_limit="1Gi")
+    assert pool.claim(swarm.copy(update={"resources": overrides})) is None
+
+    # warm-pod-2 is ready but was started with other resources.
+    assert pool.claim(swarm) == "warm-pod-3"
+    labels = fake_k8s.pods["warm-pod-3"].metadata.labels
+    assert labels["app"] == "swarm-xyz"
+    assert pool.claim(swarm) is None
+
+    pool.release("xyz")
+    assert set(fake_k8s.pods) == {"warm-pod-1", "warm-pod-2"}
+
+
+def test_resource_profile_update_rolls_out_and_is_validated(fake_k8s, ready_swarm):
+    api_client = TestClient(new_api.app)
+    response = api_client.put(
+        "/swarms/abc", json={"resource_profile": "unknown"}, headers=HEADERS
+    )
+    assert response.status_code == 422
+
+    update = {"resource_profile": "medium", "resources": {"memory_limit": "2Gi"}}
+    response = api_client.put("/swarms/abc", json=update, headers=HEADERS)
+    assert response.status_code == 200
+    new_api.swarm_patcher.flush("abc")
+
+    [(_, _, body)] = fake_k8s.patches()
+    [container] = body["spec"]["template"]["spec"]["containers"]
+    assert "image" not in container
+    assert container["resources"]["limits"] == {
+        "cpu": "1",
+        "memory": "2Gi",
+        "ephemeral-storage": "2Gi",
+    }
+    assert new_api.reconciler.reconcile_once() == {}
+
+    # Back to "small": ephemeral storage is removed with an explicit null.
+    api_client.put("/swarms/abc", json={"resource_profile": "small"}, headers=HEADERS)
+    new_api.swarm_patcher.flush("abc")
+    resources = fake_k8s.patches()[-1][2]["spec"]["template"]["spec"]["containers"][0]
+    assert resources["resources"]["limits"]["ephemeral-storage"] is None
+
+
+def test_pinned_profile_requests_whole_cores():
+    resources = new_api.build_resource_requirements(
+        new_api.resolve_resource_spec("pinned-2")
+    )
+    assert resources.requests["cpu"] == resources.limits["cpu"] == "2"
+    assert resources.requests["memory"] == resources.limits["memory"]
+
+
+def test_client_refresh_leaves_the_previous_client_open(monkeypatch):
+    monkeypatch.setattr(new_api.config, "load_incluster_config", lambda **kw: None)
+    manager = new_api.KubernetesClientManager(refresh_seconds=0)
+    first = manager.api_client()
+    closed = []
+    monkeypatch.setattr(first, "close", lambda: closed.append(first))
+
+    second = manager.api_client()
+    assert second is not first
+    assert closed == []
+
+
+def test_sqlite_store_keeps_owner_hashes_not_api_keys(fake_k8s, tmp_path, monkeypatch):
+    store = new_api.SQLiteSwarmRepository(str(tmp_path / "data" / "swarms.db"))
+    monkeypatch.setattr(new_api, "swarm_store", store)
+    monkeypatch.setattr(new_api.provisioner, "submit", lambda swarm: None)
+    api_client = TestClient(new_api.app)
+
+    response = api_client.post(
+        "/swarms/", json={"name": "a", "dockerhub_image": "x/a:1"}, headers=HEADERS
+    )
+    assert response.status_code == 201
+    assert response.json()["owner"] == new_api.owner_id(API_KEY)
+    listed = api_client.get("/swarms/", headers=HEADERS).json()
+    assert [swarm["name"] for swarm in listed] == ["a"]
+    other = {"x-api-key": "user-api-key-456"}
+    assert api_client.get("/swarms/", headers=other).json() == []
+
+    rows = store._conn.execute("SELECT owner, data FROM swarms").fetchall()
+    assert all(API_KEY not in owner + data for owner, data in rows)
+
+
+def test_swarm_repository_requires_every_operation():
+    class Partial(new_api.SwarmRepository):
+        def get(self, swarm_id):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_one_controller_lease_holder_at_a_time(fake_k8s):
+    first = new_api.ControllerLease(identity="pod-a", duration=30, enabled=True)
+    second = new_api.ControllerLease(identity="pod-b", duration=30, enabled=True)
+    assert first.is_leader()
+    assert not second.is_leader()
+
+    # An unrenewed lease expires and is taken over.
+    lease = fake_k8s.leases[first.name]
+    lease.spec.renew_time = lease.spec.renew_time.replace(year=2000)
+    assert second.is_leader()
+    first._renewed_at = None
+    assert not first.is_leader()
+
+    second.release()
+    assert first.is_leader()
+
+
+def test_idleness_comes_from_activity_of_every_process(fake_k8s, ready_swarm):
+    new_api.swarm_store.update("abc", scale_to_zero=True, idle_timeout_seconds=60)
+    controller = new_api.ScaleToZeroController(interval=0)
+    controller._first_seen["abc"] = time.monotonic() - 3600
+
+    # Another process served the swarm recently: not idle, whatever this one saw.
+    new_api.record_deployment_activity("swarm-abc")
+    assert controller.check_once() == {}
+
+    annotations = fake_k8s.deployments["swarm-abc"].metadata.annotations
+    annotations[new_api.ACTIVITY_ANNOTATION] = str(time.time() - 120)
+    assert controller.check_once() == {"abc": 0}
+
+
+def test_proxy_reports_swarms_with_recent_or_inflight_requests(fake_k8s, ready_swarm):
+    proxy = new_api.CompletionsProxy()
+    proxy._last_request["abc"] = time.monotonic()
+    assert proxy.report_activity() == ["abc"]
+    assert proxy.report_activity() == []
+
+    proxy._swarm_inflight["abc"] = 1
+    assert proxy.report_activity() == ["abc"]
+    stamped = fake_k8s.deployments["swarm-abc"].metadata.annotations
+    assert float(stamped[new_api.ACTIVITY_ANNOTATION]) > time.time() - 5
+
+
+def test_failed_swarm_is_deleted_without_kubernetes_objects(fake_k8s):
+    new_api.swarm_store.put(
+        new_api.Swarm(
+            id="broken",
+            name="b",
+            dockerhub_image="x/a:1",
+            owner=new_api.owner_id(API_KEY),
+            status=new_api.SwarmStatus.FAILED,
+        )
+    )
+    response = TestClient(new_api.app).delete("/swarms/broken", headers=HEADERS)
+    assert response.status_code == 204
+    assert new_api.swarm_store.get("broken") is None
+
+
+def test_deleting_a_provisioning_swarm_stops_the_provisioner(fake_k8s, monkeypatch):
+    provisioner = new_api.SwarmProvisioner(max_workers=1)
+    monkeypatch.setattr(new_api, "provisioner", provisioner)
+    monkeypatch.setattr(new_api, "pull_docker_image", lambda image: None)
+    monkeypatch.setattr(new_api, "wait_for_deployment_ready", lambda *args: None)
+    create_deployment = new_api.create_deployment
+    started, release = threading.Event(), threading.Event()
+
+    def slow_create_deployment(*args, **kwargs):
+        started.set()
+        release.wait(5)
+        create_deployment(*args, **kwargs)
+
+    monkeypatch.setattr(new_api, "create_deployment", slow_create_deployment)
+    api_client = TestClient(new_api.app)
+    response = api_client.post(
+        "/swarms/", json={"name": "a", "dockerhub_image": "x/a:1"}, headers=HEADERS
+    )
+    swarm_id = response.json()["id"]
+    assert started.wait(5)
+
+    # The Deployment does not exist yet; the provisioner creates it afterwards.
+    response = api_client.delete(f"/swarms/{swarm_id}", headers=HEADERS)
+    assert response.status_code == 204
+    release.set()
+    provisioner.executor.shutdown(wait=True)
+
+    assert new_api.swarm_store.get(swarm_id) is None
+    assert (fake_k8s.deployments, fake_k8s.services, fake_k8s.hpas) == ({}, {}, {})
+
+
+def test_interrupted_provisioning_and_teardown_are_resumed(fake_k8s, monkeypatch):
+    provisioner = new_api.SwarmProvisioner(max_workers=1)
+    monkeypatch.setattr(new_api, "provisioner", provisioner)
+    monkeypatch.setattr(new_api, "pull_docker_image", lambda image: None)
+    monkeypatch.setattr(new_api, "wait_for_deployment_ready", lambda *args: None)
+    owner = new_api.owner_id(API_KEY)
+    for swarm_id, status in (
+        ("half", new_api.SwarmStatus.PROVISIONING),
+        ("gone", new_api.SwarmStatus.DELETING),
+    ):
+        new_api.swarm_store.put(
+            new_api.Swarm(
+                id=swarm_id,
+                name=swarm_id,
+                dockerhub_image="x/a:1",
+                owner=owner,
+                status=status,
+            )
+        )
+    # The stopped process had created the Deployment of "half" and "gone".
+    new_api.create_deployment("swarm-half", "x/a:1")
+    new_api.create_deployment("swarm-gone", "x/a:1")
+
+    assert new_api.reconciler.resume_interrupted() == ["half", "gone"]
+    provisioner.executor.shutdown(wait=True)
+
+    assert new_api.swarm_store.get("half").status == new_api.SwarmStatus.READY
+    assert set(fake_k8s.hpas) == {"swarm-half"}
+    assert new_api.swarm_store.get("gone") is None
+    assert set(fake_k8s.deployments) == {"swarm-half"}
+
+
+class FakeDockerImages:
+    """The `images` API of a Docker host holding `local` (image -> digests)."""
+
+    def __init__(self, registry):
+        self.registry = registry
+        self.local = {}
+        self.pulls = []
+
+    def get_registry_data(self, image):
+        return SimpleNamespace(id=self.registry[image])
+
+    def get(self, image):
+        if image not in self.local:
+            raise new_api.docker.errors.ImageNotFound("missing")
+        digests = [f"{image}@{digest}" for digest in self.local[image]]
+        return SimpleNamespace(attrs={"RepoDigests": digests})
+
+    def pull(self, image):
+        self.pulls.append(image)
+        self.local[image] = [self.registry[image]]
+
+
+def test_image_cache_rechecks_the_host_once_entries_expire(monkeypatch):
+    images = FakeDockerImages({"x/a:1": "sha256:1"})
+    monkeypatch.setattr(
+        new_api, "get_docker_client", lambda: SimpleNamespace(images=images)
+    )
+    cache = new_api.ImageCache(ttl=60)
+    assert cache.ensure("x/a:1") == "sha256:1"
+    assert cache.ensure("x/a:1") == "sha256:1"
+    assert images.pulls == ["x/a:1"]
+
+    # The host evicted the image; a trusted entry hides that until it expires.
+    del images.local["x/a:1"]
+    cache.ttl = 0
+    cache.ensure("x/a:1")
+    assert images.pulls == ["x/a:1", "x/a:1"]
+
+    # The tag moved: the new digest is not on the host yet, so it is pulled.
+    images.registry["x/a:1"] = "sha256:2"
+    assert cache.ensure("x/a:1") == "sha256:2"
+    assert len(images.pulls) == 3
+
+
+class TrackedStream(httpx.AsyncByteStream):
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = False
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            yield chunk
+
+    async def aclose(self):
+        self.closed = True
+
+
+@pytest.mark.parametrize("spec_version", ["2.4", "2.0"])
+def test_client_disconnect_releases_the_replica_and_upstream(
+    fake_k8s, ready_swarm, spec_version
+):
+    stream = TrackedStream([b"data: 1\n\n", b"data: 2\n\n"])
+    proxy = new_api.CompletionsProxy()
+    proxy._clients["abc"] = httpx.AsyncClient(
+        transport=httpx.MockTransport(
+            lambda request: httpx.Response(200, stream=stream)
+        )
+    )
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/swarms/abc/completions",
+        "headers": [],
+        "asgi": {"spec_version": spec_version},
+    }
+    disconnected = asyncio.Event()
+
+    async def receive():
+        if disconnected.is_set():
+            return {"type": "http.disconnect"}
+        disconnected.set()
+        return {"type": "http.request", "body": b"{}", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            raise OSError("client went away")
+
+    async def run():
+        request = new_api.Request(scope, receive)
+        swarm = ready_swarm.copy(update={"endpoint": "http://svc-abc"})
+        response = await proxy.forward(swarm, request)
+        assert proxy.inflight("abc") == 1
+        try:
+            await response(scope, receive, send)
+        except Exception:
+            pass
+        await proxy.aclose()
+
+    asyncio.run(run())
+    assert proxy.inflight("abc") == 0
+    assert stream.closed
+
+
+def test_sqlite_updates_from_two_connections_do_not_overwrite_each_other(
+    tmp_path, monkeypatch
+):
+    path = str(tmp_path / "swarms.db")
+    first = new_api.SQLiteSwarmRepository(path)
+    second = new_api.SQLiteSwarmRepository(path)
+    first.put(
+        new_api.Swarm(id="s", name="s", dockerhub_image="x/a:1", owner="o", error=None)
+    )
+    parse_raw = new_api.Swarm.parse_raw
+    first_read = threading.Event()
+
+    def slow_parse_raw(data):
+        # Hold the first update between its read and its write while the second
+        # connection updates the same record.
+        if threading.current_thread().name == "first":
+            first_read.set()
+            time.sleep(0.3)
+        return parse_raw(data)
+
+    monkeypatch.setattr(new_api.Swarm, "parse_raw", slow_parse_raw)
+    writer = threading.Thread(
+        target=first.update, name="first", kwargs={"swarm_id": "s", "max_replicas": 7}
+    )
+    writer.start()
+    assert first_read.wait(5)
+    second.update("s", error="from second")
+    writer.join()
+
+    monkeypatch.setattr(new_api.Swarm, "parse_raw", parse_raw)
+    stored = first.get("s")
+    assert (stored.max_replicas, stored.error) == (7, "from second")
+
+
+def pod_usage(app, cpu, memory):
+    return {
+        "metadata": {"labels": {"app": app}},
+        "containers": [{"usage": {"cpu": cpu, "memory": memory}}],
+    }
+
+
+def test_usage_is_sampled_periodically_and_read_without_sampling(
+    fake_k8s, ready_swarm, monkeypatch
+):
+    advisor = new_api.ResourceAdvisor()
+    monkeypatch.setattr(new_api, "resource_advisor", advisor)
+    new_api.swarm_store.put(
+        ready_swarm.copy(
+            update={"id": "starting", "status": new_api.SwarmStatus.PROVISIONING}
+        )
+    )
+    for cpu, memory in (("100m", "100Mi"), ("700m", "200Mi"), ("50m", "150Mi")):
+        fake_k8s.pod_metrics = [
+            pod_usage("swarm-abc", cpu, memory),
+            pod_usage("swarm-starting", "4", "8Gi"),
+            pod_usage("unrelated", "4", "8Gi"),
+        ]
+        assert new_api.reconciler.sample_usage() == 1
+
+    api_client = TestClient(new_api.app)
+    for _ in range(3):
+        response = api_client.get(
+            "/swarms/abc/resources/recommendation", headers=HEADERS
+        )
+        recommendation = response.json()
+        assert recommendation["samples"] == 3
+    assert recommendation["peak_cpu_cores"] == 0.7
+    assert recommendation["peak_memory_bytes"] == 200 * 2**20
+    assert recommendation["recommended_profile"] == "large"
+    assert "starting" not in advisor._samples